@@ -2,45 +2,83 @@ import os
 import dash
 import dash_html_components as html
 import dash_core_components as dcc
-from components.luacode import LuaCode
-from components.seesoft import SeeSoft
-from components.scatterplot import ScatterPlot
-from components.tree import Tree
-from dash.dependencies import Input, Output
+from components.luacode_windows import windows as lua_code_windows
+from components.module_views import views
+from components.wall import Wall
+from components.image_store import store as image_store
+from components.seesoft_tiles import tiles as seesoft_tiles
+from preprocessing.module_files import list_files
+from dash.dependencies import Input, Output, State, ClientsideFunction
+from dash.exceptions import PreventUpdate
 
 path = os.path.dirname(os.path.realpath(__file__)) + '/data'
-files = list()
+files = list_files(path)
+# modules are chosen in the app, their views are rendered only when
+# they are chosen, see show_module
+file_paths = set(files)
+file_options = [{'label': os.path.relpath(file, path), 'value': file}
+                for file in files]
 
-# r=root, d=directories, f=files
-# list all json files
-for r, d, f in os.walk(path):
-    for file in f:
-        if '.json' in file:
-            files.append(os.path.join(r, file))
+# mosaic of the whole corpus built by python3 -m components.wall data wall
+wall_path = os.path.dirname(os.path.realpath(__file__)) + '/wall'
+wall = Wall(wall_path) if os.path.isdir(wall_path) else None
 
-file_left = files[0]
-file_right = files[1]
+# pairs of seesoft and luacode views, corpus views are created when
+# a module is clicked in the wall
+panes = ['left', 'right'] + (['corpus'] if wall else [])
 
-seesoft_left = SeeSoft(file_left, comments=True)
-seesoft_left.draw(img_path='assets/image_left.png')
-
-seesoft_right = SeeSoft(file_right, comments=True)
-seesoft_right.draw(img_path='assets/image_right.png')
+# external_stylesheets = ['https://codepen.io/amyoshino/pen/jzXypZ.css']
 
-luacode_left = LuaCode(file_left)
-luacode_right = LuaCode(file_right)
+# views of modules aren't in the initial layout
+app = dash.Dash(__name__, suppress_callback_exceptions=True)
+# seesoft images are referenced by URL instead of being inlined in figures
+image_store.register(app.server)
+# tiles of large seesoft images are loaded when zooming
+seesoft_tiles.register(app.server)
+# lines of long lua code views are loaded when scrolling
+lua_code_windows.register(app.server)
 
-scatterplot_left = ScatterPlot(file_left)
-scatterplot_right = ScatterPlot(file_right)
+corpus_tabs = list()
+if wall:
+    corpus_tabs.append(
+        dcc.Tab(
+            label='Corpus',
+            children=[
+                html.Div(id='hidden-div-corpus', style={'display': 'none'}),
+                html.Div(
+                    children=[
+                        html.Div([wall.view(dash_id='corpus-wall')],
+                                 className='six columns'),
+                        html.Div(id='corpus-module',
+                                 className='six columns')
+                    ],
+                    style={'padding': '3vh'},
+                    className='row'
+                )
+            ]
+        )
+    )
 
-tree_left = Tree(file_left)
-tree_right = Tree(file_right)
 
-# external_stylesheets = ['https://codepen.io/amyoshino/pen/jzXypZ.css']
+def module_picker(pane: str):
+    return html.Div(
+        children=[
+            dcc.Dropdown(
+                id='module-' + pane,
+                options=file_options,
+                placeholder='Select module'
+            )
+        ],
+        className='six columns'
+    )
 
-app = dash.Dash(__name__)
 
 app.layout = html.Div([
+    html.Div(
+        children=[module_picker('left'), module_picker('right')],
+        style={'padding': '3vh 3vh 0 3vh'},
+        className='row'
+    ),
     dcc.Tabs(
         children=[
             dcc.Tab(
@@ -52,24 +90,18 @@ app.layout = html.Div([
                              style={'display': 'none'}),
                     html.Div(
                         children=[
-                            luacode_left.view(dash_id='lua-code-left',
-                                              columns='4'),
-                            html.Div([
-                                seesoft_left.view(dash_id='see-soft-left')
-                            ],
-                                style={'justify-content': 'center',
-                                       'display': 'flex'},
-                                className='two columns'
-                            ),
-                            html.Div([
-                                seesoft_right.view(dash_id='see-soft-right')
-                            ],
-                                style={'justify-content': 'center',
-                                       'display': 'flex'},
-                                className='two columns'
-                            ),
-                            luacode_right.view(dash_id='lua-code-right',
-                                               columns='4'),
+                            html.Div(id='lua-code-left-pane',
+                                     className='four columns'),
+                            html.Div(id='see-soft-left-pane',
+                                     style={'justify-content': 'center',
+                                            'display': 'flex'},
+                                     className='two columns'),
+                            html.Div(id='see-soft-right-pane',
+                                     style={'justify-content': 'center',
+                                            'display': 'flex'},
+                                     className='two columns'),
+                            html.Div(id='lua-code-right-pane',
+                                     className='four columns')
                         ],
                         style={'padding': '3vh'},
                         className='row'
@@ -81,147 +113,167 @@ app.layout = html.Div([
                 children=[
                     html.Div(
                         children=[
-                            scatterplot_left.view(
-                                dash_id='scatter-plot-left',
-                                columns='6', show_text=True),
-                            scatterplot_right.view(
-                                dash_id='scatter-plot-right',
-                                columns='6',
-                                show_legend=True,
-                                show_text=True)
+                            html.Div(id='scatter-plot-left-pane',
+                                     className='six columns'),
+                            html.Div(id='scatter-plot-right-pane',
+                                     className='six columns')
                         ],
                         style={'padding': '3vh'},
                         className='row'
                     ),
                     html.Div(
                         children=[
-                            tree_left.view(dash_id='tree-left', columns='6'),
-                            tree_right.view(dash_id='tree-right', columns='6')
+                            html.Div(id='tree-left-pane',
+                                     className='six columns'),
+                            html.Div(id='tree-right-pane',
+                                     className='six columns')
                         ],
                         className='row'
                     )
                 ]
             )
-        ],
+        ] + corpus_tabs,
         style={'font-size': '1.9em'}
     )],
     className='ten columns offset-by-one'
 )
 
-# only works properly when seesoft is drawn with comments
-# seesoft and luacode interaction for left part of the screen
-app.clientside_callback(
-    '''
-    function scroll_lua_code_left(clickData) {
-        if (clickData) {
-            var element = document.getElementById("lua-code-left");
-            var element_text_id = "lua-code-left" + clickData.points[0].text;
-            var element_text = document.getElementById(element_text_id);
-            var color = element_text.style.backgroundColor;
-            var bounding = element.getBoundingClientRect();
-            var text_bounding = element_text.getBoundingClientRect();
-
-            // handle possible vertical scrolling
-            if (text_bounding.top < bounding.top ||
-                text_bounding.bottom > bounding.bottom) {
-                element.scrollTop = clickData.points[0].customdata;
-            }
-
-            // handle highlighting
-            if (color == "rgb(255, 173, 122)") {
-                element_text.classList.remove("require_animate");
-                void element_text.offsetWidth;
-                element_text.classList.add("require_animate");
-            }
-            else if (color == "rgb(117, 235, 135)") {
-                element_text.classList.remove("variable_animate");
-                void element_text.offsetWidth;
-                element_text.classList.add("variable_animate");
-            }
-            else if (color == "rgb(158, 203, 255)") {
-                element_text.classList.remove("function_animate");
-                void element_text.offsetWidth;
-                element_text.classList.add("function_animate");
-            }
-            else if (color == "rgb(229, 141, 240)") {
-                element_text.classList.remove("interface_animate");
-                void element_text.offsetWidth;
-                element_text.classList.add("interface_animate");
-            }
-            else if (color == "rgb(255, 236, 145)") {
-                element_text.classList.remove("other_animate");
-                void element_text.offsetWidth;
-                element_text.classList.add("other_animate");
-            }
-            else {
-                element_text.classList.remove("comment_animate");
-                void element_text.offsetWidth;
-                element_text.classList.add("comment_animate");
-            }
-        }
-        return "";
-    }
-    ''',
-    Output('hidden-div-left', 'children'),
-    [Input('see-soft-left', 'clickData')]
-)
 
-# seesoft and luacode interaction for the right part of the screen
-app.clientside_callback(
-    '''
-    function scroll_lua_code_right(clickData) {
-        if (clickData) {
-            var element = document.getElementById("lua-code-right");
-            var element_text_id = "lua-code-right" + clickData.points[0].text;
-            var element_text = document.getElementById(element_text_id);
-            var color = element_text.style.backgroundColor;
-            var bounding = element.getBoundingClientRect();
-            var text_bounding = element_text.getBoundingClientRect();
-
-            // handle possible vertical scrolling
-            if (text_bounding.top < bounding.top ||
-                text_bounding.bottom > bounding.bottom) {
-                element.scrollTop = clickData.points[0].customdata;
-            }
-
-            // handle highlighting
-            if (color == "rgb(255, 173, 122)") {
-                element_text.classList.remove("require_animate");
-                void element_text.offsetWidth;
-                element_text.classList.add("require_animate");
-            }
-            else if (color == "rgb(117, 235, 135)") {
-                element_text.classList.remove("variable_animate");
-                void element_text.offsetWidth;
-                element_text.classList.add("variable_animate");
-            }
-            else if (color == "rgb(158, 203, 255)") {
-                element_text.classList.remove("function_animate");
-                void element_text.offsetWidth;
-                element_text.classList.add("function_animate");
-            }
-            else if (color == "rgb(229, 141, 240)") {
-                element_text.classList.remove("interface_animate");
-                void element_text.offsetWidth;
-                element_text.classList.add("interface_animate");
-            }
-            else if (color == "rgb(255, 236, 145)") {
-                element_text.classList.remove("other_animate");
-                void element_text.offsetWidth;
-                element_text.classList.add("other_animate");
-            }
-            else {
-                element_text.classList.remove("comment_animate");
-                void element_text.offsetWidth;
-                element_text.classList.add("comment_animate");
-            }
-        }
-        return "";
-    }
-    ''',
-    Output('hidden-div-right', 'children'),
-    [Input('see-soft-right', 'clickData')]
-)
+# scatter plot of the module is shared by both panes, so its settings
+# are passed to every callback
+show_legend = {'left': False, 'right': True}
+
+# views of the chosen module, rendered views of recently chosen modules
+# are kept in memory, so that choosing them again is cheap
+for pane in ['left', 'right']:
+    def show_module(file, pane=pane):
+        if file not in file_paths:
+            raise PreventUpdate
+
+        module_views = views.get(file)
+        return [
+            [
+                module_views.render('luacode', dash_id='lua-code-' + pane,
+                                    columns='12', markup=True),
+                module_views.render('luacode', 'index',
+                                    dash_id='lua-code-' + pane)
+            ],
+            [module_views.render('seesoft', dash_id='see-soft-' + pane)],
+            module_views.render('scatterplot',
+                                dash_id='scatter-plot-' + pane, columns='12',
+                                show_legend=show_legend[pane],
+                                show_text=True),
+            module_views.render('tree', dash_id='tree-' + pane, columns='12')
+        ]
+
+    app.callback([Output('lua-code-{}-pane'.format(pane), 'children'),
+                  Output('see-soft-{}-pane'.format(pane), 'children'),
+                  Output('scatter-plot-{}-pane'.format(pane), 'children'),
+                  Output('tree-{}-pane'.format(pane), 'children')],
+                 [Input('module-' + pane, 'value')])(show_module)
+
+# replace tiles of large seesoft images after zoom or pan
+for seesoft_id in ['see-soft-' + pane for pane in panes]:
+    app.clientside_callback(
+        ClientsideFunction(namespace='seesoft', function_name='tiles'),
+        Output(seesoft_id, 'figure'),
+        [Input(seesoft_id, 'relayoutData')],
+        [State(seesoft_id, 'figure')]
+    )
+
+if wall:
+    app.clientside_callback(
+        ClientsideFunction(namespace='seesoft', function_name='tiles'),
+        Output('corpus-wall', 'figure'),
+        [Input('corpus-wall', 'relayoutData')],
+        [State('corpus-wall', 'figure')]
+    )
+
+    # open module whose thumbnail was clicked
+    @app.callback(Output('corpus-module', 'children'),
+                  [Input('corpus-wall', 'clickData')])
+    def open_module(clickData):
+        if not clickData or clickData['points'][0]['customdata'] \
+                not in wall.paths:
+            raise PreventUpdate
+
+        module_views = views.get(clickData['points'][0]['customdata'])
+        return [
+            html.Div([module_views.render('seesoft',
+                                          dash_id='see-soft-corpus')],
+                     style={'justify-content': 'center', 'display': 'flex'},
+                     className='four columns'),
+            module_views.render('luacode', dash_id='lua-code-corpus',
+                                columns='8', markup=True),
+            module_views.render('luacode', 'index', dash_id='lua-code-corpus')
+        ]
+
+# markers of zoomed nodes instead of density strips of large modules and
+# source code of hovered nodes, of the module chosen in the pane
+for pane in ['left', 'right']:
+    scatterplot_id = 'scatter-plot-' + pane
+
+    def relayout_scatter_plot(relayout_data, file, pane=pane):
+        if file not in file_paths:
+            raise PreventUpdate
+
+        figure = views.get(file).scatterplot.relayout(relayout_data,
+                                                      show_legend[pane])
+        if figure is None:
+            raise PreventUpdate
+
+        return figure
+
+    app.callback(Output(scatterplot_id, 'figure'),
+                 [Input(scatterplot_id, 'relayoutData')],
+                 [State('module-' + pane, 'value')])(relayout_scatter_plot)
+
+    # source code of hovered node is fetched only when it's needed
+    def show_node_text(hover_data, file):
+        if file not in file_paths:
+            raise PreventUpdate
+
+        text = views.get(file).scatterplot.hover(hover_data)
+        if text is None:
+            raise PreventUpdate
+
+        return text
+
+    app.callback(Output(scatterplot_id + '-text', 'children'),
+                 [Input(scatterplot_id, 'hoverData')],
+                 [State('module-' + pane, 'value')])(show_node_text)
+
+# subtrees of large trees are expanded and collapsed on click, trees
+# of small modules ignore clicks
+for pane in ['left', 'right']:
+    tree_id = 'tree-' + pane
+
+    def expand_tree(click_data, expanded, file):
+        if file not in file_paths:
+            raise PreventUpdate
+
+        result = views.get(file).tree.click(click_data, expanded)
+        if result is None:
+            raise PreventUpdate
+
+        return result
+
+    app.callback([Output(tree_id, 'figure'),
+                  Output(tree_id + '-expanded', 'data')],
+                 [Input(tree_id, 'clickData')],
+                 [State(tree_id + '-expanded', 'data'),
+                  State('module-' + pane, 'value')])(expand_tree)
+
+# only works properly when seesoft is drawn with comments
+# seesoft and luacode interaction, luacode is scrolled by the index
+# of its sections
+for pane in panes:
+    app.clientside_callback(
+        ClientsideFunction(namespace='lua_code', function_name='scroll'),
+        Output('hidden-div-' + pane, 'children'),
+        [Input('see-soft-' + pane, 'clickData')],
+        [State('lua-code-{}-index'.format(pane), 'data')]
+    )
 
 # maybe lua code sections and seesoft interaction could be fixed so that
 # whole node text would be one section instead of one line or part of the line
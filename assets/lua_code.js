@@ -0,0 +1,201 @@
+// windowed LuaCode views, see components/luacode_windows.py, only blocks of
+// lines around the visible part of the view are fetched and rendered,
+// views with markup get their whole HTML at once
+window.lua_code = (function() {
+    // blocks rendered above and below the visible ones
+    var BUFFER_BLOCKS = 1;
+    // fetched blocks by URL, so that scrolling back doesn't fetch them again
+    var cache = {};
+
+    function line_height(element) {
+        var style = window.getComputedStyle(element);
+        return parseFloat(style.lineHeight) || 1.2 * parseFloat(style.fontSize);
+    }
+
+    function block_height(element) {
+        return line_height(element) * parseInt(element.dataset.blockLines);
+    }
+
+    function fetch_block(element, block) {
+        var url = element.dataset.url + block + ".html";
+        if (!cache[url]) {
+            cache[url] = fetch(url).then(function(response) {
+                if (!response.ok) {
+                    delete cache[url];
+                    throw new Error(response.statusText);
+                }
+                return response.text();
+            });
+        }
+        return cache[url];
+    }
+
+    function show(element, block) {
+        var lines = element.querySelector(".lua-code-lines");
+        var url = element.dataset.url;
+        var selector = '[data-block="' + block + '"]';
+
+        var shown = lines.querySelector(selector);
+        if (shown) {
+            return Promise.resolve(shown);
+        }
+
+        return fetch_block(element, block).then(function(content) {
+            // block may have been shown meanwhile or the view has changed
+            var shown = lines.querySelector(selector);
+            if (shown || element.dataset.url !== url) {
+                return shown;
+            }
+
+            var div = document.createElement("div");
+            div.dataset.block = block;
+            div.style.position = "absolute";
+            div.style.top = block * block_height(element) + "px";
+            div.innerHTML = content;
+            lines.appendChild(div);
+            return div;
+        });
+    }
+
+    function update(element) {
+        var lines = element.querySelector(".lua-code-lines");
+        var blocks_count = JSON.parse(element.dataset.sections).length;
+        var height = block_height(element);
+
+        // blocks of previous module when the view was replaced
+        if (lines.dataset.url !== element.dataset.url) {
+            lines.innerHTML = "";
+            lines.dataset.url = element.dataset.url;
+        }
+        lines.style.position = "relative";
+        lines.style.height =
+            line_height(element) * parseInt(element.dataset.lines) + "px";
+
+        var top = element.scrollTop - lines.offsetTop;
+        var first = Math.max(0, Math.floor(top / height) - BUFFER_BLOCKS);
+        var last = Math.min(blocks_count - 1, Math.floor(
+            (top + element.clientHeight) / height) + BUFFER_BLOCKS);
+
+        Array.from(lines.children).forEach(function(child) {
+            var block = parseInt(child.dataset.block);
+            if (block < first || block > last) {
+                lines.removeChild(child);
+            }
+        });
+
+        var shown = [];
+        for (var block = first; block <= last; block++) {
+            shown.push(show(element, block));
+        }
+        return Promise.all(shown);
+    }
+
+    function init(element) {
+        if (!element.dataset.windowed) {
+            element.dataset.windowed = "true";
+
+            // at most one update per frame while scrolling
+            var pending = false;
+            element.addEventListener("scroll", function() {
+                if (!pending) {
+                    pending = true;
+                    window.requestAnimationFrame(function() {
+                        pending = false;
+                        update(element);
+                    });
+                }
+            }, {passive: true});
+        }
+
+        var lines = element.querySelector(".lua-code-lines");
+        if (lines && lines.dataset.url !== element.dataset.url) {
+            update(element);
+        }
+    }
+
+    // markup is set only when it has changed, React doesn't know about it
+    function render(element) {
+        if (element.lua_code_markup !== element.dataset.markup) {
+            element.lua_code_markup = element.dataset.markup;
+            element.innerHTML = element.dataset.markup;
+        }
+    }
+
+    // views are added by Dash after the page is loaded
+    new MutationObserver(function() {
+        document.querySelectorAll(".lua-code-windowed").forEach(init);
+        document.querySelectorAll(".lua-code-markup").forEach(render);
+    }).observe(document.documentElement, {
+        childList: true,
+        subtree: true,
+        attributes: true,
+        attributeFilter: ["data-url", "data-markup"]
+    });
+
+    return {
+        // promise of the element of the section, the block with the section
+        // is fetched first when the view is windowed
+        reveal: function(element, section) {
+            var id = element.id + section;
+            var span = document.getElementById(id);
+            if (span || !element.classList.contains("lua-code-windowed")) {
+                return Promise.resolve(span);
+            }
+
+            // last block which starts before the section
+            var sections = JSON.parse(element.dataset.sections);
+            var low = 0;
+            var high = sections.length - 1;
+            while (low < high) {
+                var middle = Math.ceil((low + high) / 2);
+                if (sections[middle] <= parseInt(section)) {
+                    low = middle;
+                } else {
+                    high = middle - 1;
+                }
+            }
+
+            return show(element, low).then(function() {
+                return document.getElementById(id);
+            });
+        }
+    };
+})();
+
+// scrolls LuaCode view to the section clicked in SeeSoft and highlights it,
+// line, offset and container of the section come from the index of the view
+// built by LuaCode.index, the same function is used for every pair of views
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    lua_code: {
+        scroll: function(clickData, index) {
+            if (!clickData || !index) {
+                return "";
+            }
+
+            var section = parseInt(clickData.points[0].text);
+            var top = index.lines[section - 1] * index.line_height;
+            var element = document.getElementById(index.id);
+
+            // handle possible vertical scrolling
+            if (top < element.scrollTop ||
+                top + index.line_height >
+                element.scrollTop + element.clientHeight) {
+                element.scrollTop = index.offsets[section - 1];
+            }
+
+            // handle highlighting, section of windowed lua code is there
+            // only when its block is loaded
+            var animation =
+                index.containers[index.codes[section - 1]] + "_animate";
+            window.lua_code.reveal(element, section).then(function(span) {
+                if (span) {
+                    span.classList.remove(animation);
+                    void span.offsetWidth;
+                    span.classList.add(animation);
+                }
+            });
+
+            return "";
+        }
+    }
+});
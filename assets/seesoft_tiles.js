@@ -0,0 +1,62 @@
+// tiles of SeeSoft image for the visible part of the zoomed figure, the same
+// computation as TileStore.layout_images in components/seesoft_tiles.py
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    seesoft: {
+        tiles: function(relayoutData, figure) {
+            var dash_clientside = window.dash_clientside;
+            var tiles = figure && figure.layout.meta && figure.layout.meta.tiles;
+            if (!relayoutData || !tiles) {
+                return dash_clientside.no_update;
+            }
+
+            // current ranges and size of the plot area in screen pixels
+            var prop_id = dash_clientside.callback_context.triggered[0].prop_id;
+            var element = document.getElementById(prop_id.split(".")[0]);
+            var plot = element.classList.contains("js-plotly-plot") ?
+                element : element.querySelector(".js-plotly-plot");
+            var x_range = plot._fullLayout.xaxis.range;
+            var y_range = plot._fullLayout.yaxis.range;
+
+            var scale = Math.max(
+                (x_range[1] - x_range[0]) / plot._fullLayout._size.w,
+                (y_range[1] - y_range[0]) / plot._fullLayout._size.h);
+            var level = scale <= 1 ? 0 : Math.min(
+                tiles.levels - 1, Math.floor(Math.log2(scale)));
+
+            var tile_scale = tiles.size * Math.pow(2, level);
+            var level_width = Math.ceil(tiles.width / Math.pow(2, level));
+            var level_height = Math.ceil(tiles.height / Math.pow(2, level));
+
+            var first_x = Math.max(0, Math.floor(x_range[0] / tile_scale));
+            var last_x = Math.min(Math.ceil(level_width / tiles.size) - 1,
+                Math.ceil(x_range[1] / tile_scale) - 1);
+            var first_y = Math.max(0,
+                Math.floor((tiles.height - y_range[1]) / tile_scale));
+            var last_y = Math.min(Math.ceil(level_height / tiles.size) - 1,
+                Math.ceil((tiles.height - y_range[0]) / tile_scale) - 1);
+
+            var images = [];
+            for (var y = first_y; y <= last_y; y++) {
+                for (var x = first_x; x <= last_x; x++) {
+                    var width = Math.min(tiles.size, level_width - x * tiles.size);
+                    var height = Math.min(tiles.size, level_height - y * tiles.size);
+                    images.push({
+                        x: x * tile_scale,
+                        sizex: width * Math.pow(2, level),
+                        y: tiles.height - y * tile_scale,
+                        sizey: height * Math.pow(2, level),
+                        xref: "x",
+                        yref: "y",
+                        opacity: 1,
+                        layer: "below",
+                        sizing: "stretch",
+                        source: tiles.url + level + "/" + x + "/" + y + ".png"
+                    });
+                }
+            }
+
+            var layout = Object.assign({}, figure.layout, {images: images});
+            return Object.assign({}, figure, {layout: layout});
+        }
+    }
+});
@@ -0,0 +1,125 @@
+import os
+import base64
+import hashlib
+import logging
+from threading import Lock
+from collections import OrderedDict
+import flask
+from preprocessing import disk_cache
+
+
+# upper bound of images kept in memory in bytes
+MAX_STORE_SIZE = 64 * 1024 * 1024
+ROUTE = '/images/'
+# content of an image never changes for the same key
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+log.addHandler(logging.StreamHandler())
+
+
+class ImageStore:
+    '''
+    encoded images kept in memory under sha1 of their content, so that the
+    same image is stored only once and its URL can be cached by browsers,
+    images are served by the Flask server of the Dash app after register()
+    least recently used images are dropped from memory, with cache_dir
+    they are read again from files there, so that an image put by one
+    server worker is found by any other (see preprocessing/disk_cache.py)
+    '''
+
+    def __init__(self, max_size: int, cache_dir=None):
+        self.max_size = max_size
+        self.cache_dir = cache_dir
+        self.images = OrderedDict()
+        self.lock = Lock()
+        self.server = None
+
+    def put(self, image: bytes, mimetype='image/png') -> str:
+        key = hashlib.sha1(image).hexdigest()
+        self.__remember(key, image, mimetype)
+
+        cache_file = self.__cache_file(key)
+        if cache_file and not os.path.exists(cache_file):
+            # mimetype is on the first line
+            disk_cache.save(cache_file, lambda f: f.write(
+                mimetype.encode() + b'\n' + image))
+
+        return key
+
+    # image and its mimetype, KeyError when the image is neither in memory
+    # nor in cache_dir
+    def get(self, key: str) -> tuple:
+        with self.lock:
+            if key in self.images:
+                self.images.move_to_end(key)
+                return self.images[key]
+
+        cache_file = self.__cache_file(key)
+        content = cache_file and disk_cache.load(
+            cache_file, lambda f: f.read().split(b'\n', 1))
+        if not content:
+            raise KeyError(key)
+
+        mimetype, image = content[0].decode(), content[1]
+        self.__remember(key, image, mimetype)
+        return image, mimetype
+
+    def __remember(self, key: str, image: bytes, mimetype: str):
+        with self.lock:
+            if key in self.images:
+                self.images.move_to_end(key)
+            else:
+                self.images[key] = (image, mimetype)
+                self.__evict()
+
+    # keys come from URLs, so only hex digests are accepted as file names
+    def __cache_file(self, key: str):
+        if self.cache_dir is None or not is_key(key):
+            return None
+
+        return os.path.join(self.cache_dir, key)
+
+    def __evict(self):
+        size = sum(len(image) for image, _ in self.images.values())
+        while size > self.max_size and len(self.images) > 1:
+            _, (image, _) = self.images.popitem(last=False)
+            size -= len(image)
+
+    # URL of the image when the store is served, data URI otherwise,
+    # KeyError when the image isn't stored anymore
+    def source(self, key: str) -> str:
+        if self.server is not None:
+            return ROUTE + key
+
+        image, mimetype = self.get(key)
+        return 'data:{};base64,{}'.format(mimetype,
+                                          base64.b64encode(image).decode())
+
+    def register(self, server: flask.Flask):
+        server.add_url_rule(ROUTE + '<key>', 'image_store', self.__serve)
+        self.server = server
+
+    def __serve(self, key: str):
+        try:
+            image, mimetype = self.get(key)
+        except KeyError:
+            flask.abort(404)
+
+        # key is the hash of the content, so it's also a strong ETag
+        if key in flask.request.if_none_match:
+            response = flask.Response(status=304)
+        else:
+            response = flask.Response(image, mimetype=mimetype)
+
+        response.set_etag(key)
+        response.headers['Cache-Control'] = CACHE_CONTROL
+        return response
+
+
+def is_key(key: str) -> bool:
+    return len(key) == 40 and all(c in '0123456789abcdef' for c in key)
+
+
+store = ImageStore(MAX_STORE_SIZE, disk_cache.directory('images'))
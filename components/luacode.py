@@ -1,131 +1,54 @@
-import logging
 import json
-import urllib
-import chardet
+import logging
+import numpy as np
 from typing import List
 from constant import COLORS
+from constant import CONTAINERS
 from constant import COLUMNS
+from constant import CONTAINER_CODES
 from constant import LUA_LINE_HEIGHT
+from components.luacode_windows import BLOCK_LINES
+from components.luacode_windows import CodeBlocks
+from components.luacode_windows import windows
+from preprocessing.module_document import ModuleDocument
 import dash_html_components as html
+import dash_core_components as dcc
 
 
+# views with more sections are rendered by the browser only around
+# the visible lines
+MAX_SECTIONS = 5000
+
 log = logging.getLogger(__name__)
 log.setLevel(logging.DEBUG)
 log.addHandler(logging.StreamHandler())
 
 
 class LuaCode:
-    def __init__(self, path=None, url=None):
-        if all(arg is None for arg in {path, url}):
-            raise ValueError('Expected either path or url argument')
-
-        if path:
-            with open(path) as f:
-                self.data = json.load(f)
-        else:
-            log.debug('Loading data file from {}'.format(url))
-            with urllib.request.urlopen(url) as url_data:
-                self.data = json.loads(url_data.read().decode())
-
-        self.source_code = self.__read_source_code()
-        self.tag_table = [dict() for _ in range(len(self.source_code))]
+    def __init__(self, path=None, url=None, document=None):
+        # document is shared with other views of the same module
+        self.document = document or ModuleDocument.load(path, url)
+        self.data = self.document.data
+        self.tree = self.document.tree
+        self.source_code = self.document.source_code
+        self.tag_table = None
         self.color_text_table = list()
 
-    # read original lua source code
-    def __read_source_code(self) -> str:
-        # if there's path provided read form it, otherwise read from url
-        if self.data['path']:
-            raw_data = open(self.data['path'], 'rb').read()
-
-        else:
-            log.debug('Loading module file from {}'.format(self.data['url']))
-            url_file = urllib.request.urlopen(self.data['url'])
-            raw_data = url_file.read()
-
-        chardet_result = chardet.detect(raw_data)
-        if chardet_result['encoding'] not in ['ascii', 'utf-8']:
-            raw_data = raw_data.decode('iso-8859-1').encode('utf-8')
-
-        return raw_data.decode('utf-8')
-
-    # builds tag table so that every character from source file has color
-    # assigned according to the container from json file
-    def __add_color(self, node: dict):
-        position = node['position'] - 1
-        for i in range(position, position + node['characters_count']):
-            self.tag_table[i]['container'] = node['container']
-            self.tag_table[i]['char'] = self.source_code[i]
-
-            if 'children' in node:
-                for child in node['children']:
-                    self.__add_color(child)
-
+    # container code of every character from source file, shared with other
+    # views of the module, see preprocessing/tag_table.py
     def __build_tag_table(self):
-        # assign container to each character form source code
-        for node in self.data['nodes']:
-            self.__add_color(node)
-
-        # add None container to characters which don't belong anywhere
-        for i, byte in enumerate(self.tag_table):
-            if not byte:
-                byte['container'] = None
-                byte['char'] = self.source_code[i]
-
-            if byte['char'] == '\n':
-                byte['container'] = None
-
-        # remove '\r'
-        self.tag_table = list(
-            filter(lambda b: b['char'] != '\r', self.tag_table)
-        )
-
-        # add comments and other code segments which don't belong to any
-        # container to 'comment' container
-        for byte in self.tag_table:
-            if not byte['container'] and not byte['char'].isspace():
-                byte['container'] = 'comment'
-
-        # make spaces in comments colorful instead of white
-        for i, byte in enumerate(self.tag_table):
-            if (
-                    byte['char'] == ' '
-                    and i - 1 >= 0
-                    and i + 1 < len(self.tag_table)
-                    and self.tag_table[i - 1]['container'] == 'comment'
-                    and self.tag_table[i + 1]['container'] == 'comment'
-            ):
-                byte['container'] = 'comment'
-
-        # handle white spaces in the beginning of the line
-        # it's about keeping tabs white in the final image
-        for i, byte in enumerate(self.tag_table):
-            if byte['char'] == '\n':
-                j = i + 1
-
-                while (j < len(self.tag_table) and
-                       self.tag_table[j]['char'].isspace()):
-                    self.tag_table[j]['container'] = None
-                    j += 1
+        self.tag_table = self.document.tags()
 
     # from tag_table builds list of directories, where each element consists of
     # hex color and text (not just char anymore)
     def __build_color_text_table(self):
-        self.color_text_table.append(
-            {'text': self.tag_table[0]['char'],
-             'color': COLORS[self.tag_table[0]['container']]}
-        )
-
-        for i in range(1, len(self.tag_table)):
-            if (
-                    self.tag_table[i]['container'] ==
-                    self.tag_table[i - 1]['container']
-            ):
-                self.color_text_table[-1]['text'] += self.tag_table[i]['char']
-            else:
-                self.color_text_table.append(
-                    {'text': self.tag_table[i]['char'],
-                     'color': COLORS[self.tag_table[i]['container']]}
-                )
+        text = self.tag_table.text
+        self.color_text_table = [
+            {'text': text[start:end], 'color': COLORS[CONTAINERS[code]],
+             'container': CONTAINERS[code]}
+            for start, end, code in zip(*(
+                run.tolist() for run in self.tag_table.runs()))
+        ]
 
     def get_children(self, parent_id: str) -> List:
         children = list()
@@ -144,7 +67,9 @@ class LuaCode:
                         children=section['text'],
                         style={
                             'background-color': section['color']
-                        }
+                        },
+                        # container is used for highlighting
+                        className=section['container']
                     )
                 )
 
@@ -154,23 +79,95 @@ class LuaCode:
 
     # children may contain pure string element, html.Br() or html.Span element
     # with corresponding color background
-    def view(self, dash_id: str, columns: str):
+    # windowed=None renders only visible lines of views with more than
+    # MAX_SECTIONS sections when the window store is served by the app,
+    # markup=True sends the whole code as one HTML string instead
+    def view(self, dash_id: str, columns: str, windowed=None, markup=False):
         self.__build_tag_table()
+        style = {
+            'background-color': COLORS['code-background'],
+            'font-family': 'Courier, monospace',
+            'color': 'black',
+            'font-size': '10px',
+            'line-height': LUA_LINE_HEIGHT,
+            'padding': '20px',
+            'max-height': '80vh',
+            'overflow': 'auto'
+        }
+
+        if windowed is None:
+            windowed = (windows.server is not None
+                        and self.__sections_count() > MAX_SECTIONS)
+        if windowed:
+            return self.__windowed_view(dash_id, columns, style)
+        if markup:
+            return self.__markup_view(dash_id, columns, style)
+
         self.__build_color_text_table()
         children = self.get_children(dash_id)
 
         return html.Pre(
             id=dash_id,
             children=children,
-            style={
-                'background-color': COLORS['code-background'],
-                'font-family': 'Courier, monospace',
-                'color': 'black',
-                'font-size': '10px',
-                'line-height': LUA_LINE_HEIGHT,
-                'padding': '20px',
-                'max-height': '80vh',
-                'overflow': 'auto'
-            },
-            className=COLUMNS[columns]
+            style=style,
+            className=COLUMNS[columns] + ' lua-code'
+        )
+
+    def __sections_count(self) -> int:
+        _, _, codes = self.tag_table.runs()
+        return int(np.count_nonzero(codes != CONTAINER_CODES[None]))
+
+    # only an empty element as high as all the lines is sent, blocks of lines
+    # are fetched from the window store by assets/lua_code.js when they are
+    # scrolled to, section table stays on the server
+    def __windowed_view(self, dash_id: str, columns: str, style: dict):
+        code_blocks = windows.add(CodeBlocks.from_tag_table(self.tag_table))
+
+        return html.Pre(
+            id=dash_id,
+            children=html.Div(className='lua-code-lines'),
+            style=dict(style, position='relative'),
+            className=COLUMNS[columns] + ' lua-code lua-code-windowed',
+            **{
+                'data-url': windows.url(code_blocks.key, dash_id),
+                'data-lines': code_blocks.lines_count,
+                'data-block-lines': BLOCK_LINES,
+                'data-sections': json.dumps(code_blocks.first_sections)
+            }
+        )
+
+    # code rendered once into HTML with the same span ids, colors are set
+    # by classes from stylesheet.css, HTML is cached by hash of the code
+    # and put into the element by assets/lua_code.js
+    def __markup_view(self, dash_id: str, columns: str, style: dict):
+        code_blocks = windows.add(CodeBlocks.from_tag_table(self.tag_table))
+
+        return html.Pre(
+            id=dash_id,
+            style=style,
+            className=COLUMNS[columns] + ' lua-code lua-code-markup',
+            **{
+                'data-markup': windows.html(code_blocks.key,
+                                            dash_id).decode('utf-8')
+            }
+        )
+
+    # line, scroll offset and container of every section for the
+    # lua_code.scroll clientside callback, built once per module
+    def index(self, dash_id: str):
+        self.__build_tag_table()
+        lines, codes = self.tag_table.sections()
+
+        return dcc.Store(
+            id=dash_id + '-index',
+            data={
+                'id': dash_id,
+                'lines': lines.tolist(),
+                # one line above the section, so that there's some space
+                # above it after scrolling
+                'offsets': ((lines - 1) * LUA_LINE_HEIGHT).tolist(),
+                'line_height': LUA_LINE_HEIGHT,
+                'codes': codes.tolist(),
+                'containers': CONTAINERS
+            }
         )
@@ -0,0 +1,243 @@
+import os
+import sys
+import html
+import hashlib
+import logging
+import numpy as np
+from threading import Lock
+from collections import OrderedDict
+from constant import CONTAINERS
+from constant import CONTAINER_CODES
+import flask
+from components.image_store import is_key
+from preprocessing import disk_cache
+
+
+# number of lines fetched by the browser at once
+BLOCK_LINES = 200
+# upper bound of rendered blocks kept in memory in bytes
+MAX_WINDOW_CACHE_SIZE = 32 * 1024 * 1024
+# upper bound of code blocks kept in memory in bytes
+MAX_CODE_BLOCKS_SIZE = 64 * 1024 * 1024
+ROUTE = '/lua-code/'
+# content of a block never changes for the same URL
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+log.addHandler(logging.StreamHandler())
+
+
+class CodeBlocks:
+    '''
+    colored sections of lua code split into blocks of BLOCK_LINES lines,
+    every block is rendered to HTML only when the browser scrolls to it
+    (or the whole file at once for views with markup=True), sections are
+    numbered through the whole file as in LuaCode.get_children
+    '''
+
+    def __init__(self, text: str, starts: np.ndarray, ends: np.ndarray,
+                 codes: np.ndarray, newlines: np.ndarray):
+        self.text = text
+        self.starts, self.ends, self.codes = starts, ends, codes
+        self.newlines = newlines
+        # colors of containers are in stylesheet.css
+        self.classes = [CONTAINERS[code] for code in codes.tolist()]
+
+        # colored sections never contain '\n', so they never cross blocks
+        colored = codes != CONTAINER_CODES[None]
+        self.sections = np.cumsum(colored) * colored
+
+        self.lines_count = len(newlines) + 1
+        line_starts = np.concatenate(([0], newlines + 1))
+        self.block_starts = np.append(line_starts[::BLOCK_LINES],
+                                      len(self.text))
+
+        # first section of every block, so that the browser knows which
+        # block to fetch for a clicked section
+        self.first_sections = (np.searchsorted(
+            self.starts[colored], self.block_starts[:-1]) + 1).tolist()
+
+        self.key = hashlib.sha1(
+            self.text.encode('utf-8') + codes.tobytes()).hexdigest()
+
+    @classmethod
+    def from_tag_table(cls, tag_table) -> 'CodeBlocks':
+        return cls(tag_table.text, *tag_table.runs(),
+                   np.flatnonzero(tag_table.characters == ord('\n')))
+
+    # arrays from which the same code blocks are created by from_arrays()
+    def arrays(self) -> dict:
+        return {'text': np.frombuffer(self.text.encode('utf-8'),
+                                      dtype=np.uint8),
+                'starts': self.starts, 'ends': self.ends,
+                'codes': self.codes, 'newlines': self.newlines}
+
+    @classmethod
+    def from_arrays(cls, arrays: dict) -> 'CodeBlocks':
+        return cls(arrays['text'].tobytes().decode('utf-8'),
+                   arrays['starts'], arrays['ends'], arrays['codes'],
+                   arrays['newlines'])
+
+    # bytes of memory taken by the code blocks
+    @property
+    def nbytes(self) -> int:
+        arrays = (self.starts, self.ends, self.codes, self.newlines,
+                  self.sections, self.block_starts)
+        return (sys.getsizeof(self.text) + sys.getsizeof(self.classes)
+                + sum(array.nbytes for array in arrays))
+
+    @property
+    def blocks_count(self) -> int:
+        return len(self.block_starts) - 1
+
+    # HTML of the block, block=None is the whole file
+    def html(self, parent_id: str, block=None) -> str:
+        if block is None:
+            start, end = 0, len(self.text)
+        elif 0 <= block < self.blocks_count:
+            start, end = self.block_starts[block:block + 2].tolist()
+        else:
+            raise KeyError(block)
+
+        first = np.searchsorted(self.ends, start, side='right')
+        last = np.searchsorted(self.starts, end, side='left')
+
+        children = list()
+        for run in range(first, last):
+            text = html.escape(self.text[max(self.starts[run], start):
+                                         min(self.ends[run], end)])
+            if self.sections[run]:
+                children.append(
+                    '<span id="{}{}" class="{}">{}</span>'.format(
+                        html.escape(parent_id), self.sections[run],
+                        self.classes[run], text))
+            else:
+                children.append(text)
+
+        return ''.join(children)
+
+
+def read_code_blocks(f) -> CodeBlocks:
+    with np.load(f) as arrays:
+        return CodeBlocks.from_arrays(arrays)
+
+
+class WindowStore:
+    '''
+    code blocks of LuaCode views and their rendered HTML, keyed by hash
+    of the code, least recently used code blocks and rendered blocks are
+    dropped, with cache_dir code blocks are created again from files there,
+    blocks are served by the Flask server of the Dash app after register()
+    '''
+
+    def __init__(self, max_size: int, max_code_blocks_size: int,
+                 cache_dir=None):
+        self.max_size = max_size
+        self.max_code_blocks_size = max_code_blocks_size
+        self.cache_dir = cache_dir
+        self.code_blocks = OrderedDict()
+        self.code_blocks_size = 0
+        self.blocks = OrderedDict()
+        self.size = 0
+        self.lock = Lock()
+        self.server = None
+
+    # the same code has the same key, so it's kept only once
+    def add(self, code_blocks: CodeBlocks) -> CodeBlocks:
+        code_blocks = self.__remember(code_blocks)
+
+        cache_file = self.__cache_file(code_blocks.key)
+        if cache_file and not os.path.exists(cache_file):
+            disk_cache.save(cache_file,
+                            lambda f: np.savez(f, **code_blocks.arrays()))
+
+        return code_blocks
+
+    def get(self, key: str) -> CodeBlocks:
+        with self.lock:
+            if key in self.code_blocks:
+                self.code_blocks.move_to_end(key)
+                return self.code_blocks[key]
+
+        # cache file which can't be read is a miss
+        cache_file = self.__cache_file(key)
+        code_blocks = cache_file and disk_cache.load(cache_file,
+                                                     read_code_blocks)
+        if code_blocks is None:
+            raise KeyError(key)
+
+        return self.__remember(code_blocks)
+
+    def __remember(self, code_blocks: CodeBlocks) -> CodeBlocks:
+        with self.lock:
+            if code_blocks.key in self.code_blocks:
+                self.code_blocks.move_to_end(code_blocks.key)
+                return self.code_blocks[code_blocks.key]
+
+            self.code_blocks[code_blocks.key] = code_blocks
+            self.code_blocks_size += code_blocks.nbytes
+            while (
+                    self.code_blocks_size > self.max_code_blocks_size
+                    and len(self.code_blocks) > 1
+            ):
+                _, old_code_blocks = self.code_blocks.popitem(last=False)
+                self.code_blocks_size -= old_code_blocks.nbytes
+
+        return code_blocks
+
+    # keys come from URLs, so only hex digests are accepted as file names
+    def __cache_file(self, key: str):
+        if self.cache_dir is None or not is_key(key):
+            return None
+
+        return os.path.join(self.cache_dir, key + '.npz')
+
+    def html(self, key: str, parent_id: str, block=None) -> bytes:
+        block_key = (key, parent_id, block)
+        with self.lock:
+            if block_key in self.blocks:
+                self.blocks.move_to_end(block_key)
+                return self.blocks[block_key]
+
+        code_blocks = self.get(key)
+
+        content = code_blocks.html(parent_id, block).encode('utf-8')
+
+        with self.lock:
+            if block_key not in self.blocks:
+                self.blocks[block_key] = content
+                self.size += len(content)
+            while self.size > self.max_size and len(self.blocks) > 1:
+                _, old_content = self.blocks.popitem(last=False)
+                self.size -= len(old_content)
+
+        return content
+
+    @staticmethod
+    def url(key: str, parent_id: str) -> str:
+        return '{}{}/{}/'.format(ROUTE, key, parent_id)
+
+    def register(self, server: flask.Flask):
+        server.add_url_rule(ROUTE + '<key>/<parent_id>/<int:block>.html',
+                            'lua_code_windows', self.__serve)
+        self.server = server
+
+    def __serve(self, key: str, parent_id: str, block: int):
+        etag = '{}-{}-{}'.format(key, parent_id, block)
+        if etag in flask.request.if_none_match:
+            response = flask.Response(status=304)
+        else:
+            try:
+                content = self.html(key, parent_id, block)
+            except KeyError:
+                flask.abort(404)
+            response = flask.Response(content, mimetype='text/html')
+
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = CACHE_CONTROL
+        return response
+
+
+windows = WindowStore(MAX_WINDOW_CACHE_SIZE, MAX_CODE_BLOCKS_SIZE,
+                      disk_cache.directory('lua-code'))
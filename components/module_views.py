@@ -0,0 +1,109 @@
+import logging
+from threading import Lock
+from collections import OrderedDict
+from components.luacode import LuaCode
+from components.scatterplot import ScatterPlot
+from components.seesoft import SeeSoft
+from components.tree import Tree
+from preprocessing.manifest import fingerprint
+from preprocessing.manifest import source_fingerprint
+from preprocessing.module_document import ModuleDocument
+
+
+# number of modules whose components and rendered views are kept in memory
+MAX_MODULES = 8
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+log.addHandler(logging.StreamHandler())
+
+
+class ModuleViews:
+    '''
+    components of one module sharing its document, every view is rendered
+    only once for the same arguments, e.g. for the same dash_id
+    '''
+
+    def __init__(self, path: str):
+        self.document = ModuleDocument.load(path)
+        self.seesoft = SeeSoft(document=self.document, comments=True)
+        self.seesoft.draw(palette=True)
+        self.luacode = LuaCode(document=self.document)
+        self.scatterplot = ScatterPlot(document=self.document)
+        self.tree = Tree(document=self.document)
+        self.views = dict()
+        self.lock = Lock()
+
+    # view rendered by method of component, e.g. render('luacode', 'index',
+    # dash_id='lua-code-left') is LuaCode.index(dash_id='lua-code-left')
+    def render(self, component: str, method='view', **kwargs):
+        key = (component, method, tuple(sorted(kwargs.items())))
+        with self.lock:
+            if key in self.views:
+                return self.views[key]
+
+        view = getattr(getattr(self, component), method)(**kwargs)
+
+        with self.lock:
+            return self.views.setdefault(key, view)
+
+
+class ViewCache:
+    '''
+    least recently used modules with their components and rendered views,
+    keyed by path and sha1 of .json file and sha1 of its lua file, so that
+    a module is loaded and rendered again when either of them has changed
+    '''
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.modules = OrderedDict()
+        # last fingerprints of .json and lua file of every path in modules,
+        # content is hashed only when the file was touched since
+        self.fingerprints = dict()
+        self.lock = Lock()
+
+    def get(self, path: str) -> ModuleViews:
+        with self.lock:
+            previous = self.fingerprints.get(path, dict())
+        current = fingerprint(path, previous.get('json'))
+        # lua file is known only from .json file, so the one of the last
+        # rendered version is checked, changed .json file is rendered anyway
+        source = source_fingerprint(previous.get('source_path'),
+                                    previous.get('source'))
+        key = (path, current['sha1'], source and source['sha1'])
+
+        with self.lock:
+            if key in self.modules:
+                self.modules.move_to_end(key)
+                return self.modules[key]
+
+        log.debug('Rendering views of {}'.format(path))
+        module_views = ModuleViews(path)
+        source_path = module_views.document.data.get('path')
+        source = source_fingerprint(source_path, source)
+        key = (path, current['sha1'], source and source['sha1'])
+
+        with self.lock:
+            self.fingerprints[path] = {'json': current,
+                                       'source_path': source_path,
+                                       'source': source}
+            # older versions of the same file are not needed anymore
+            for old_key in [k for k in self.modules if k[0] == path]:
+                del self.modules[old_key]
+
+            self.modules[key] = module_views
+            while len(self.modules) > self.max_size:
+                (old_path, _, _), _ = self.modules.popitem(last=False)
+                # only one version of a path is kept
+                self.fingerprints.pop(old_path, None)
+
+        return module_views
+
+    def clear(self):
+        with self.lock:
+            self.modules.clear()
+            self.fingerprints.clear()
+
+
+views = ViewCache(MAX_MODULES)
@@ -1,112 +1,114 @@
 import logging
-import json
-import urllib
-import chardet
+import numpy as np
+from threading import Lock
+from collections import OrderedDict
 from constant import COLORS
 from constant import COLUMNS
+from constant import CONTAINER_CODES
+from preprocessing.module_document import ModuleDocument
 import plotly.graph_objects as go
 import dash_core_components as dcc
+import dash_html_components as html
 
 
+# containers of the traces
+TRACES = ['require', 'variable', 'function', 'interface', 'other']
+# more visible nodes are drawn with WebGL
+MAX_SVG_NODES = 5000
+# more visible nodes are aggregated into density strips
+MAX_MARKERS = 20000
+DENSITY_BINS = 400
+# longer source code of hovered node is cut
+MAX_SNIPPET_LENGTH = 500
+# number of snippets kept in memory by every scatter plot
+MAX_SNIPPETS = 4096
+
 log = logging.getLogger(__name__)
 log.setLevel(logging.DEBUG)
 log.addHandler(logging.StreamHandler())
 
 
 class ScatterPlot:
-    def __init__(self, path=None, url=None):
-        if all(arg is None for arg in {path, url}):
-            raise ValueError('Expected either path or url argument')
-
-        if path:
-            with open(path) as f:
-                self.data = json.load(f)
-
-        else:
-            log.debug('Loading data file from {}'.format(url))
-            with urllib.request.urlopen(url) as url_data:
-                self.data = json.loads(url_data.read().decode())
-
-        self.source_code = self.__read_source_code()
-        self.traces = {
-            'require': {
-                'x': list(),
-                'y': list(),
-                'text': list(),
-                'color': COLORS['require']
-            },
-            'variable': {
-                'x': list(),
-                'y': list(),
-                'text': list(),
-                'color': COLORS['variable']
-            },
-            'function': {
-                'x': list(),
-                'y': list(),
-                'text': list(),
-                'color': COLORS['function']
-            },
-            'interface': {
-                'x': list(),
-                'y': list(),
-                'text': list(),
-                'color': COLORS['interface']
-            },
-            'other': {
-                'x': list(),
-                'y': list(),
-                'text': list(),
-                'color': COLORS['other']
-            }
-        }
-
-    def __read_source_code(self) -> str:
-        # if there's path provided read form it, otherwise read from url
-        if self.data['path']:
-            raw_data = open(self.data['path'], 'rb').read()
-
-        else:
-            log.debug('Loading module file from {}'.format(self.data['url']))
-            url_file = urllib.request.urlopen(self.data['url'])
-            raw_data = url_file.read()
-
-        chardet_result = chardet.detect(raw_data)
-        if chardet_result['encoding'] not in ['ascii', 'utf-8']:
-            raw_data = raw_data.decode('iso-8859-1').encode('utf-8')
-
-        return raw_data.decode('utf-8')
-
-    def __add_node_to_trace(self, node):
-        self.traces[node['container']]['x'].append(node['master_index'])
-        self.traces[node['container']]['y'].append(node['container'])
-        self.traces[node['container']]['text'].append(
-            (
-                self.source_code[node['position'] - 1:
-                                 node['position'] + node['characters_count']]
-            ).replace('\n', '<br>')
-        )
-
-        if 'children' in node:
-            for child in node['children']:
-                self.__add_node_to_trace(child)
-
-    def __add_traces(self, fig, show_text):
-        for node in self.data['nodes']:
-            self.__add_node_to_trace(node)
-
-        for trace in self.traces:
+    def __init__(self, path=None, url=None, document=None):
+        # document is shared with other views of the same module
+        self.document = document or ModuleDocument.load(path, url)
+        self.data = self.document.data
+        self.tree = self.document.tree
+        self.source_code = self.document.source_code
+        # sorted nodes of every trace
+        self.nodes = None
+        # source code of hovered nodes by node and snippet length, the plot
+        # is shared by views with different settings, least recently used
+        # are dropped
+        self.snippets = OrderedDict()
+        self.snippets_lock = Lock()
+        self.__ends = None
+
+    # nodes are split by container once, sorted, so that nodes in x range
+    # are found by binary search
+    def __add_nodes_to_traces(self):
+        if self.nodes is not None:
+            return
+
+        nodes = self.tree.preorder[1:]
+        codes = self.tree.containers[nodes]
+        self.nodes = {trace: np.sort(nodes[codes == CONTAINER_CODES[trace]])
+                      for trace in TRACES}
+
+    # source code of the node, cut to snippet_length characters
+    def snippet(self, node: int, snippet_length=MAX_SNIPPET_LENGTH) -> str:
+        key = (node, snippet_length)
+        with self.snippets_lock:
+            if key in self.snippets:
+                self.snippets.move_to_end(key)
+                return self.snippets[key]
+
+        if self.__ends is None:
+            # text includes one character after the node
+            self.__ends = self.document.source.offsets(
+                self.tree.positions + self.tree.characters_counts)
+        start = int(self.document.spans[0][node])
+        end = int(self.__ends[node])
+
+        snippet = self.source_code[start:min(end, start + snippet_length)]
+        if end - start > snippet_length:
+            snippet += '...'
+
+        with self.snippets_lock:
+            self.snippets[key] = snippet
+            while len(self.snippets) > MAX_SNIPPETS:
+                self.snippets.popitem(last=False)
+
+        return snippet
+
+    # snippet of the node under the cursor, figure contains only node ids
+    # in x, None for density strips
+    def hover(self, hover_data: dict, snippet_length=MAX_SNIPPET_LENGTH):
+        if not hover_data or 'z' in hover_data['points'][0]:
+            return None
+
+        node = int(hover_data['points'][0]['x'])
+        if not 0 < node < len(self.tree.containers):
+            return None
+
+        return self.snippet(node, snippet_length)
+
+    def __add_markers(self, fig, nodes: dict):
+        # SVG gets slow with many markers
+        visible = sum(len(trace_nodes) for trace_nodes in nodes.values())
+        scatter = go.Scattergl if visible > MAX_SVG_NODES else go.Scatter
+
+        for trace in TRACES:
             fig.add_trace(
-                go.Scatter(
+                scatter(
                     name=trace,
-                    x=self.traces[trace]['x'],
-                    y=self.traces[trace]['y'],
-                    hovertext=self.traces[trace]['text'] if show_text else '',
+                    x=nodes[trace],
+                    y=[trace] * len(nodes[trace]),
                     mode='markers',
                     opacity=0.8,
-                    hoverinfo='x+y+text' if show_text else 'x+y',
+                    hoverinfo='x+y',
                     marker={
-                        'color': self.traces[trace]['color'],
+                        'color': COLORS[trace],
                         'size': 10,
                         'line': {
                             'width': 0.5,
@@ -116,9 +118,49 @@ class ScatterPlot:
                 )
             )
 
-    def get_figure(self, show_legend=False, show_text=False):
+    # number of nodes of every container in DENSITY_BINS bins of x range,
+    # counted by binary search in sorted nodes, so it doesn't depend
+    # on the number of nodes
+    def __add_density(self, fig, x_range: tuple):
+        edges = np.linspace(x_range[0], x_range[1], DENSITY_BINS + 1)
+
+        for trace in TRACES:
+            counts = np.diff(np.searchsorted(self.nodes[trace], edges))
+            fig.add_trace(
+                go.Heatmap(
+                    name=trace,
+                    x=(edges[:-1] + edges[1:]) / 2,
+                    y=[trace],
+                    z=[counts],
+                    zmin=0,
+                    colorscale=[[0, COLORS['empty']], [1, COLORS[trace]]],
+                    showscale=False,
+                    hovertemplate='%{x:.0f}: %{z} nodes<extra>%{y}</extra>'
+                )
+            )
+
+    # markers of nodes in x range, density strips when there are too many
+    def __add_traces(self, fig, x_range=None):
+        self.__add_nodes_to_traces()
+        first, last = x_range or (0, len(self.tree.containers))
+
+        nodes = dict()
+        for trace in TRACES:
+            start = np.searchsorted(self.nodes[trace], first)
+            end = np.searchsorted(self.nodes[trace], last, side='right')
+            nodes[trace] = self.nodes[trace][start:end]
+
+        if sum(len(trace_nodes) for trace_nodes in nodes.values()) \
+                > MAX_MARKERS:
+            self.__add_density(fig, (first, last))
+        else:
+            self.__add_markers(fig, nodes)
+
+    # x_range is set after zoom, see relayout, source code of nodes
+    # is shown on hover by the view
+    def get_figure(self, show_legend=False, x_range=None):
         fig = go.Figure()
-        self.__add_traces(fig, show_text)
+        self.__add_traces(fig, x_range)
 
         # consider adding some interaction with lua code or seesoft
         # maybe in seesoft the markers might appear after highlighting point
@@ -134,18 +176,60 @@ class ScatterPlot:
             },
             yaxis={'title': 'Container'},
             margin={'l': 40, 'r': 40, 'b': 40, 't': 40},
-            showlegend=show_legend
+            showlegend=show_legend,
+            # keep zoom when the figure is replaced after relayout
+            uirevision=True
         )
+        if x_range:
+            fig.update_xaxes(range=list(x_range))
 
         return fig
 
+    # figure with markers or density strips for x range of relayout event,
+    # None when x range hasn't changed, show_legend has to be the same
+    # as in the view
+    def relayout(self, relayout_data: dict, show_legend=False):
+        relayout_data = relayout_data or dict()
+        if relayout_data.get('xaxis.autorange'):
+            x_range = None
+        elif 'xaxis.range[0]' in relayout_data:
+            x_range = (relayout_data['xaxis.range[0]'],
+                       relayout_data['xaxis.range[1]'])
+        elif 'xaxis.range' in relayout_data:
+            x_range = tuple(relayout_data['xaxis.range'])
+        else:
+            return None
+
+        return self.get_figure(show_legend, x_range)
+
+    # with show_text the source code of hovered node is shown below the graph
+    # in element dash_id + '-text', see hover
     def view(self, dash_id: str, columns: str, height=None,
              show_legend=False, show_text=False):
-        return dcc.Graph(
+        graph = dcc.Graph(
             id=dash_id,
-            figure=self.get_figure(show_legend, show_text),
+            figure=self.get_figure(show_legend),
             style={
                 'height': height or '30vh'
             },
+            className=None if show_text else COLUMNS[columns]
+        )
+        if not show_text:
+            return graph
+
+        return html.Div(
+            children=[
+                graph,
+                html.Pre(
+                    id=dash_id + '-text',
+                    style={
+                        'font-family': 'Courier, monospace',
+                        'font-size': '10px',
+                        'height': '8vh',
+                        'overflow': 'auto',
+                        'margin': 0
+                    }
+                )
+            ],
             className=COLUMNS[columns]
         )
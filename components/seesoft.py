@@ -1,13 +1,17 @@
+import io
 import logging
-import json
-import urllib
-import chardet
+import numpy as np
 from PIL import Image
-from PIL import ImageDraw
+from PIL import ImageColor
 from constant import COLORS
-from constant import LUA_LINE_HEIGHT
+from constant import CONTAINERS
+from constant import CONTAINER_CODES
+from components.image_store import store
+from components.seesoft_tiles import TILE_SIZE
+from components.seesoft_tiles import TilePyramid
+from components.seesoft_tiles import tiles
+from preprocessing.module_document import ModuleDocument
 import plotly.graph_objects as go
-import base64
 import dash_core_components as dcc
 
 
@@ -16,6 +20,17 @@ BYTE_HEIGHT = 10
 MARGIN_SIZE = 20
 MAX_VIEW_WIDTH = 200
 MAX_VIEW_HEIGHT = 760
+# bigger images are split into tiles which are loaded when zooming
+MAX_IMAGE_PIXELS = 16 * 1024 * 1024
+
+# RGB color of every container code shifted by 1, index 0 is for pixels
+# which aren't covered by any character
+PALETTE = np.array(
+    [ImageColor.getrgb(COLORS['empty'])]
+    + [ImageColor.getrgb(COLORS.get(container) or COLORS['empty'])
+       for container in CONTAINERS],
+    dtype=np.uint8
+)
 
 log = logging.getLogger(__name__)
 log.setLevel(logging.DEBUG)
@@ -23,154 +38,138 @@ log.addHandler(logging.StreamHandler())
 
 
 class SeeSoft:
-    def __init__(self, path=None, url=None, comments=True):
-        if all(arg is None for arg in {path, url}):
-            raise ValueError('Expected either path or url argument')
-
-        if path:
-            with open(path) as f:
-                self.data = json.load(f)
-        else:
-            log.debug('Loading data file from {}'.format(url))
-            with urllib.request.urlopen(url) as url_data:
-                self.data = json.loads(url_data.read().decode())
-
-        self.img_path = 'image.png'
+    def __init__(self, path=None, url=None, comments=True,
+                 document=None):
+        # document is shared with other views of the same module
+        self.document = document or ModuleDocument.load(path, url)
+        self.data = self.document.data
+        self.tree = self.document.tree
+
+        # image is kept in memory, it's written to img_path only when set
+        self.img_path = None
+        self.img_key = None
+        self.pyramid = None
         self.img_width = 0
         self.img_height = 0
         self.byte_width = BYTE_WIDTH
         self.byte_height = BYTE_HEIGHT
         self.margin_size = MARGIN_SIZE
         self.comments = comments
-        self.source_code = self.__read_source_code()
-        self.tag_table = [dict() for _ in range(len(self.source_code))]
-
-    def __read_source_code(self) -> str:
-        # if there's path provided read form it, otherwise read from url
-        if self.data['path']:
-            raw_data = open(self.data['path'], 'rb').read()
-
-        else:
-            log.debug('Loading module file from {}'.format(self.data['url']))
-            url_file = urllib.request.urlopen(self.data['url'])
-            raw_data = url_file.read()
-
-        chardet_result = chardet.detect(raw_data)
-        if chardet_result['encoding'] not in ['ascii', 'utf-8']:
-            raw_data = raw_data.decode('iso-8859-1').encode('utf-8')
-
-        return raw_data.decode('utf-8')
-
-    # builds tag table so that every character from source file has color
-    # assigned according to the container from json file
-    def __add_color(self, node: dict):
-        position = node['position'] - 1
-        for i in range(position, position + node['characters_count']):
-            self.tag_table[i]['container'] = node['container']
-            self.tag_table[i]['char'] = self.source_code[i]
-
-            if 'children' in node:
-                for child in node['children']:
-                    self.__add_color(child)
+        self.source_code = self.document.source_code
+        self.tag_table = None
 
+    # container code of every character from source file, shared with other
+    # views of the module, see preprocessing/tag_table.py
     def __build_tag_table(self):
-        # assign container to each character form source code
-        for node in self.data['nodes']:
-            self.__add_color(node)
-
-        # add None container to characters which don't belong anywhere
-        for i, byte in enumerate(self.tag_table):
-            if not byte:
-                byte['container'] = None
-                byte['char'] = self.source_code[i]
-
-            if byte['char'] == '\n':
-                byte['container'] = None
-
-        # remove '\r'
-        self.tag_table = list(
-            filter(lambda b: b['char'] != '\r', self.tag_table)
-        )
-
-        if self.comments:
-            # add comments and other code segments which don't belong to any
-            # container to 'comment' container
-            for byte in self.tag_table:
-                if not byte['container'] and not byte['char'].isspace():
-                    byte['container'] = 'comment'
-
-            # make spaces in comments colorful instead of white
-            for i, byte in enumerate(self.tag_table):
-                if (
-                        byte['char'] == ' '
-                        and i - 1 >= 0
-                        and i + 1 < len(self.tag_table)
-                        and self.tag_table[i - 1]['container'] == 'comment'
-                        and self.tag_table[i + 1]['container'] == 'comment'
-                ):
-                    byte['container'] = 'comment'
-
-        else:
-            # delete comments and code segments without container
-            self.tag_table = list(
-                filter(lambda b: b['container'] or b['char'] == '\n',
-                       self.tag_table)
-            )
-
-            # remove empty lines from te beginning of the file where there
-            # might have been comments
-            while self.tag_table[0]['char'].isspace():
-                del self.tag_table[0]
-
-            # reduce empty lines sequence to <= 2
-            i = 0
-            while i < len(self.tag_table) - 3:
-                if (self.tag_table[i]['char'] == '\n'
-                        and self.tag_table[i + 1]['char'] == '\n'
-                        and self.tag_table[i + 2]['char'] == '\n'
-                        and self.tag_table[i + 3]['char'] == '\n'):
-                    del self.tag_table[i]
-                else:
-                    i += 1
-
-        # handle white spaces in the beginning of the line
-        # it's about keeping tabs white in the final image
-        for i, byte in enumerate(self.tag_table):
-            if byte['char'] == '\n':
-                j = i + 1
-
-                while (j < len(self.tag_table) and
-                       self.tag_table[j]['char'].isspace()):
-                    self.tag_table[j]['container'] = None
-                    j += 1
+        self.tag_table = self.document.tags(self.comments)
 
+    # the longest line which ends with '\n', tab takes 4 cells
     def __max_line(self) -> int:
-        max_len = 0
-        local_len = 0
-
-        for byte in self.tag_table:
-            if byte['char'] == '\n':
-                if local_len > max_len:
-                    max_len = local_len
-                local_len = 0
-            elif byte['char'] == '\t':
-                local_len += 4
-            else:
-                local_len += 1
+        characters = self.tag_table.characters
+        newlines = np.flatnonzero(characters == ord('\n'))
+        ends = np.cumsum(np.where(characters == ord('\t'), 4, 1))
 
-        return max_len
+        # length of line i is the number of cells between '\n' characters
+        line_ends = ends[newlines] - 1
+        line_starts = np.concatenate(([0], ends[newlines[:-1]]))
+        return int((line_ends - line_starts).max()) if len(newlines) else 0
 
     def __lines_count(self) -> int:
-        count = 1
-
-        for byte in self.tag_table:
-            if byte['char'] == '\n':
-                count += 1
-
-        return count
-
+        newlines = self.tag_table.characters == ord('\n')
+        return int(np.count_nonzero(newlines)) + 1
+
+    # line, first cell and number of cells of every character in tag table
+    # together with its container code and section id, tab takes 4 cells
+    # and '\n' none
+    def __layout(self) -> dict:
+        characters = self.tag_table.characters
+        codes = self.tag_table.codes
+
+        newlines = characters == ord('\n')
+        widths = np.where(characters == ord('\t'), 4, 1)
+        widths[newlines] = 0
+
+        # cells are numbered through the whole text, line starts at the cell
+        # which follows the last '\n'
+        rows = np.cumsum(newlines) - newlines
+        ends = np.cumsum(widths)
+        line_starts = np.concatenate(([0], ends[newlines]))
+
+        # sections are the same as colored spans in LuaCode, i.e. sequences
+        # of characters with the same container, numbered from 1
+        starts = np.ones(len(codes), dtype=bool)
+        starts[1:] = codes[1:] != codes[:-1]
+        sections = np.cumsum(starts & (codes != CONTAINER_CODES[None]))
+
+        return {'codes': codes, 'rows': rows,
+                'columns': ends - widths - line_starts[rows],
+                'widths': widths, 'sections': sections,
+                'section_starts': starts,
+                'lines_count': np.count_nonzero(newlines) + 1}
+
+    # container codes of characters in (lines x columns) grid, -1 is for
+    # cells without character
+    def __build_grid(self) -> np.ndarray:
+        layout = self.__layout()
+        widths = layout['widths']
+
+        cell_characters = np.repeat(np.arange(len(widths)), widths)
+        cell_rows = layout['rows'][cell_characters]
+        cell_columns = (layout['columns'][cell_characters]
+                        + np.arange(len(cell_characters))
+                        - np.repeat(np.cumsum(widths) - widths, widths))
+
+        columns = cell_columns.max() + 1 if len(cell_columns) else 0
+        grid = np.full((layout['lines_count'], columns), -1, dtype=np.int8)
+        grid[cell_rows, cell_columns] = layout['codes'][cell_characters]
+        return grid
+
+    # scales cells along the first axis to pixels, returns cells extended
+    # by edges and index into them for every pixel
+    # rectangles of characters include their right and bottom edges, so
+    # neighbouring cells share 1 pixel and the later drawn one wins,
+    # i.e. pixel on the edge between cells k - 1 and k is from cell k unless
+    # it's empty
+    @staticmethod
+    def __scale(cells: np.ndarray, pixels: int, margin: int,
+                cell_size: int) -> tuple:
+        count = len(cells)
+        empty = np.full((1,) + cells.shape[1:], -1, dtype=cells.dtype)
+        edges = np.where(cells >= 0, cells,
+                         np.concatenate((empty, cells[:-1])))
+        last_edge = cells[-1:] if count else empty
+        extended = np.concatenate((cells, edges, empty, last_edge))
+
+        offsets = np.arange(pixels) - margin
+        index = offsets // cell_size
+        on_edge = offsets % cell_size == 0
+        index = np.where(on_edge, index + count, index)
+        index[offsets < 0] = 2 * count
+        index[offsets >= count * cell_size] = 2 * count
+        index[offsets == count * cell_size] = 2 * count + 1
+
+        return extended, index
+
+    # whole image is built from (lines x columns) grid, only one line
+    # of pixels is computed per line of text and copied to the other ones
+    def __rasterize(self, palette: bool) -> np.ndarray:
+        grid = self.__build_grid()
+
+        columns, index = self.__scale(grid.T, self.img_width,
+                                      self.margin_size, self.byte_width)
+        lines = np.ascontiguousarray(columns[index].T)
+
+        lines, index = self.__scale(lines, self.img_height,
+                                    self.margin_size, self.byte_height)
+        lines = (lines + 1).astype(np.uint8)
+        if not palette:
+            lines = np.take(PALETTE, lines, axis=0)
+
+        return np.take(lines, index, axis=0)
+
+    # tiled=None splits only images with more than MAX_IMAGE_PIXELS
     def draw(self, byte_width=None, byte_height=None,
-             margin_size=None, img_path=None):
+             margin_size=None, img_path=None, palette=False, tiled=None):
         self.byte_width = byte_width or BYTE_WIDTH
         self.byte_height = byte_height or BYTE_HEIGHT
         self.margin_size = margin_size or MARGIN_SIZE
@@ -182,129 +181,80 @@ class SeeSoft:
         self.img_height = ((self.__lines_count() * self.byte_height)
                            + 2 * self.margin_size)
 
-        image = Image.new('RGB', (self.img_width, self.img_height),
-                          color=COLORS['empty'])
-        draw = ImageDraw.Draw(image)
-
-        row = 0
-        column = 0
-        for byte in self.tag_table:
-
-            if byte['char'] == '\n':
-                row += 1
-                column = 0
-            elif byte['char'] == '\t':
-                # when the character is '\t' just write rectangle of size 4
-                x = self.margin_size + column * self.byte_width
-                y = self.margin_size + row * self.byte_height
-
-                draw.rectangle(
-                    (x, y, x + 4 * self.byte_width, y + self.byte_height),
-                    fill=COLORS[byte['container'] or 'empty']
-                )
-
-                column += 4
-            else:
-                x = self.margin_size + column * self.byte_width
-                y = self.margin_size + row * self.byte_height
-
-                draw.rectangle(
-                    (x, y, x + self.byte_width, y + self.byte_height),
-                    fill=COLORS[byte['container'] or 'empty']
-                )
+        if tiled is None:
+            tiled = self.img_width * self.img_height > MAX_IMAGE_PIXELS
+        if tiled:
+            # tiles are rendered later, only when they are requested
+            self.pyramid = tiles.add(TilePyramid(
+                self.__build_grid(), PALETTE, self.byte_width,
+                self.byte_height, self.margin_size, self.img_width,
+                self.img_height))
+            return
+
+        # palette image has 1 byte per pixel instead of 3
+        image = Image.fromarray(self.__rasterize(palette),
+                                mode='P' if palette else 'RGB')
+        if palette:
+            image.putpalette(PALETTE.tobytes())
+
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG')
+        self.img_key = store.put(buffer.getvalue())
+
+        if self.img_path:
+            with open(self.img_path, 'wb') as img_file:
+                img_file.write(buffer.getvalue())
+
+    # small image of the module in palette indices, one pixel for every
+    # character and line, scaled down by scale and more when it doesn't fit
+    # into max_width x max_height, tag table is built as in draw
+    def thumbnail(self, scale=1, max_width=None, max_height=None) \
+            -> np.ndarray:
+        self.__build_tag_table()
+        grid = self.__build_grid()
+        height, width = grid.shape
 
-                column += 1
+        if max_width:
+            scale = max(scale, -(-width // max_width))
+        if max_height:
+            scale = max(scale, -(-height // max_height))
 
-        image.save(self.img_path)
+        pyramid = TilePyramid(grid, PALETTE, 1, 1, 0, width, height)
+        return pyramid.render(np.arange(0, width, scale),
+                              np.arange(0, height, scale))
 
+    # one invisible horizontal bar per section for click interaction, click
+    # anywhere on the section hits its bar, section is always on one line,
+    # because it doesn't contain '\n'
     def __add_traces(self, fig):
-        # NOTE: first line from the file has the highest y value in the graph
-        row = self.__lines_count() - self.margin_size / self.byte_height + 1
-        column = 0
-        # id of the corresponding section from lua code can be determined
-        # with section number
-        section_num = 1
-        x = list()
-        y = list()
-        # position in pixels for later scroll interaction
-        custom_data = list()
-        # id of line in lua code, which is represented by particular trace
-        text = list()
-
-        for i, byte in enumerate(self.tag_table):
-            # when moving to the next line, add the accumulated trace to
-            # the figure and clear the trace
-            if byte['char'] == '\n':
-                fig.add_trace(
-                    go.Scatter(
-                        x=x,
-                        y=y,
-                        customdata=custom_data,
-                        text=text,
-                        mode='markers',
-                        marker_opacity=0,
-                        hoverinfo='none'
-                    )
-                )
+        layout = self.__layout()
+        colored = np.flatnonzero(layout['codes'] != CONTAINER_CODES[None])
+        sections, first = np.unique(layout['sections'][colored],
+                                    return_index=True)
+        last = colored[np.append(first[1:], len(colored)) - 1]
+        first = colored[first]
 
-                row -= 1
-                column = 0
-                x.clear()
-                y.clear()
-                custom_data.clear()
-                text.clear()
-
-            elif byte['char'] == '\t':
-                # when the character is '\t' shift the beginning of the trace
-                column += 4
-
-            elif byte['container'] is not None:
-                # add point representing character to the trace
-                x.append(
-                    self.margin_size
-                    + column * self.byte_width
-                    + self.byte_width * 0.5
-                )
+        rows = layout['rows'][first]
+        starts = layout['columns'][first]
+        cells = layout['columns'][last] + layout['widths'][last] - starts
 
-                y.append(
-                    self.margin_size
-                    + row * self.byte_height
-                    + self.byte_height * 0.5
-                )
-
-                custom_data.append(
-                    # without margin size so that there's some space above
-                    # the chosen line
-                    (self.__lines_count() - row - 2) * LUA_LINE_HEIGHT
-                )
-
-                text.append(section_num)
-
-                column += 1
-                # increment section number when the container has changed
-                if (
-                        i > 0 and
-                        byte['container'] != self.tag_table[i - 1]['container']
-                ):
-                    section_num += 1
-
-            else:
-                column += 1
-
-        # the text might not end with '\n', therefore last trace might not
-        # have been added at this point
-        if x and y:
-            fig.add_trace(
-                go.Scatter(
-                    x=x,
-                    y=y,
-                    customdata=custom_data,
-                    text=text,
-                    mode='markers',
-                    marker_opacity=0,
-                    hoverinfo='none'
-                )
+        # NOTE: first line from the file has the highest y value in the graph
+        fig.add_trace(
+            go.Bar(
+                orientation='h',
+                base=(self.margin_size + starts * self.byte_width).tolist(),
+                x=(cells * self.byte_width).tolist(),
+                y=(self.img_height - self.margin_size
+                   - (rows + 0.5) * self.byte_height).tolist(),
+                width=self.byte_height,
+                # id of the corresponding section from lua code, its line
+                # is in the index of LuaCode view
+                text=sections.tolist(),
+                textposition='none',
+                marker_opacity=0,
+                hoverinfo='none'
             )
+        )
 
     # count sizes for the seesoft view and keep the ratio
     def count_width_and_height(self, width: int or str, height: int or str):
@@ -327,13 +277,9 @@ class SeeSoft:
 
         return width, height
 
-    def get_figure(self):
+    def get_figure(self, width=None, height=None):
         fig = go.Figure()
 
-        with open(self.img_path, 'rb') as img_file:
-            encoded_string = base64.b64encode(img_file.read()).decode()
-        encoded_image = 'data:image/png;base64,' + encoded_string
-
         # add invisible scatter trace
         fig.add_trace(
             go.Scatter(
@@ -345,37 +291,60 @@ class SeeSoft:
             )
         )
 
-        # configure axes
+        # configure axes, tiled image can be zoomed
         fig.update_xaxes(
             visible=False,
             range=[0, self.img_width],
-            fixedrange=True
+            fixedrange=self.pyramid is None
         )
 
         fig.update_yaxes(
             visible=False,
             range=[0, self.img_height],
-            fixedrange=True,
+            fixedrange=self.pyramid is None,
             # ensure that the aspect ratio stays constant
             scaleanchor='x',
             scaleratio=1
         )
 
-        # add image
-        fig.add_layout_image(
-            dict(
-                x=0,
-                sizex=self.img_width,
-                y=self.img_height,
-                sizey=self.img_height,
-                xref='x',
-                yref='y',
-                opacity=1,
-                layer='below',
-                sizing='stretch',
-                source=encoded_image
+        if self.pyramid is None:
+            # add image
+            fig.add_layout_image(
+                dict(
+                    x=0,
+                    sizex=self.img_width,
+                    y=self.img_height,
+                    sizey=self.img_height,
+                    xref='x',
+                    yref='y',
+                    opacity=1,
+                    layer='below',
+                    sizing='stretch',
+                    # URL of the image when it's served by the app
+                    source=store.source(self.img_key)
+                )
+            )
+
+        else:
+            # whole image on the level which fits into the view, other
+            # tiles are loaded by seesoft.tiles clientside callback
+            width, height = self.count_width_and_height(width, height)
+            if type(width) is str or type(height) is str:
+                width, height = MAX_VIEW_WIDTH, MAX_VIEW_HEIGHT
+            level = self.pyramid.level(max(self.img_width / width,
+                                           self.img_height / height))
+
+            fig.update_layout(
+                images=tiles.layout_images(self.pyramid, level),
+                meta={'tiles': {'url': tiles.url(self.pyramid.key),
+                                'width': self.img_width,
+                                'height': self.img_height,
+                                'size': TILE_SIZE,
+                                'levels': self.pyramid.levels}},
+                # keep zoom when the figure is updated with new tiles
+                uirevision=self.pyramid.key,
+                dragmode='pan'
             )
-        )
 
         # configure other layout
         fig.update_layout(
@@ -386,13 +355,15 @@ class SeeSoft:
         return fig
 
     def view(self, dash_id: str, width=None, height=None):
+        figure = self.get_figure(width, height)
         width, height = self.count_width_and_height(width, height)
 
         return dcc.Graph(
             id=dash_id,
-            figure=self.get_figure(),
+            figure=figure,
             config={
-                'displayModeBar': False
+                'displayModeBar': False,
+                'scrollZoom': self.pyramid is not None
             },
             style={
                 'width': width,
@@ -0,0 +1,380 @@
+import os
+import io
+import math
+import base64
+import hashlib
+import logging
+import numpy as np
+from abc import ABC
+from abc import abstractmethod
+from threading import Lock
+from collections import OrderedDict
+from PIL import Image
+import flask
+from components.image_store import is_key
+from preprocessing import disk_cache
+
+
+TILE_SIZE = 256
+# upper bound of encoded tiles kept in memory in bytes
+MAX_TILE_CACHE_SIZE = 64 * 1024 * 1024
+# upper bound of pyramids kept in memory in bytes
+MAX_PYRAMIDS_SIZE = 128 * 1024 * 1024
+ROUTE = '/seesoft-tiles/'
+# content of a tile never changes for the same URL
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+log.addHandler(logging.StreamHandler())
+
+
+# cell (row or column) every pixel belongs to and the previous cell for
+# pixels on the edge between 2 cells, -1 means no cell
+def pixel_cells(positions: np.ndarray, margin: int, cell_size: int,
+                cells_count: int) -> tuple:
+    offsets = positions - margin
+    cells = offsets // cell_size
+    on_edge = offsets % cell_size == 0
+
+    cell = np.where((cells >= 0) & (cells < cells_count), cells, -1)
+    previous = np.where(on_edge & (cells >= 1) & (cells <= cells_count),
+                        cells - 1, -1)
+    return cell, previous
+
+
+class Pyramid(ABC):
+    '''
+    image split into tiles of TILE_SIZE pixels on several levels, level 0
+    has full resolution and every next level has half of it, the last level
+    fits into one tile
+    tiles are rendered only when they are requested, pixel of level l is
+    pixel (x * 2^l, y * 2^l) of the full image, so overview levels cost
+    the same as the detailed ones
+    '''
+
+    def __init__(self, key: str, palette: np.ndarray, width: int,
+                 height: int):
+        self.key = key
+        self.palette = palette
+        self.width = width
+        self.height = height
+        self.levels = max(1, math.ceil(
+            math.log2(max(width, height, 1) / TILE_SIZE)) + 1)
+
+    # palette indices of full image pixels at x and y positions
+    @abstractmethod
+    def render(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        pass
+
+    # arrays from which the same pyramid is created by from_arrays()
+    @abstractmethod
+    def arrays(self) -> dict:
+        pass
+
+    @classmethod
+    @abstractmethod
+    def from_arrays(cls, arrays: dict) -> 'Pyramid':
+        pass
+
+    # bytes of memory taken by the pyramid
+    @property
+    def nbytes(self) -> int:
+        return self.palette.nbytes
+
+    # size of the whole image in pixels of the level
+    def level_size(self, level: int) -> tuple:
+        return -(-self.width >> level), -(-self.height >> level)
+
+    def tiles_count(self, level: int) -> tuple:
+        width, height = self.level_size(level)
+        return -(-width // TILE_SIZE), -(-height // TILE_SIZE)
+
+    # size of the tile in pixels of its level, tiles on the right and bottom
+    # border are smaller
+    def tile_size(self, level: int, x: int, y: int) -> tuple:
+        width, height = self.level_size(level)
+        return (min(TILE_SIZE, width - x * TILE_SIZE),
+                min(TILE_SIZE, height - y * TILE_SIZE))
+
+    def tile(self, level: int, x: int, y: int) -> np.ndarray:
+        width, height = self.tile_size(level, x, y)
+        if (
+                not 0 <= level < self.levels
+                or x < 0 or y < 0 or width <= 0 or height <= 0
+        ):
+            raise KeyError((level, x, y))
+
+        scale = 1 << level
+        return self.render(
+            (x * TILE_SIZE + np.arange(width)) * scale,
+            (y * TILE_SIZE + np.arange(height)) * scale
+        )
+
+    # level with about one image pixel per screen pixel, scale is number
+    # of full image pixels per screen pixel
+    def level(self, scale: float) -> int:
+        if scale <= 1:
+            return 0
+
+        return min(self.levels - 1, int(math.log2(scale)))
+
+
+class TilePyramid(Pyramid):
+    '''
+    pyramid of SeeSoft image rendered from (lines x columns) grid
+    of container codes
+    '''
+
+    def __init__(self, grid: np.ndarray, palette: np.ndarray,
+                 byte_width: int, byte_height: int, margin_size: int,
+                 width: int, height: int):
+        geometry = np.array([byte_width, byte_height, margin_size, width,
+                             height] + list(grid.shape), dtype=np.int64)
+        super().__init__(
+            hashlib.sha1(geometry.tobytes() + grid.tobytes()).hexdigest(),
+            palette, width, height)
+
+        # -1 at the end of every axis, so that index -1 means empty cell
+        self.grid = np.pad(grid, ((0, 1), (0, 1)), constant_values=-1)
+        self.lines_count, self.columns_count = grid.shape
+        self.byte_width = byte_width
+        self.byte_height = byte_height
+        self.margin_size = margin_size
+
+    # same rule as in SeeSoft.draw, pixel on the edge between 2 cells is
+    # from the later one unless it's empty
+    def render(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        column, previous_column = pixel_cells(
+            x, self.margin_size, self.byte_width, self.columns_count)
+        line, previous_line = pixel_cells(
+            y, self.margin_size, self.byte_height, self.lines_count)
+
+        def resolve(lines):
+            cells = self.grid[np.ix_(lines, column)]
+            return np.where(cells >= 0, cells,
+                            self.grid[np.ix_(lines, previous_column)])
+
+        pixels = resolve(line)
+        pixels = np.where(pixels >= 0, pixels, resolve(previous_line))
+        return (pixels + 1).astype(np.uint8)
+
+    def arrays(self) -> dict:
+        return {'grid': self.grid[:-1, :-1], 'palette': self.palette,
+                'geometry': np.array([self.byte_width, self.byte_height,
+                                      self.margin_size, self.width,
+                                      self.height], dtype=np.int64)}
+
+    @classmethod
+    def from_arrays(cls, arrays: dict) -> 'TilePyramid':
+        return cls(arrays['grid'], arrays['palette'],
+                   *arrays['geometry'].tolist())
+
+    @property
+    def nbytes(self) -> int:
+        return super().nbytes + self.grid.nbytes
+
+
+class ImagePyramid(Pyramid):
+    '''
+    pyramid of already rendered image of palette indices in .npy file,
+    e.g. mosaic of thumbnails, the file is memory-mapped and only pixels
+    of requested tiles are read
+    '''
+
+    def __init__(self, key: str, path: str, palette: np.ndarray):
+        self.path = path
+        self.pixels = np.load(path, mmap_mode='r')
+        super().__init__(key, palette, self.pixels.shape[1],
+                         self.pixels.shape[0])
+
+    def render(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        # only rows of the tile are read from memory-mapped file
+        return np.asarray(self.pixels[y][:, x])
+
+    def arrays(self) -> dict:
+        return {'key': np.array(self.key), 'path': np.array(self.path),
+                'palette': self.palette}
+
+    @classmethod
+    def from_arrays(cls, arrays: dict) -> 'ImagePyramid':
+        return cls(str(arrays['key']), str(arrays['path']),
+                   arrays['palette'])
+
+
+# types of pyramids which are created again from cache files
+PYRAMIDS = {'TilePyramid': TilePyramid, 'ImagePyramid': ImagePyramid}
+
+
+def read_pyramid(f) -> Pyramid:
+    with np.load(f) as arrays:
+        arrays = dict(arrays)
+
+    return PYRAMIDS[str(arrays.pop('kind'))].from_arrays(arrays)
+
+
+class TileStore:
+    '''
+    pyramids of images shown by the app and their encoded tiles,
+    least recently used pyramids and tiles are dropped, with cache_dir
+    pyramids are created again from files there, tiles are served by
+    the Flask server of the Dash app after register()
+    '''
+
+    def __init__(self, max_size: int, max_pyramids_size: int,
+                 cache_dir=None):
+        self.max_size = max_size
+        self.max_pyramids_size = max_pyramids_size
+        self.cache_dir = cache_dir
+        self.pyramids = OrderedDict()
+        self.pyramids_size = 0
+        self.tiles = OrderedDict()
+        self.size = 0
+        self.lock = Lock()
+        self.server = None
+
+    # the same image has the same key, so it's kept only once
+    def add(self, pyramid: Pyramid) -> Pyramid:
+        pyramid = self.__remember(pyramid)
+
+        cache_file = self.__cache_file(pyramid.key)
+        if cache_file and not os.path.exists(cache_file):
+            disk_cache.save(cache_file, lambda f: np.savez(
+                f, kind=type(pyramid).__name__, **pyramid.arrays()))
+
+        return pyramid
+
+    def pyramid(self, key: str) -> Pyramid:
+        with self.lock:
+            if key in self.pyramids:
+                self.pyramids.move_to_end(key)
+                return self.pyramids[key]
+
+        # cache file which can't be read, e.g. ImagePyramid whose image was
+        # moved, is a miss
+        cache_file = self.__cache_file(key)
+        pyramid = cache_file and disk_cache.load(cache_file, read_pyramid)
+        if pyramid is None:
+            raise KeyError(key)
+
+        return self.__remember(pyramid)
+
+    def __remember(self, pyramid: Pyramid) -> Pyramid:
+        with self.lock:
+            if pyramid.key in self.pyramids:
+                self.pyramids.move_to_end(pyramid.key)
+                return self.pyramids[pyramid.key]
+
+            self.pyramids[pyramid.key] = pyramid
+            self.pyramids_size += pyramid.nbytes
+            while (
+                    self.pyramids_size > self.max_pyramids_size
+                    and len(self.pyramids) > 1
+            ):
+                _, old_pyramid = self.pyramids.popitem(last=False)
+                self.pyramids_size -= old_pyramid.nbytes
+
+        return pyramid
+
+    # keys come from URLs, so only hex digests are accepted as file names
+    def __cache_file(self, key: str):
+        if self.cache_dir is None or not is_key(key):
+            return None
+
+        return os.path.join(self.cache_dir, key + '.npz')
+
+    def png(self, key: str, level: int, x: int, y: int) -> bytes:
+        tile_key = (key, level, x, y)
+        with self.lock:
+            if tile_key in self.tiles:
+                self.tiles.move_to_end(tile_key)
+                return self.tiles[tile_key]
+
+        pyramid = self.pyramid(key)
+
+        image = Image.fromarray(pyramid.tile(level, x, y), mode='P')
+        image.putpalette(pyramid.palette.tobytes())
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG')
+        tile = buffer.getvalue()
+
+        with self.lock:
+            if tile_key not in self.tiles:
+                self.tiles[tile_key] = tile
+                self.size += len(tile)
+            while self.size > self.max_size and len(self.tiles) > 1:
+                _, old_tile = self.tiles.popitem(last=False)
+                self.size -= len(old_tile)
+
+        return tile
+
+    # URL of the tile when the store is served, data URI otherwise
+    def source(self, key: str, level: int, x: int, y: int) -> str:
+        if self.server is not None:
+            return self.url(key) + '{}/{}/{}.png'.format(level, x, y)
+
+        return 'data:image/png;base64,' + base64.b64encode(
+            self.png(key, level, x, y)).decode()
+
+    @staticmethod
+    def url(key: str) -> str:
+        return '{}{}/'.format(ROUTE, key)
+
+    # layout images of all tiles of the level which intersect with x and y
+    # ranges, y goes up from the bottom of the image as in the figure
+    def layout_images(self, pyramid: Pyramid, level: int,
+                      x_range=None, y_range=None) -> list:
+        scale = TILE_SIZE << level
+        x_range = x_range or (0, pyramid.width)
+        y_range = y_range or (0, pyramid.height)
+        columns, rows = pyramid.tiles_count(level)
+
+        first_x = max(0, int(x_range[0] // scale))
+        last_x = min(columns - 1, int(math.ceil(x_range[1] / scale)) - 1)
+        first_y = max(0, int((pyramid.height - y_range[1]) // scale))
+        last_y = min(rows - 1,
+                     int(math.ceil((pyramid.height - y_range[0]) / scale))
+                     - 1)
+
+        images = list()
+        for y in range(first_y, last_y + 1):
+            for x in range(first_x, last_x + 1):
+                width, height = pyramid.tile_size(level, x, y)
+                images.append(dict(
+                    x=x * scale,
+                    sizex=width << level,
+                    y=pyramid.height - y * scale,
+                    sizey=height << level,
+                    xref='x',
+                    yref='y',
+                    opacity=1,
+                    layer='below',
+                    sizing='stretch',
+                    source=self.source(pyramid.key, level, x, y)
+                ))
+
+        return images
+
+    def register(self, server: flask.Flask):
+        server.add_url_rule(ROUTE + '<key>/<int:level>/<int:x>/<int:y>.png',
+                            'seesoft_tiles', self.__serve)
+        self.server = server
+
+    def __serve(self, key: str, level: int, x: int, y: int):
+        etag = '{}-{}-{}-{}'.format(key, level, x, y)
+        if etag in flask.request.if_none_match:
+            response = flask.Response(status=304)
+        else:
+            try:
+                tile = self.png(key, level, x, y)
+            except KeyError:
+                flask.abort(404)
+            response = flask.Response(tile, mimetype='image/png')
+
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = CACHE_CONTROL
+        return response
+
+
+tiles = TileStore(MAX_TILE_CACHE_SIZE, MAX_PYRAMIDS_SIZE,
+                  disk_cache.directory('tiles'))
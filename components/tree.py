@@ -1,92 +1,230 @@
 import logging
-import json
-import urllib
-from igraph import Graph
+import numpy as np
+from threading import Lock
+from collections import OrderedDict
 import plotly.graph_objects as go
 from constant import COLORS
 from constant import COLUMNS
+from constant import CONTAINERS
+from preprocessing import tree_layout
+from preprocessing.module_document import ModuleDocument
 import dash_core_components as dcc
+import dash_html_components as html
 
 
+# larger trees are shown progressively, see visible
+MAX_NODES = 2000
+# levels of progressively shown tree before anything is expanded
+TOP_LEVELS = 3
+# more children of a node are shown as groups of consecutive siblings
+MAX_CHILDREN = 32
+# layouts of visible parts kept in memory by every tree
+MAX_VISIBLE_LAYOUTS = 16
+# marker size of a node, collapsed nodes and groups grow with the number
+# of nodes they hide up to MAX_NODE_SIZE
+NODE_SIZE = 10
+MAX_NODE_SIZE = 40
+
 log = logging.getLogger(__name__)
 log.setLevel(logging.DEBUG)
 log.addHandler(logging.StreamHandler())
 
 
 class Tree:
-    def __init__(self, path=None, url=None):
-        if all(arg is None for arg in {path, url}):
-            raise ValueError('Expected either path or url argument')
+    def __init__(self, path=None, url=None, document=None):
+        # document is shared with other views of the same module
+        self.document = document or ModuleDocument.load(path, url)
+        self.data = self.document.data
+        self.tree = self.document.tree
+        self.progressive = self.tree.size > MAX_NODES
+        # layouts of visible parts of the tree by expanded nodes and groups
+        self.layouts = OrderedDict()
+        self.layouts_lock = Lock()
 
-        if path:
-            with open(path) as f:
-                self.data = json.load(f)
-        else:
-            log.debug('Loading data file from {}'.format(url))
-            with urllib.request.urlopen(url) as url_data:
-                self.data = json.loads(url_data.read().decode())
-
-        # all edges between nodes
-        self.edges = list()
-        # color for each node
-        self.colors = ([COLORS['plot-line']]
-                       + ['' for _ in range(self.data['nodes_count'])])
-        # text for each node
-        self.text = ['root'] + ['' for _ in range(self.data['nodes_count'])]
-
-    def __add_child_edges(self, node: dict):
-        for child in node['children']:
-            self.edges.append((node['master_index'], child['master_index']))
-            self.colors[child['master_index']] = COLORS[child['container']]
-            self.text[child['master_index']] = '({}, {})'.format(
-                child['master_index'], child['container'])
-
-            if 'children' in child:
-                self.__add_child_edges(child)
-
-    def get_figure(self):
-        # nodes from .json plus root node
-        nodes_count = self.data['nodes_count'] + 1
-
-        # edges from root to the nodes of depth 1
-        for node in self.data['nodes']:
-            self.edges.append((0, node['master_index']))
-            self.colors[node['master_index']] = COLORS[node['container']]
-            self.text[node['master_index']] = '({}, {})'.format(
-                node['master_index'], node['container'])
-
-            # all other edges to child nodes
-            if 'children' in node:
-                self.__add_child_edges(node)
-
-        graph = Graph(n=self.data['nodes_count'] + 1, directed=True)
-        graph.add_edges(self.edges)
-
-        # build layout with Reingold-Tilford algorithm
-        layout = graph.layout_reingold_tilford(mode='out', root=[0])
-        # node positions in graph
-        positions = {k: layout[k] for k in range(nodes_count)}
-        max_y = max([layout[k][1] for k in range(nodes_count)])
-
-        # count node and edge positions and switch original x and y
-        # coordinates so that tree would branch horizontally
-        nodes_x = [2 * max_y - positions[k][1] for k in range(len(positions))]
-        nodes_y = [positions[k][0] for k in range(len(positions))]
-        edges_x = list()
-        edges_y = list()
-
-        for edge in self.edges:
-            edges_y += [positions[edge[0]][0], positions[edge[1]][0], None]
-            edges_x += [2 * max_y - positions[edge[0]][1],
-                        2 * max_y - positions[edge[1]][1], None]
-
-        # mirror the graph in both directions so that the edges are oriented
-        # form left to right and nodes in order from the smallest to
-        # the largest
-        nodes_x = [-x for x in nodes_x]
-        nodes_y = [-y for y in nodes_y]
-        edges_x = list(map(lambda x: -x if x else x, edges_x))
-        edges_y = list(map(lambda y: -y if y else y, edges_y))
+    # expanded nodes and groups from the store of the view, see click
+    @staticmethod
+    def __expanded(expanded) -> tuple:
+        expanded = expanded or dict()
+        return ({int(node) for node in expanded.get('nodes', ())},
+                {tuple(int(value) for value in group)
+                 for group in expanded.get('groups', ())})
+
+    # first child, last child and the number of nodes in subtrees of
+    # children start to end (exclusive) of parent
+    def __group(self, parent: int, start: int, end: int) -> tuple:
+        children = self.tree.children(parent)
+        first, last = int(children[start]), int(children[end - 1])
+        return (first, last, int(self.tree.subtree_end[last]
+                                 - self.tree.order[first] + 1))
+
+    # whether all nodes of the group are in pre-order ranks low to high
+    def __inside(self, group: tuple, low: int, high: int) -> bool:
+        parent, start, end = group
+        if not 0 <= parent < self.tree.size or not 0 <= start < end <= len(
+                self.tree.children(parent)):
+            return False
+
+        first, last, _ = self.__group(parent, start, end)
+        return low <= self.tree.order[first] \
+            and self.tree.subtree_end[last] <= high
+
+    # visible items of the tree in pre-order, an item is either a node or
+    # a group of consecutive children start to end (exclusive) of parent,
+    # returns node of every item (-1 for groups), (parent, start, end)
+    # of every item (-1 for nodes), index of the parent item of every item
+    # except the first one and the number of nodes hidden in every item
+    # progressive tree shows top TOP_LEVELS levels, children of expanded
+    # nodes and groups, children of a node are split into at most
+    # MAX_CHILDREN groups, so that only visible items are ever visited
+    def visible(self, expanded=None) -> tuple:
+        tree = self.tree
+        if not self.progressive:
+            indices = np.empty(tree.size, dtype=np.int64)
+            indices[tree.preorder] = np.arange(tree.size)
+            return (tree.preorder, np.full((tree.size, 3), -1),
+                    indices[tree.parents[tree.preorder[1:]]],
+                    np.zeros(tree.size, dtype=np.int64))
+
+        expanded_nodes, expanded_groups = self.__expanded(expanded)
+        nodes, groups, parents, hidden = list(), list(), list(), list()
+
+        def add(node, group, parent, count) -> int:
+            nodes.append(node)
+            groups.append(group)
+            parents.append(parent)
+            hidden.append(count)
+            return len(nodes) - 1
+
+        # items are taken from the top of the stack, children are pushed
+        # in reversed order
+        def push_children(stack, item, parent, start, end):
+            count = end - start
+            if count <= MAX_CHILDREN:
+                children = [(node, None, item) for node in
+                            tree.children(parent)[start:end].tolist()]
+            else:
+                span = 1
+                while count > span * MAX_CHILDREN:
+                    span *= MAX_CHILDREN
+                children = [(-1, (parent, first, min(first + span, end)), item)
+                            for first in range(start, end, span)]
+            stack.extend(reversed(children))
+
+        stack = [(0, None, -1)]
+        while stack:
+            node, group, parent = stack.pop()
+            if group is None:
+                children_count = int(tree.child_offsets[node + 1]
+                                     - tree.child_offsets[node])
+                if not children_count:
+                    add(node, (-1, -1, -1), parent, 0)
+                elif tree.depths[node] < TOP_LEVELS - 1 \
+                        or node in expanded_nodes:
+                    item = add(node, (-1, -1, -1), parent, 0)
+                    push_children(stack, item, node, 0, children_count)
+                else:
+                    add(node, (-1, -1, -1), parent,
+                        int(tree.subtree_sizes[node]) - 1)
+            elif group[2] - group[1] == 1:
+                stack.append((int(tree.children(group[0])[group[1]]), None,
+                              parent))
+            elif group in expanded_groups:
+                item = add(-1, group, parent, 0)
+                push_children(stack, item, *group)
+            else:
+                add(-1, group, parent, self.__group(*group)[2])
+
+        return (np.array(nodes, dtype=np.int64), np.array(groups),
+                np.array(parents[1:], dtype=np.int64),
+                np.array(hidden, dtype=np.int64))
+
+    # only the visible part of progressive tree is laid out, so that
+    # expanding a subtree costs as much as the items on the screen
+    def __layout(self, nodes: np.ndarray, parents: np.ndarray,
+                 expanded=None) -> np.ndarray:
+        if not self.progressive:
+            return tree_layout.load(self.tree)[nodes]
+
+        expanded_nodes, expanded_groups = self.__expanded(expanded)
+        key = (tuple(sorted(expanded_nodes)), tuple(sorted(expanded_groups)))
+        with self.layouts_lock:
+            if key in self.layouts:
+                self.layouts.move_to_end(key)
+                return self.layouts[key]
+
+        layout = tree_layout.reingold_tilford(len(nodes), parents,
+                                              np.arange(1, len(nodes)))
+
+        with self.layouts_lock:
+            self.layouts[key] = layout
+            while len(self.layouts) > MAX_VISIBLE_LAYOUTS:
+                self.layouts.popitem(last=False)
+
+        return layout
+
+    def __text(self, nodes: np.ndarray, groups: np.ndarray,
+               hidden: np.ndarray) -> np.ndarray:
+        # NumPy array of strings is validated by plotly much faster than list
+        suffixes = np.array([', {})'.format(container)
+                             for container in CONTAINERS])
+        text = np.char.add(np.char.add('(', nodes.astype(str)),
+                           suffixes[self.tree.containers[nodes]])
+        text[0] = 'root'
+        if not self.progressive:
+            return text
+
+        text = text.astype(object)
+        for item in np.flatnonzero(nodes < 0).tolist():
+            first, last, _ = self.__group(*groups[item].tolist())
+            text[item] = '({}..{}, group)'.format(first, last)
+        for item in np.flatnonzero(hidden).tolist():
+            text[item] += ' +{} nodes'.format(hidden[item])
+
+        return text.astype(str)
+
+    # figure is built from cached layout on every call, nothing is kept
+    # between calls, so it's safe to call repeatedly from callbacks,
+    # expanded are nodes and groups shown by progressive tree, see click
+    def get_figure(self, expanded=None):
+        nodes, groups, parents, hidden = self.visible(expanded)
+        # coordinates of visible items
+        layout = self.__layout(nodes, parents, expanded)
+
+        # switch original x and y coordinates so that tree would branch
+        # horizontally and mirror the graph in both directions so that
+        # the edges are oriented form left to right and nodes in order from
+        # the smallest to the largest
+        max_y = layout[:, 1].max()
+        nodes_x = layout[:, 1] - 2 * max_y
+        nodes_y = 0.0 - layout[:, 0]
+
+        # edge from parent to every item except root, in pre-order, every
+        # edge is a segment followed by a gap
+        children = np.arange(1, len(nodes))
+        gaps = np.full(len(children), np.nan)
+        edges_x = np.column_stack((nodes_x[parents], nodes_x[children],
+                                   gaps)).ravel()
+        edges_y = np.column_stack((nodes_y[parents], nodes_y[children],
+                                   gaps)).ravel()
+
+        # color and text for each node, color is given by container code
+        # and discrete color scale, which is much faster than a list
+        # of colors for large trees, groups have no container
+        palette = [COLORS['plot-line'] if container in {None, 'root'}
+                   else COLORS[container] for container in CONTAINERS]
+        colorscale = [[stop, color]
+                      for code, color in enumerate(palette)
+                      for stop in (code / len(palette),
+                                   (code + 1) / len(palette))]
+        colors = np.where(nodes < 0, 0,
+                          self.tree.containers[np.maximum(nodes, 0)]) + 0.5
+        text = self.__text(np.maximum(nodes, 0), groups, hidden)
+
+        # collapsed nodes and groups are larger with more hidden nodes
+        sizes = NODE_SIZE
+        if hidden.any():
+            sizes = np.minimum(NODE_SIZE + 4 * np.log2(hidden + 1),
+                               MAX_NODE_SIZE)
 
         fig = go.Figure()
 
@@ -109,14 +247,20 @@ class Tree:
                 y=nodes_y,
                 mode='markers',
                 marker={
-                    'size': 10,
-                    'color': self.colors,
+                    'size': sizes,
+                    'color': colors,
+                    'colorscale': colorscale,
+                    'cmin': 0,
+                    'cmax': len(palette),
                     'line': {
                         'width': 0.5,
                         'color': 'white'
                     }
                 },
-                text=self.text,
+                text=text,
+                # clicked node or group, see click
+                customdata=np.column_stack((nodes, groups))
+                if self.progressive else None,
                 hoverinfo='text',
                 opacity=0.8
             )
@@ -129,9 +273,14 @@ class Tree:
                     showticklabels=False,
                     )
 
+        title = 'Input tree'
+        if self.progressive:
+            title += ', {} of {} nodes, click to expand or collapse'.format(
+                int((nodes >= 0).sum()), self.tree.size)
+
         fig.update_layout(
             template='plotly_white',
-            title='Input tree',
+            title=title,
             xaxis=axis,
             yaxis=axis,
             showlegend=False,
@@ -140,12 +289,68 @@ class Tree:
 
         return fig
 
+    # figure and expanded nodes and groups after an item of progressive tree
+    # was clicked, collapsed item is expanded, expanded one is collapsed
+    # together with everything expanded inside it, None when nothing
+    # has changed, expanded are kept by the view in dash_id + '-expanded'
+    def click(self, click_data: dict, expanded=None):
+        if not self.progressive or not click_data \
+                or len(click_data['points'][0].get('customdata') or ()) != 4:
+            return None
+
+        tree = self.tree
+        node, parent, start, end = (
+            int(value) for value in click_data['points'][0]['customdata'])
+        expanded_nodes, expanded_groups = self.__expanded(expanded)
+
+        if node >= 0:
+            if not 0 < node < tree.size:
+                return None
+            first = last = node
+            if node not in expanded_nodes:
+                if tree.depths[node] < TOP_LEVELS - 1 \
+                        or tree.subtree_sizes[node] == 1:
+                    return None
+                expanded_nodes.add(node)
+                first = None
+        else:
+            if not 0 <= parent < tree.size \
+                    or not 0 <= start < end <= len(tree.children(parent)):
+                return None
+            first, last, _ = self.__group(parent, start, end)
+            if (parent, start, end) not in expanded_groups:
+                expanded_groups.add((parent, start, end))
+                first = None
+
+        # collapsed item, everything expanded inside it is collapsed too
+        if first is not None:
+            low, high = tree.order[first], tree.subtree_end[last]
+            expanded_nodes = {expanded_node for expanded_node in expanded_nodes
+                              if not low <= tree.order[expanded_node] <= high}
+            expanded_groups = {group for group in expanded_groups
+                               if not self.__inside(group, low, high)}
+
+        expanded = {
+            'nodes': sorted(expanded_nodes),
+            'groups': [list(group) for group in sorted(expanded_groups)]
+        }
+        return self.get_figure(expanded), expanded
+
+    # expanded nodes and groups of progressive tree are kept in store
+    # dash_id + '-expanded', so that the figure is rebuilt by click, the store
+    # is there for every tree, so that callbacks don't depend on the module
     def view(self, dash_id: str, columns: str, height=None):
-        return dcc.Graph(
-            id=dash_id,
-            figure=self.get_figure(),
-            style={
-                'height': height or '60vh'
-            },
+        return html.Div(
+            children=[
+                dcc.Graph(
+                    id=dash_id,
+                    figure=self.get_figure(),
+                    style={
+                        'height': height or '60vh'
+                    }
+                ),
+                dcc.Store(id=dash_id + '-expanded',
+                          data={'nodes': [], 'groups': []})
+            ],
             className=COLUMNS[columns]
         )
@@ -0,0 +1,271 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import logging
+import argparse
+import numpy as np
+from PIL import ImageColor
+from multiprocessing import Pool
+from constant import COLORS
+from components.seesoft import SeeSoft
+from components.seesoft import PALETTE
+from components.seesoft_tiles import TILE_SIZE
+from components.seesoft_tiles import ImagePyramid
+from components.seesoft_tiles import tiles
+from preprocessing import ast_cache
+from preprocessing.module_document import ModuleDocument
+from preprocessing.module_files import list_files
+import plotly.graph_objects as go
+import dash_core_components as dcc
+
+
+THUMBNAIL_SCALE = 2
+MAX_THUMBNAIL_WIDTH = 64
+MAX_THUMBNAIL_HEIGHT = 512
+MOSAIC_WIDTH = 4096
+# space between thumbnails in pixels
+SPACING = 4
+REPORT_INTERVAL = 5
+
+# mosaic has one more color for the space between thumbnails
+BACKGROUND = len(PALETTE)
+MOSAIC_PALETTE = np.vstack(
+    (PALETTE, ImageColor.getrgb(COLORS['plot-line']))).astype(np.uint8)
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+log.addHandler(logging.StreamHandler())
+
+
+# runs in worker process, thumbnail is written to a file, so that only its
+# size is sent back, exceptions are returned instead of raised so that one
+# broken module doesn't stop the whole run
+def render_thumbnail(task: tuple) -> tuple:
+    file, thumbnail_path, scale, max_width, max_height = task
+
+    try:
+        # documents aren't cached, every module is used only once
+        document = ModuleDocument(*ast_cache.load(file))
+        thumbnail = SeeSoft(document=document).thumbnail(
+            scale, max_width, max_height)
+        np.save(thumbnail_path, thumbnail)
+        return file, thumbnail.shape, None
+
+    except Exception as e:
+        return file, None, '{}: {}'.format(type(e).__name__, e)
+
+
+# shelf packing, the highest thumbnails go first, every shelf is as high
+# as its first thumbnail
+def pack(sizes: list, mosaic_width: int) -> tuple:
+    positions = [None] * len(sizes)
+    x = y = shelf_height = 0
+
+    for i in sorted(range(len(sizes)), key=lambda i: -sizes[i][0]):
+        height, width = sizes[i]
+        if x and x + width > mosaic_width:
+            x = 0
+            y += shelf_height + SPACING
+            shelf_height = 0
+
+        positions[i] = (x, y)
+        x += width + SPACING
+        shelf_height = max(shelf_height, height)
+
+    return positions, y + shelf_height
+
+
+def build(data_dir: str, output_dir: str, workers: int, chunksize: int,
+          scale=THUMBNAIL_SCALE, max_width=MAX_THUMBNAIL_WIDTH,
+          max_height=MAX_THUMBNAIL_HEIGHT, mosaic_width=MOSAIC_WIDTH) -> int:
+    thumbnail_dir = os.path.join(output_dir, 'thumbnails')
+    os.makedirs(thumbnail_dir, exist_ok=True)
+
+    files = list_files(data_dir)
+    tasks = [(file, os.path.join(thumbnail_dir, '{}.npy'.format(
+        hashlib.sha1(file.encode('utf-8')).hexdigest())),
+        scale, max_width, max_height) for file in files]
+
+    log.info('Rendering {} thumbnails with {} workers'.format(
+        len(tasks), workers))
+    modules = list()
+    errors = list()
+    start = last_report = time.perf_counter()
+
+    pool = Pool(workers) if workers > 1 and tasks else None
+    try:
+        # imap keeps the order of files, chunks reduce the overhead
+        # of sending tasks to workers
+        if pool:
+            results = pool.imap(render_thumbnail, tasks, chunksize)
+        else:
+            results = map(render_thumbnail, tasks)
+
+        for (file, shape, error), task in zip(results, tasks):
+            if error:
+                errors.append({'file': file, 'error': error})
+            else:
+                modules.append({'module': os.path.relpath(file, data_dir),
+                                'path': file, 'thumbnail': task[1],
+                                # empty module still gets 1 pixel
+                                'height': max(shape[0], 1),
+                                'width': max(shape[1], 1)})
+
+            now = time.perf_counter()
+            if now - last_report >= REPORT_INTERVAL:
+                last_report = now
+                log.info('{}/{} thumbnails, {:.1f} files/s'.format(
+                    len(modules) + len(errors), len(tasks),
+                    (len(modules) + len(errors)) / (now - start)))
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    positions, height = pack(
+        [(module['height'], module['width']) for module in modules],
+        mosaic_width)
+    width = min(mosaic_width, max(
+        [x + module['width'] for module, (x, _) in zip(modules, positions)],
+        default=0))
+
+    # mosaic is written directly to memory-mapped file, thumbnails are
+    # read one by one
+    mosaic = np.lib.format.open_memmap(
+        os.path.join(output_dir, 'mosaic.npy'), mode='w+', dtype=np.uint8,
+        shape=(max(height, 1), max(width, 1)))
+    mosaic[:] = BACKGROUND
+    for module, (x, y) in zip(modules, positions):
+        thumbnail = np.load(module.pop('thumbnail'))
+        mosaic[y:y + thumbnail.shape[0], x:x + thumbnail.shape[1]] = thumbnail
+        module.update(x=x, y=y)
+    mosaic.flush()
+    del mosaic
+    shutil.rmtree(thumbnail_dir)
+
+    with open(os.path.join(output_dir, 'index.json'), 'w') as f:
+        json.dump({'width': max(width, 1), 'height': max(height, 1),
+                   'modules': modules, 'errors': errors}, f, indent=1)
+
+    log.info('Mosaic of {} modules ({}x{} pixels), {} failed'.format(
+        len(modules), width, height, len(errors)))
+    return len(errors)
+
+
+class Wall:
+    '''
+    zoomable mosaic of all modules built by build(), clicking a thumbnail
+    gives path of its module in clickData (customdata of the point)
+    '''
+
+    def __init__(self, wall_dir: str):
+        with open(os.path.join(wall_dir, 'index.json')) as f:
+            self.index = json.load(f)
+        # clicked paths come from the browser, only these can be opened
+        self.paths = {module['path'] for module in self.index['modules']}
+
+        # mosaic is never loaded whole, only tiles which are shown are read
+        mosaic_path = os.path.abspath(os.path.join(wall_dir, 'mosaic.npy'))
+        stat = os.stat(mosaic_path)
+        key = hashlib.sha1('{}:{}:{}'.format(
+            mosaic_path, stat.st_mtime_ns, stat.st_size).encode()).hexdigest()
+        self.pyramid = tiles.add(ImagePyramid(key, mosaic_path,
+                                              MOSAIC_PALETTE))
+        self.mosaic = self.pyramid.pixels
+
+    # one invisible bar over every thumbnail
+    def __add_traces(self, fig):
+        modules = self.index['modules']
+        height = self.pyramid.height
+
+        fig.add_trace(
+            go.Bar(
+                orientation='h',
+                base=[module['x'] for module in modules],
+                x=[module['width'] for module in modules],
+                y=[height - module['y'] - module['height'] / 2
+                   for module in modules],
+                width=[module['height'] for module in modules],
+                customdata=[module['path'] for module in modules],
+                hovertext=[module['module'] for module in modules],
+                marker_opacity=0,
+                hoverinfo='text'
+            )
+        )
+
+    def get_figure(self, width: int, height: int):
+        fig = go.Figure()
+        level = self.pyramid.level(max(self.pyramid.width / width,
+                                       self.pyramid.height / height))
+
+        fig.update_xaxes(visible=False, range=[0, self.pyramid.width])
+        fig.update_yaxes(
+            visible=False,
+            range=[0, self.pyramid.height],
+            # ensure that the aspect ratio stays constant
+            scaleanchor='x',
+            scaleratio=1
+        )
+
+        # other tiles are loaded by seesoft.tiles clientside callback
+        fig.update_layout(
+            images=tiles.layout_images(self.pyramid, level),
+            meta={'tiles': {'url': tiles.url(self.pyramid.key),
+                            'width': self.pyramid.width,
+                            'height': self.pyramid.height,
+                            'size': TILE_SIZE,
+                            'levels': self.pyramid.levels}},
+            uirevision=self.pyramid.key,
+            dragmode='pan',
+            margin={'l': 0, 'r': 0, 't': 0, 'b': 0, 'autoexpand': False}
+        )
+
+        self.__add_traces(fig)
+        return fig
+
+    def view(self, dash_id: str, width=1000, height=700):
+        return dcc.Graph(
+            id=dash_id,
+            figure=self.get_figure(width, height),
+            config={
+                'displayModeBar': False,
+                'scrollZoom': True
+            },
+            style={
+                'width': width,
+                'height': height
+            }
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Render SeeSoft thumbnails of all .json files in data '
+                    'directory into one mosaic')
+    parser.add_argument('data_dir')
+    parser.add_argument('output_dir')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='number of worker processes')
+    parser.add_argument('--chunksize', type=int, default=4,
+                        help='number of files sent to a worker at once')
+    parser.add_argument('--scale', type=int, default=THUMBNAIL_SCALE,
+                        help='characters and lines per thumbnail pixel')
+    parser.add_argument('--max-width', type=int, default=MAX_THUMBNAIL_WIDTH)
+    parser.add_argument('--max-height', type=int,
+                        default=MAX_THUMBNAIL_HEIGHT)
+    parser.add_argument('--mosaic-width', type=int, default=MOSAIC_WIDTH)
+    args = parser.parse_args()
+
+    failed = build(args.data_dir, args.output_dir, args.workers,
+                   args.chunksize, args.scale, args.max_width,
+                   args.max_height, args.mosaic_width)
+
+    # non-zero exit code when some files failed
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -28,3 +28,11 @@ COLORS = {'require': '#FFAD7A',
           None: None}
 
 LUA_LINE_HEIGHT = 15
+
+# containers of AST nodes and source code characters, position in the list is
+# used as container code in NumPy arrays
+# None is for characters which don't belong to any node
+CONTAINERS = [None, 'root', 'require', 'variable', 'function', 'interface',
+              'other', 'comment']
+CONTAINER_CODES = {container: code for code, container in
+                   enumerate(CONTAINERS)}
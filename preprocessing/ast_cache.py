@@ -0,0 +1,160 @@
+import os
+import json
+import hashlib
+import logging
+import numpy as np
+from typing import Tuple
+from constant import CONTAINERS
+from preprocessing.manifest import fingerprint
+from preprocessing.syntax_tree import SyntaxTree
+
+
+# cache files are written next to .json files (e.g. AST1.json -> AST1.ast)
+# unless CACHE_DIR is set, the cache can be turned off with USE_CACHE
+USE_CACHE = True
+CACHE_DIR = None
+CACHE_EXTENSION = '.ast'
+
+# layout of the cache file:
+#   MAGIC | header length (<u8) | header (json) | arrays aligned to ALIGNMENT
+# header contains fingerprint of the .json file, the .json content without
+# 'nodes' and dtype, shape and offset of every array
+MAGIC = b'CNNVAST\n'
+FORMAT_VERSION = 1
+ALIGNMENT = 8
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+log.addHandler(logging.StreamHandler())
+
+
+def cache_path(path: str, cache_dir=None) -> str:
+    if cache_dir is None:
+        return os.path.splitext(path)[0] + CACHE_EXTENSION
+
+    # files from different directories have the same names (AST1.json)
+    name = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()
+    return os.path.join(cache_dir, name + CACHE_EXTENSION)
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def save(cache_file: str, tree: SyntaxTree, data: dict, json_fingerprint):
+    arrays = dict()
+    offset = 0
+    for name, array in tree.arrays().items():
+        arrays[name] = {'dtype': array.dtype.str, 'shape': list(array.shape),
+                        'offset': offset}
+        offset = _aligned(offset + array.nbytes)
+
+    header = json.dumps({
+        'version': FORMAT_VERSION,
+        'containers': CONTAINERS,
+        'json': json_fingerprint,
+        'data': {key: value for key, value in data.items()
+                 if key != 'nodes'},
+        'arrays': arrays
+    }).encode()
+    start = _aligned(len(MAGIC) + 8 + len(header))
+
+    # written to temporary file first, so that a reader never sees
+    # half-written cache
+    temp_path = '{}.{}.tmp'.format(cache_file, os.getpid())
+    with open(temp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.array(len(header), dtype='<u8').tobytes())
+        f.write(header)
+        for name, array in tree.arrays().items():
+            f.seek(start + arrays[name]['offset'])
+            f.write(np.ascontiguousarray(array).tobytes())
+
+    os.replace(temp_path, cache_file)
+
+
+# arrays are memory-mapped, so only the header is actually read
+def read(cache_file: str) -> Tuple[dict, dict]:
+    with open(cache_file, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError('Not an AST cache file: {}'.format(cache_file))
+        header_length = int(np.frombuffer(f.read(8), dtype='<u8')[0])
+        header = json.loads(f.read(header_length).decode())
+
+    if (
+            header['version'] != FORMAT_VERSION
+            or header['containers'] != CONTAINERS
+    ):
+        return header, None
+
+    start = _aligned(len(MAGIC) + 8 + header_length)
+    buffer = np.memmap(cache_file, dtype=np.uint8, mode='r')
+    arrays = dict()
+    for name, array in header['arrays'].items():
+        dtype = np.dtype(array['dtype'])
+        count = int(np.prod(array['shape']))
+        offset = start + array['offset']
+        arrays[name] = buffer[offset:offset + count * dtype.itemsize] \
+            .view(dtype).reshape(array['shape'])
+
+    return header, arrays
+
+
+def load(path: str, use_cache=None, cache_dir=None) -> Tuple[dict,
+                                                             SyntaxTree]:
+    '''
+    content of .json file without 'nodes' together with its AST, the AST
+    is read from cache file when the .json file hasn't changed since
+    the cache was written, otherwise the .json file is parsed and the cache
+    is written again
+    '''
+    use_cache = USE_CACHE if use_cache is None else use_cache
+    cache_dir = CACHE_DIR if cache_dir is None else cache_dir
+    cache_file = cache_path(path, cache_dir)
+
+    if use_cache and os.path.exists(cache_file):
+        try:
+            header, arrays = read(cache_file)
+            previous = header['json']
+            json_fingerprint = fingerprint(path, previous)
+
+            if arrays is not None and json_fingerprint['sha1'] == \
+                    previous['sha1']:
+                tree = SyntaxTree.from_arrays(arrays)
+
+                # file was touched without changing its content, new time
+                # is stored so that it's not hashed again next time
+                if json_fingerprint is not previous:
+                    _try_save(cache_file, tree, header['data'],
+                              json_fingerprint)
+
+                return header['data'], tree
+
+        except (OSError, ValueError, KeyError) as e:
+            log.debug('Invalid AST cache {}: {}'.format(cache_file, e))
+
+    # content is hashed from the same bytes which are parsed
+    stat = os.stat(path)
+    with open(path, 'rb') as f:
+        raw_data = f.read()
+    data = json.loads(raw_data.decode())
+    tree = SyntaxTree.from_data(data)
+
+    if use_cache:
+        json_fingerprint = {'sha1': hashlib.sha1(raw_data).hexdigest(),
+                            'mtime_ns': stat.st_mtime_ns,
+                            'size': stat.st_size}
+        _try_save(cache_file, tree, data, json_fingerprint)
+
+    del data['nodes']
+    return data, tree
+
+
+# cache is only an optimization, e.g. read-only data directory is fine
+def _try_save(cache_file, tree, data, json_fingerprint):
+    try:
+        if os.path.dirname(cache_file):
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        save(cache_file, tree, data, json_fingerprint)
+    except OSError as e:
+        log.debug('AST cache {} not written: {}'.format(cache_file, e))
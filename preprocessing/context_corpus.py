@@ -0,0 +1,177 @@
+import os
+import json
+import numpy as np
+from typing import List, Tuple
+from preprocessing.vocabulary import Vocabulary
+
+
+'''
+columnar binary format of extracted context paths, corpus directory contains:
+    starts.int32    start terminal id of every context
+    paths.int32     path id of every context
+    ends.int32      end terminal id of every context
+    offsets.int64   contexts of module i are at [offsets[i], offsets[i + 1])
+    modules.txt     module name on line i
+    terminals.txt   terminal token with id i on line i
+    paths.txt       path token with id i on line i
+    *.counts.tsv    counts of all tokens seen (see Vocabulary)
+    meta.json       format version and counts
+id 0 in both vocabularies is reserved for unknown token
+all arrays are raw little-endian data without header, so they can be opened
+with np.memmap without reading them
+'''
+
+FORMAT_VERSION = 2
+COLUMNS = ('starts', 'paths', 'ends')
+
+CONTEXTS = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def write_lines(path: str, lines: List[str]):
+    with open(path, 'w', encoding='utf-8') as f:
+        for line in lines:
+            f.write(line + '\n')
+
+
+def read_lines(path: str) -> List[str]:
+    with open(path, encoding='utf-8') as f:
+        return f.read().splitlines()
+
+
+class ContextWriter:
+    def __init__(self, corpus_dir: str):
+        os.makedirs(corpus_dir, exist_ok=True)
+        self.corpus_dir = corpus_dir
+        # meta.json is written last, without it the corpus isn't valid, so
+        # metadata of a previous corpus can't describe partially written one
+        meta_path = os.path.join(corpus_dir, 'meta.json')
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+
+        self.columns = {
+            column: open(os.path.join(corpus_dir, column + '.int32'), 'wb')
+            for column in COLUMNS
+        }
+        self.offsets = [0]
+        self.modules = list()
+
+    def __enter__(self):
+        return self
+
+    # corpus is finished only when no exception was raised, otherwise
+    # partially written columns are removed
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def add(self, module: str, starts: np.ndarray, paths: np.ndarray,
+            ends: np.ndarray):
+        np.asarray(starts, dtype='<i4').tofile(self.columns['starts'])
+        np.asarray(paths, dtype='<i4').tofile(self.columns['paths'])
+        np.asarray(ends, dtype='<i4').tofile(self.columns['ends'])
+
+        self.modules.append(module)
+        self.offsets.append(self.offsets[-1] + len(starts))
+
+    def abort(self):
+        if self.columns['starts'].closed:
+            return
+
+        for column, f in self.columns.items():
+            f.close()
+            os.remove(os.path.join(self.corpus_dir, column + '.int32'))
+
+    # vocabularies are usually known only after all modules are added
+    def close(self, terminal_vocab=None, path_vocab=None):
+        if self.columns['starts'].closed:
+            return
+
+        for f in self.columns.values():
+            f.close()
+
+        np.asarray(self.offsets, dtype='<i8').tofile(
+            os.path.join(self.corpus_dir, 'offsets.int64'))
+        write_lines(os.path.join(self.corpus_dir, 'modules.txt'),
+                    self.modules)
+
+        terminal_vocab = terminal_vocab or Vocabulary()
+        path_vocab = path_vocab or Vocabulary()
+        terminal_vocab.save(self.corpus_dir, 'terminals')
+        path_vocab.save(self.corpus_dir, 'paths')
+
+        with open(os.path.join(self.corpus_dir, 'meta.json'), 'w') as f:
+            json.dump({'version': FORMAT_VERSION,
+                       'modules': len(self.modules),
+                       'contexts': self.offsets[-1],
+                       'terminals': len(terminal_vocab),
+                       'paths': len(path_vocab)}, f)
+
+
+class ContextCorpus:
+    def __init__(self, corpus_dir: str):
+        self.corpus_dir = corpus_dir
+        with open(os.path.join(corpus_dir, 'meta.json')) as f:
+            self.meta = json.load(f)
+
+        if self.meta['version'] != FORMAT_VERSION:
+            raise ValueError('Unsupported corpus version {}'.format(
+                self.meta['version']))
+
+        self.offsets = self.__map('offsets.int64', '<i8')
+        self.starts = self.__map('starts.int32', '<i4')
+        self.paths = self.__map('paths.int32', '<i4')
+        self.ends = self.__map('ends.int32', '<i4')
+
+        # vocabularies are read only when needed
+        self.__modules = None
+        self.__terminal_vocab = None
+        self.__path_vocab = None
+
+    def __map(self, name: str, dtype: str) -> np.ndarray:
+        path = os.path.join(self.corpus_dir, name)
+        # empty file can't be memory mapped
+        if os.path.getsize(path) == 0:
+            return np.empty(0, dtype=dtype)
+
+        return np.memmap(path, dtype=dtype, mode='r')
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    # views of start terminal, path and end terminal ids of modules
+    # [start, stop), nothing is copied
+    def modules(self, start: int, stop: int) -> CONTEXTS:
+        begin = self.offsets[start]
+        end = self.offsets[stop]
+
+        return (self.starts[begin:end], self.paths[begin:end],
+                self.ends[begin:end])
+
+    def module(self, index: int) -> CONTEXTS:
+        return self.modules(index, index + 1)
+
+    @property
+    def module_names(self) -> List[str]:
+        if self.__modules is None:
+            self.__modules = read_lines(
+                os.path.join(self.corpus_dir, 'modules.txt'))
+
+        return self.__modules
+
+    @property
+    def terminal_vocab(self) -> List[str]:
+        if self.__terminal_vocab is None:
+            self.__terminal_vocab = read_lines(
+                os.path.join(self.corpus_dir, 'terminals.txt'))
+
+        return self.__terminal_vocab
+
+    @property
+    def path_vocab(self) -> List[str]:
+        if self.__path_vocab is None:
+            self.__path_vocab = read_lines(
+                os.path.join(self.corpus_dir, 'paths.txt'))
+
+        return self.__path_vocab
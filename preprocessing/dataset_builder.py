@@ -1,53 +1,303 @@
 import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+import numpy as np
+from array import array
+from multiprocessing import Pool
 from preprocessing.module_handler import ModuleHandler
-from console_progressbar import ProgressBar
+from preprocessing.vocabulary import Vocabulary
+from preprocessing.context_corpus import ContextWriter
+from preprocessing.manifest import Manifest
+from preprocessing.manifest import fingerprint
+from preprocessing.manifest import source_fingerprint
+from preprocessing.module_files import list_files
 
 
-def main():
+# how often (in seconds) throughput is reported and manifest is saved
+REPORT_INTERVAL = 5
+MANIFEST_SAVE_INTERVAL = 10
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+log.addHandler(logging.StreamHandler())
+
+
+# contexts of a module as ids into module's own vocabularies, so that only
+# a few small arrays are sent back from the worker process
+def encode_contexts(module_handler: ModuleHandler, max_path_length=None,
+                    max_path_width=None) -> dict:
+    terminal_vocab = dict()
+    path_vocab = dict()
+    starts = array('i')
+    paths = array('i')
+    ends = array('i')
+
+    for start, path, end in module_handler.iter_context_tokens(
+            max_path_length, max_path_width):
+        starts.append(terminal_vocab.setdefault(start, len(terminal_vocab)))
+        paths.append(path_vocab.setdefault(path, len(path_vocab)))
+        ends.append(terminal_vocab.setdefault(end, len(terminal_vocab)))
+
+    starts = np.frombuffer(starts, dtype=np.int32)
+    paths = np.frombuffer(paths, dtype=np.int32)
+    ends = np.frombuffer(ends, dtype=np.int32)
+
+    # token counts are the map part of corpus vocabulary building
+    terminal_counts = np.bincount(np.concatenate([starts, ends]),
+                                  minlength=len(terminal_vocab))
+    path_counts = np.bincount(paths, minlength=len(path_vocab))
 
-    path = '/home/katka/Desktop/FIIT/BP/BPVis/data'
-    files = list()
+    return {
+        'terminal_tokens': list(terminal_vocab),
+        'terminal_counts': terminal_counts.tolist(),
+        'path_tokens': list(path_vocab),
+        'path_counts': path_counts.tolist(),
+        'starts': starts,
+        'paths': paths,
+        'ends': ends
+    }
 
-    # r=root, d=directories, f = files
-    # list all json files
-    for r, d, f in os.walk(path):
-        for file in f:
-            if '.json' in file:
-                files.append(os.path.join(r, file))
 
-    pb = ProgressBar(total=len(files), prefix='0 files',
-                     suffix='{} files'.format(len(files)),
-                     decimals=2, length=50, fill='X', zfill='-')
-    progress = 0
+# contexts are saved to a shard file which is renamed only when complete
+def save_shard(path: str, result: dict):
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        np.savez(f, **{key: np.asarray(value, dtype=str)
+                       if key.endswith('_tokens') else value
+                       for key, value in result.items()})
 
-    # make input for all .json files
-    for file in files:
+    os.replace(temp_path, path)
+
+
+# runs in worker process, exceptions are returned instead of raised so that
+# one broken module doesn't stop the whole run
+def process_file(task: tuple) -> tuple:
+    file, shard_path, max_path_length, max_path_width = task
+    source_path = source = None
+
+    try:
         module_handler = ModuleHandler(file)
-        all_nodes = module_handler.get_all_nodes()
-        terminals = module_handler.get_terminals()
-        paths = module_handler.get_paths()
-        context_paths = module_handler.get_context_paths()
-        # print('\n' + file)
-        # print(all_nodes)
-        # print(terminals)
-        # print(paths)
-        # print(context_paths)
-        # print('==================================================')
-
-        # update progress bar
-        progress += 1
-        pb.print_progress_bar(progress)
-
-    # module_handler = ModuleHandler(files[0])
-    # print(files[0])
-    # all_nodes = module_handler.get_all_nodes()
-    # terminals = module_handler.get_terminals()
-    # paths = module_handler.get_paths()
-    # context_paths = module_handler.get_context_paths()
-    # print(all_nodes)
-    # print(terminals)
-    # print(paths)
-    # print(context_paths)
+        # contexts don't need lua source, it's only recorded in manifest,
+        # e.g. path in .json file is often from another machine
+        source_path = module_handler.data.get('path')
+        source = source_fingerprint(source_path)
+
+        result = encode_contexts(module_handler, max_path_length,
+                                 max_path_width)
+        save_shard(shard_path, result)
+        return file, {'source_path': source_path, 'source': source,
+                      'contexts': len(result['starts'])}, None
+
+    except Exception as e:
+        return file, {'source_path': source_path, 'source': source}, \
+            '{}: {}'.format(type(e).__name__, e)
+
+
+class Throughput:
+    def __init__(self, total: int):
+        self.total = total
+        self.files = 0
+        self.contexts = 0
+        self.failed = 0
+        self.start = time.perf_counter()
+        self.last_report = self.start
+
+    def update(self, contexts: int, failed: bool):
+        self.files += 1
+        self.contexts += contexts
+        self.failed += failed
+
+        now = time.perf_counter()
+        if now - self.last_report >= REPORT_INTERVAL:
+            self.last_report = now
+            self.report()
+
+    def report(self):
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        log.info('{}/{} files ({} failed), {:.1f} files/s, {:.0f} contexts/s'
+                 .format(self.files, self.total, self.failed,
+                         self.files / elapsed, self.contexts / elapsed))
+
+
+# shard file name doesn't depend on the location of data directory
+def shard_name(module: str) -> str:
+    return hashlib.sha1(module.encode('utf-8')).hexdigest() + '.npz'
+
+
+# extracts contexts of new and changed modules to shards and removes shards
+# of deleted modules, manifest records what each shard was built from, so
+# an interrupted run continues where it stopped
+def update_shards(files: list, data_dir: str, output_dir: str, workers: int,
+                  chunksize: int, manifest: Manifest) -> Throughput:
+    shard_dir = os.path.join(output_dir, 'shards')
+    os.makedirs(shard_dir, exist_ok=True)
+
+    modules = {os.path.relpath(file, data_dir): file for file in files}
+    for module in set(manifest.entries) - set(modules):
+        shard = manifest.entries.pop(module)['shard']
+        if shard and os.path.exists(os.path.join(shard_dir, shard)):
+            os.remove(os.path.join(shard_dir, shard))
+
+    tasks = [(file, os.path.join(shard_dir, shard_name(module)),
+              manifest.options['max_path_length'],
+              manifest.options['max_path_width'])
+             for module, file in modules.items()
+             if not manifest.is_current(module, file, shard_dir)]
+
+    log.info('Processing {} of {} files with {} workers'.format(
+        len(tasks), len(files), workers))
+    throughput = Throughput(len(tasks))
+    last_save = time.perf_counter()
+
+    pool = Pool(workers) if workers > 1 and tasks else None
+    try:
+        # imap keeps the order of files, chunks reduce the overhead
+        # of sending tasks to workers
+        if pool:
+            results = pool.imap(process_file, tasks, chunksize)
+        else:
+            results = map(process_file, tasks)
+
+        for file, result, error in results:
+            module = os.path.relpath(file, data_dir)
+            if error:
+                log.warning('Failed to process {}: {}'.format(module, error))
+                # shard from the previous run is outdated
+                shard_path = os.path.join(shard_dir, shard_name(module))
+                if os.path.exists(shard_path):
+                    os.remove(shard_path)
+
+            manifest.entries[module] = {
+                'json': fingerprint(file),
+                'source_path': result['source_path'],
+                'source': result['source'],
+                'shard': None if error else shard_name(module),
+                'error': error
+            }
+            throughput.update(result.get('contexts', 0), bool(error))
+
+            if time.perf_counter() - last_save >= MANIFEST_SAVE_INTERVAL:
+                manifest.save()
+                last_save = time.perf_counter()
+
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+        manifest.save()
+
+    throughput.report()
+    return throughput
+
+
+# corpus is assembled from all shards, first the token counts are merged
+# into vocabularies and then local ids are translated to corpus-wide ids,
+# the whole corpus is written again on every run, because new modules can
+# change the ids
+def write_corpus(modules: list, output_dir: str, min_count=1,
+                 max_terminals=None, max_paths=None, vocab_dir=None):
+    shard_dir = os.path.join(output_dir, 'shards')
+
+    # ids of previous corpus are kept, so they stay valid, but counts are
+    # collected again from all shards, otherwise every rebuild would add
+    # counts of unchanged modules once more
+    if vocab_dir:
+        terminal_vocab = Vocabulary.load(vocab_dir, 'terminals',
+                                         counts=False)
+        path_vocab = Vocabulary.load(vocab_dir, 'paths', counts=False)
+    else:
+        terminal_vocab = Vocabulary()
+        path_vocab = Vocabulary()
+
+    for module, shard in modules:
+        with np.load(os.path.join(shard_dir, shard)) as contexts:
+            terminal_vocab.update(zip(contexts['terminal_tokens'].tolist(),
+                                      contexts['terminal_counts'].tolist()))
+            path_vocab.update(zip(contexts['path_tokens'].tolist(),
+                                  contexts['path_counts'].tolist()))
+
+    terminal_vocab.freeze(min_count, max_terminals)
+    path_vocab.freeze(min_count, max_paths)
+    log.info('Vocabulary: {} terminals, {} paths'.format(len(terminal_vocab),
+                                                         len(path_vocab)))
+
+    with ContextWriter(output_dir) as output:
+        for module, shard in modules:
+            with np.load(os.path.join(shard_dir, shard)) as contexts:
+                terminal_ids = terminal_vocab.lookup(
+                    contexts['terminal_tokens'].tolist())
+                path_ids = path_vocab.lookup(
+                    contexts['path_tokens'].tolist())
+
+                output.add(module, terminal_ids[contexts['starts']],
+                           path_ids[contexts['paths']],
+                           terminal_ids[contexts['ends']])
+
+        output.close(terminal_vocab, path_vocab)
+
+
+# returns number of modules which couldn't be processed
+def build(data_dir: str, output_dir: str, workers: int, chunksize: int,
+          max_path_length=None, max_path_width=None, min_count=1,
+          max_terminals=None, max_paths=None, vocab_dir=None) -> int:
+    files = list_files(data_dir)
+    os.makedirs(output_dir, exist_ok=True)
+
+    manifest = Manifest(os.path.join(output_dir, 'manifest.json'),
+                        {'max_path_length': max_path_length,
+                         'max_path_width': max_path_width})
+    update_shards(files, data_dir, output_dir, workers, chunksize, manifest)
+
+    modules = list()
+    with open(os.path.join(output_dir, 'errors.jsonl'), 'w') as errors:
+        for file in files:
+            module = os.path.relpath(file, data_dir)
+            entry = manifest.entries[module]
+            if entry['error']:
+                errors.write(json.dumps({'module': module,
+                                         'error': entry['error']}) + '\n')
+            else:
+                modules.append((module, entry['shard']))
+
+    write_corpus(modules, output_dir, min_count, max_terminals, max_paths,
+                 vocab_dir)
+    return len(files) - len(modules)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Extract context paths from all .json files in data '
+                    'directory')
+    parser.add_argument('data_dir')
+    parser.add_argument('output_dir')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='number of worker processes')
+    parser.add_argument('--chunksize', type=int, default=4,
+                        help='number of files sent to a worker at once')
+    parser.add_argument('--max-path-length', type=int, default=None)
+    parser.add_argument('--max-path-width', type=int, default=None)
+    parser.add_argument('--min-count', type=int, default=1,
+                        help='tokens seen less often get unknown id')
+    parser.add_argument('--max-terminals', type=int, default=None,
+                        help='maximal size of terminal vocabulary')
+    parser.add_argument('--max-paths', type=int, default=None,
+                        help='maximal size of path vocabulary')
+    parser.add_argument('--vocab', default=None,
+                        help='corpus directory whose vocabulary is extended')
+    args = parser.parse_args()
+
+    failed = build(args.data_dir, args.output_dir, args.workers,
+                   args.chunksize, args.max_path_length, args.max_path_width,
+                   args.min_count, args.max_terminals, args.max_paths,
+                   args.vocab)
+
+    # non-zero exit code when some files failed
+    sys.exit(1 if failed else 0)
 
 
 if __name__ == '__main__':
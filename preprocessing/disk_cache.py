@@ -0,0 +1,117 @@
+import os
+import zipfile
+import logging
+from threading import Lock
+
+
+# images, tile pyramids, code blocks and tree layouts are kept in
+# subdirectories of CACHE_DIR, so that they are computed only once and any
+# server worker finds them, least recently used files are removed when
+# the whole cache is larger than MAX_CACHE_SIZE bytes, the cache can be
+# turned off with USE_CACHE (the app has to run with a single worker then)
+USE_CACHE = True
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'codennvis')
+MAX_CACHE_SIZE = 1024 * 1024 * 1024
+# the cache is pruned after every PRUNE_INTERVAL bytes written by a process
+PRUNE_INTERVAL = MAX_CACHE_SIZE // 16
+# errors of reading broken or half-written file
+READ_ERRORS = (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile)
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+log.addHandler(logging.StreamHandler())
+
+# bytes written since the last pruning, the first write prunes, so that
+# a new process doesn't start with too large cache
+_written = PRUNE_INTERVAL
+_written_lock = Lock()
+
+
+# subdirectory of the cache, None when the cache is turned off
+def directory(name: str):
+    return os.path.join(CACHE_DIR, name) if USE_CACHE else None
+
+
+# written to temporary file first, so that other worker never reads
+# half-written file, failed write is only logged, e.g. read-only home
+# directory, because the cache is only an optimization
+def save(path: str, write):
+    global _written
+
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temp_path, 'wb') as f:
+            write(f)
+        size = os.path.getsize(temp_path)
+        os.replace(temp_path, path)
+    except OSError as e:
+        log.debug('Cache file {} not written: {}'.format(path, e))
+        return
+
+    with _written_lock:
+        _written += size
+        due = _written >= PRUNE_INTERVAL
+        if due:
+            _written = 0
+
+    if due:
+        prune()
+
+
+# value read from the file by read(f), None when there is no such file,
+# file which can't be read is removed, modification time of a read file
+# is updated, so that the least recently used files are pruned
+def load(path: str, read):
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+
+    with f:
+        try:
+            value = read(f)
+        except READ_ERRORS as e:
+            log.debug('Invalid cache file {}: {}'.format(path, e))
+            value = None
+
+    try:
+        if value is None:
+            os.remove(path)
+        else:
+            os.utime(path)
+    except OSError:
+        pass
+
+    return value
+
+
+# least recently used files are removed until the cache fits into max_size
+def prune(cache_dir=None, max_size=None):
+    cache_dir = cache_dir or CACHE_DIR
+    max_size = MAX_CACHE_SIZE if max_size is None else max_size
+
+    files = list()
+    for r, d, f in os.walk(cache_dir):
+        for name in f:
+            # files being written by other processes
+            if name.endswith('.tmp'):
+                continue
+
+            path = os.path.join(r, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime_ns, stat.st_size, path))
+
+    size = sum(file_size for _, file_size, _ in files)
+    for _, file_size, path in sorted(files):
+        if size <= max_size:
+            break
+
+        try:
+            os.remove(path)
+            size -= file_size
+        except OSError as e:
+            log.debug('Cache file {} not removed: {}'.format(path, e))
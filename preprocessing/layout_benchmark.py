@@ -0,0 +1,89 @@
+import os
+import json
+import time
+import argparse
+import importlib.util
+import numpy as np
+from preprocessing import tree_layout
+from preprocessing.module_files import list_files
+from preprocessing.syntax_tree import SyntaxTree
+
+
+'''
+compares time of tree layout per module between the builtin tidy tree
+layout and layout_reingold_tilford of igraph (when it's installed), modules
+are grouped by the number of nodes of their AST
+usage: python3 -m preprocessing.layout_benchmark <data_dir> [--limit N]
+'''
+
+
+# upper bounds of the groups of modules by the number of nodes
+GROUPS = [1000, 10000, 100000]
+
+
+def measure(tree: SyntaxTree, engine: str) -> tuple:
+    start = time.perf_counter()
+    layout = tree_layout.compute(tree, engine)
+    return time.perf_counter() - start, np.ptp(layout[:, 0])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark builtin tree layout against igraph')
+    parser.add_argument('data_dir')
+    parser.add_argument('--limit', type=int, default=None,
+                        help='benchmark only first N modules')
+    parser.add_argument('--min-nodes', type=int, default=100)
+    parser.add_argument('--max-nodes', type=int, default=GROUPS[-1])
+    parser.add_argument('--max-igraph-nodes', type=int, default=GROUPS[-1],
+                        help='skip igraph for bigger modules')
+    args = parser.parse_args()
+
+    igraph = importlib.util.find_spec('igraph') is not None
+    if not igraph:
+        print('igraph is not installed, only builtin layout is measured')
+
+    print('{:<50} {:>7} {:>12} {:>12} {:>10} {:>8}'.format(
+        'module', 'nodes', 'builtin [s]', 'igraph [s]', 'width', 'speedup'))
+
+    # total builtin and igraph time of modules with both timings per group
+    totals = {group: [0, 0.0, 0.0] for group in GROUPS}
+    for file in list_files(args.data_dir)[:args.limit]:
+        with open(file) as f:
+            tree = SyntaxTree.from_data(json.load(f))
+        if not args.min_nodes <= tree.size <= args.max_nodes:
+            continue
+
+        builtin_time, builtin_width = measure(tree, 'builtin')
+        igraph_time, igraph_width = None, None
+        if igraph and tree.size <= args.max_igraph_nodes:
+            igraph_time, igraph_width = measure(tree, 'igraph')
+            group = next((group for group in GROUPS if tree.size <= group),
+                         GROUPS[-1])
+            totals[group][0] += 1
+            totals[group][1] += builtin_time
+            totals[group][2] += igraph_time
+
+        print('{:<50} {:>7} {:>12.4f} {:>12} {:>10} {:>8}'.format(
+            os.path.relpath(file, args.data_dir)[-50:], tree.size,
+            builtin_time,
+            '{:.4f}'.format(igraph_time) if igraph_time is not None
+            else 'skipped',
+            '{:.0f}/{:.0f}'.format(builtin_width, igraph_width)
+            if igraph_width is not None else '{:.0f}'.format(builtin_width),
+            '{:.1f}x'.format(igraph_time / builtin_time) if igraph_time
+            else '-'))
+
+    lower = 0
+    for group in GROUPS:
+        count, builtin_total, igraph_total = totals[group]
+        if count:
+            print('{}-{} nodes, {} modules: builtin {:.2f}s, igraph {:.2f}s, '
+                  '{:.1f}x'.format(max(lower + 1, args.min_nodes), group,
+                                   count, builtin_total, igraph_total,
+                                   igraph_total / builtin_total))
+        lower = group
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+import os
+import json
+import hashlib
+import logging
+
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+log.addHandler(logging.StreamHandler())
+
+
+# sha1 of file content together with its size and modification time
+def fingerprint(path: str, previous=None) -> dict:
+    stat = os.stat(path)
+
+    # content is hashed only when the file was touched since the last time
+    if (
+            previous
+            and previous['mtime_ns'] == stat.st_mtime_ns
+            and previous['size'] == stat.st_size
+    ):
+        return previous
+
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(block)
+
+    return {'sha1': sha1.hexdigest(), 'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size}
+
+
+# fingerprint of lua source file together with its path, None when there
+# is no such file, previous fingerprint is reused only for the same path
+def source_fingerprint(path: str, previous=None):
+    if not path:
+        return None
+    if previous and previous['path'] != path:
+        previous = None
+
+    try:
+        current = fingerprint(path, previous)
+    except FileNotFoundError:
+        return None
+
+    return current if current is previous else dict(current, path=path)
+
+
+class Manifest:
+    '''
+    persistent record of processed modules, for every module (relative path
+    of its .json file) there is an entry like:
+        {'json': <fingerprint>,
+         'source_path': <lua file from .json> or None,
+         'source': {'path': <lua file>, **<fingerprint>} or None,
+         'shard': <file with extracted contexts> or None,
+         'error': <error message> or None}
+    source is None also when the lua file doesn't exist, contexts are
+    extracted only from .json file
+    entries are valid only for the options they were built with, e.g.
+    different path limits make all of them outdated
+    '''
+
+    def __init__(self, path: str, options: dict):
+        self.path = path
+        self.options = options
+        self.entries = dict()
+
+        if os.path.exists(path):
+            with open(path) as f:
+                manifest = json.load(f)
+
+            if manifest['options'] == options:
+                self.entries = manifest['entries']
+            else:
+                log.info('Options changed, all modules will be processed')
+
+    # module is up to date when it was processed without error, neither
+    # its .json file nor lua source file has changed since and its shard
+    # still exists
+    def is_current(self, module: str, json_path: str,
+                   shard_dir: str) -> bool:
+        entry = self.entries.get(module)
+        if entry is None or entry['error']:
+            return False
+
+        if entry['shard'] and not os.path.exists(
+                os.path.join(shard_dir, entry['shard'])):
+            return False
+
+        json_fingerprint = fingerprint(json_path, entry['json'])
+        if json_fingerprint['sha1'] != entry['json']['sha1']:
+            return False
+        entry['json'] = json_fingerprint
+
+        source = entry['source']
+        current = source_fingerprint(
+            entry.get('source_path') or (source and source['path']), source)
+        # lua file has appeared, disappeared or changed
+        if (current and current['sha1']) != (source and source['sha1']):
+            return False
+        entry['source'] = current
+
+        return True
+
+    # written to temporary file first, so that interrupted write doesn't
+    # destroy the manifest
+    def save(self):
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({'options': self.options, 'entries': self.entries}, f,
+                      indent=1, sort_keys=True)
+
+        os.replace(temp_path, self.path)
@@ -0,0 +1,151 @@
+import os
+import json
+import logging
+import urllib.request
+from threading import Lock
+from collections import OrderedDict
+from preprocessing import ast_cache
+from preprocessing import source_text
+from preprocessing import tag_table
+from preprocessing.manifest import source_fingerprint
+from preprocessing.syntax_tree import SyntaxTree
+
+
+# upper bound of cached data in bytes (sizes of .json and lua files)
+MAX_CACHE_SIZE = 256 * 1024 * 1024
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+log.addHandler(logging.StreamHandler())
+
+
+class ModuleDocument:
+    '''
+    parsed .json file of a module together with its AST and decoded source
+    code, loaded once and shared by all the views of the module
+    '''
+
+    def __init__(self, data: dict, tree=None):
+        # tree may come from AST cache, then data doesn't contain 'nodes'
+        self.data = data
+        self.tree = tree or SyntaxTree.from_data(data)
+        self.size = 0
+        self.__source = None
+        self.__spans = None
+        self.__tag_tables = dict()
+
+    @property
+    def source(self) -> source_text.SourceText:
+        # source is read only by views which need it
+        if self.__source is None:
+            self.__source = source_text.load(self.data['path'],
+                                             self.data['url'])
+            self.size += len(self.__source.text)
+
+        return self.__source
+
+    # lua source code without '\r' characters
+    @property
+    def source_code(self) -> str:
+        return self.source.text
+
+    # start and end (exclusive) of every node in source_code
+    @property
+    def spans(self) -> tuple:
+        if self.__spans is None:
+            starts = self.tree.positions - 1
+            self.__spans = (self.source.offsets(starts),
+                            self.source.offsets(
+                                starts + self.tree.characters_counts))
+
+        return self.__spans
+
+    # container of every character, built once for each comments setting
+    def tags(self, comments=True) -> tag_table.TagTable:
+        if comments not in self.__tag_tables:
+            self.__tag_tables[comments] = tag_table.build(self, comments)
+            self.size += self.__tag_tables[comments].codes.nbytes
+
+        return self.__tag_tables[comments]
+
+    @classmethod
+    def load(cls, path=None, url=None) -> 'ModuleDocument':
+        if all(arg is None for arg in {path, url}):
+            raise ValueError('Expected either path or url argument')
+
+        return cache.get(path, url)
+
+
+class DocumentCache:
+    '''
+    least recently used documents, keyed by path and modification time of
+    .json file and sha1 of its lua file, so that a document is loaded again
+    when either of them has changed
+    '''
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.documents = OrderedDict()
+        # lua file and its last fingerprint (None when it doesn't exist) of
+        # every path in documents, content is hashed only when the file was
+        # touched since
+        self.sources = dict()
+        self.lock = Lock()
+
+    def get(self, path=None, url=None) -> ModuleDocument:
+        if path:
+            mtime_ns = os.stat(path).st_mtime_ns
+            # lua file is known only from .json file, so the one of the last
+            # loaded version is checked, changed .json file is loaded anyway
+            with self.lock:
+                source_path, source = self.sources.get(path, (None, None))
+            source = source_fingerprint(source_path, source)
+            key = (path, mtime_ns, source and source['sha1'])
+        else:
+            key = (url, None, None)
+
+        with self.lock:
+            if key in self.documents:
+                self.documents.move_to_end(key)
+                return self.documents[key]
+
+        if path:
+            document = ModuleDocument(*ast_cache.load(path))
+            document.size = os.path.getsize(path)
+            source_path = document.data.get('path')
+            source = source_fingerprint(source_path, source)
+            key = (path, mtime_ns, source and source['sha1'])
+        else:
+            log.debug('Loading data file from {}'.format(url))
+            with urllib.request.urlopen(url) as url_data:
+                raw_data = url_data.read()
+            document = ModuleDocument(json.loads(raw_data.decode()))
+            document.size = len(raw_data)
+
+        with self.lock:
+            # older versions of the same file are not needed anymore
+            for old_key in [k for k in self.documents if k[0] == key[0]]:
+                del self.documents[old_key]
+
+            self.documents[key] = document
+            if path:
+                self.sources[path] = (source_path, source)
+            self.__evict()
+
+        return document
+
+    def __evict(self):
+        # source code size is known only after it was read
+        size = sum(document.size for document in self.documents.values())
+        while size > self.max_size and len(self.documents) > 1:
+            (old_path, _, _), document = self.documents.popitem(last=False)
+            self.sources.pop(old_path, None)
+            size -= document.size
+
+    def clear(self):
+        with self.lock:
+            self.documents.clear()
+            self.sources.clear()
+
+
+cache = DocumentCache(MAX_CACHE_SIZE)
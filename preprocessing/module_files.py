@@ -0,0 +1,16 @@
+import os
+from typing import List
+
+
+# all .json files of modules in data directory, sorted so that the order
+# is the same on every run
+def list_files(path: str) -> List[str]:
+    files = list()
+
+    # r=root, d=directories, f = files
+    for r, d, f in os.walk(path):
+        for file in f:
+            if '.json' in file:
+                files.append(os.path.join(r, file))
+
+    return sorted(files)
@@ -1,7 +1,9 @@
-import json
-import numpy as np
-import itertools
-from typing import List, Tuple, Any
+import bisect
+from typing import List, Tuple, Any, Iterator
+from constant import CONTAINERS
+from preprocessing import ast_cache
+from preprocessing.path_engine import PathEngine
+from preprocessing.syntax_tree import SyntaxTree
 
 
 NODE = Tuple[str, Any]
@@ -13,157 +15,124 @@ class ModuleHandler:
     def __init__(self, path: str, json_dict=None):
         if json_dict is not None:
             self.data = json_dict
+            self.tree = SyntaxTree.from_data(self.data)
         else:
-            with open(path) as f:
-                self.data = json.load(f)
-
-        self.tree = dict()
-        self.__build_tree()
-
-    '''
-    build tree representation of AST in dictionary 
-    without all the additional info from AST
-    AST tree in .json file would look something like this:
-        tree = {0: [1, 3, 4],
-                1: [2],
-                2: [],
-                3: [],
-                4: [5],
-                5: []}
-    but as we need to find path from the leaves to the root
-    tree looks like this:
-        tree = {0: [1, 3, 4],
-            1: [0, 2],
-            2: [1],
-            3: [0],
-            4: [0, 5],
-            5: [4]}
-    '''
-
-    def __add_children_to_tree(self, node: dict):
-        for child in node['children']:
-            self.tree[str(node['master_index'])].append(
-                str(child['master_index'])
-            )
-            self.tree[str(child['master_index'])] = list(
-                str(node['master_index'])
-            )
-            if 'children' in child:
-                self.__add_children_to_tree(child)
-
-    def __build_tree(self):
-        self.tree['0'] = list()
-
-        for node in self.data['nodes']:
-            self.tree['0'].append(str(node['master_index']))
-            # edge back to the root
-            self.tree[str(node['master_index'])] = list('0')
-            if 'children' in node:
-                self.__add_children_to_tree(node)
-
-    def __get_child_nodes(self, node: dict) -> List[NODE]:
-        nodes = list()
-
-        if 'children' in node:
-            for child in node['children']:
-                nodes += [(str(child['master_index']),
-                           child['container'])] + self.__get_child_nodes(child)
-
-        return nodes
+            # AST is memory-mapped from cache file when it's up to date
+            self.data, self.tree = ast_cache.load(path)
 
-    # all nodes from AST + root as a list of tuples
-    def get_all_nodes(self) -> List[NODE]:
-        nodes = [('0', 'root')]
-        for node in self.data['nodes']:
-            nodes += [(str(node['master_index']),
-                       node['container'])] + self.__get_child_nodes(node)
-
-        return nodes
+        # plain lists are a lot faster than NumPy arrays for single lookups
+        self.depths = self.tree.depths.tolist()
+        self.sibling_index = self.tree.sibling_index.tolist()
+        self.order = self.tree.order.tolist()
+        self.subtree_end = self.tree.subtree_end.tolist()
+        self.containers = [CONTAINERS[code]
+                           for code in self.tree.containers.tolist()]
 
-    def __get_child_terminals(self, node: dict) -> List[NODE]:
-        terminals = list()
+        # path between 2 leaves goes from the first leaf up to their lowest
+        # common ancestor and down to the second leaf (see PathEngine)
+        self.path_engine = PathEngine(self.tree.parents, self.tree.depths)
 
-        for child in node['children']:
-            if 'children' not in child:
-                terminals.append((str(child['master_index']),
-                                  child['container']))
-            else:
-                terminals += self.__get_child_terminals(child)
-
-        return terminals
+    # all nodes from AST + root as a list of tuples
+    def get_all_nodes(self) -> List[NODE]:
+        return [(str(index), self.containers[index])
+                for index in self.tree.preorder.tolist()]
 
     # all terminal nodes from AST as a list of tuples
+    # there are some cases when root has only one child
+    # in that case root is also terminal
     def get_terminals(self) -> List[NODE]:
-        terminals = list()
-
-        # there are some cases when root has only one child
-        # in that case root is also terminal
-        if len(self.tree['0']) == 1:
-            terminals.append(('0', 'root'))
-
-        for node in self.data['nodes']:
-            if 'children' not in node:
-                terminals.append((str(node['master_index']),
-                                  node['container']))
-            else:
-                terminals += self.__get_child_terminals(node)
-
-        return terminals
-
-    def __get_terminal_pairs(self) -> Any:
+        return [(str(index), self.containers[index])
+                for index in self.tree.terminals.tolist()]
+
+    # difference between positions of the 2 children of the lowest common
+    # ancestor that the path goes through (path width in code2vec)
+    def __path_width(self, start: int, end: int, top: int) -> int:
+        if start == top or end == top:
+            return 0
+
+        start_branch = self.path_engine.ancestor(
+            start, self.depths[start] - self.depths[top] - 1)
+        end_branch = self.path_engine.ancestor(
+            end, self.depths[end] - self.depths[top] - 1)
+
+        return abs(self.sibling_index[start_branch]
+                   - self.sibling_index[end_branch])
+
+    # yields pairs of terminals together with their lowest common ancestor
+    # pairs longer than max_path_length edges or wider than max_path_width
+    # are skipped before their path is built
+    def __iter_terminal_pairs(self, max_path_length=None,
+                              max_path_width=None) -> Iterator:
         terminals = self.get_terminals()
-        pairs = np.asarray(list(itertools.combinations(terminals, 2)))
-
-        return pairs
-
-    # find path between 2 given terminals
-    def __find_path(self, start: str, end: str, visited=None) -> PATH or None:
-        if start == end:
-            return [start]
-
-        visited = visited or set()
-        for node in self.tree[start]:
-            if node not in visited:
-                visited.add(node)
-
-                new_path = self.__find_path(node, end, visited)
-                if new_path is not None:
-                    return [start] + new_path
-
-        return None
-
-    @staticmethod
-    def __add_arrows(path: List[str]) -> PATH:
-        path_with_arrows = list()
-        for i in range(len(path) - 1):
-            path_with_arrows.append(path[i])
-            if path[i] > path[i + 1]:
-                path_with_arrows.append('up')
-            else:
-                path_with_arrows.append('down')
-
-        path_with_arrows.append(path[-1])
-        return path_with_arrows
-
-    def get_paths(self) -> List[PATH]:
-        terminal_pairs = self.__get_terminal_pairs()
-        paths = list()
-        for pair in terminal_pairs:
-            path = self.__find_path(pair[0][0], pair[1][0])
-            path = self.__add_arrows(path)
-            paths.append(path[1:-1])
-
-        return paths
+        indices = [int(terminal[0]) for terminal in terminals]
+        # terminals are listed in pre-order, so ranks are ascending
+        ranks = [self.order[index] for index in indices]
+
+        for i, start in enumerate(indices):
+            stop = len(indices)
+            if max_path_length is not None:
+                # the other terminal has to be in the subtree of the ancestor
+                # max_path_length levels above, which is a continuous range
+                # of the terminals
+                ancestor = self.path_engine.ancestor(
+                    start, min(max_path_length, self.depths[start]))
+                stop = bisect.bisect_right(
+                    ranks, self.subtree_end[ancestor], lo=i + 1)
+
+            for j in range(i + 1, stop):
+                end = indices[j]
+                top = self.path_engine.lca(start, end)
+
+                if (
+                        max_path_length is not None
+                        and (self.depths[start] + self.depths[end]
+                             - 2 * self.depths[top]) > max_path_length
+                ):
+                    continue
+
+                if (
+                        max_path_width is not None
+                        and self.__path_width(start, end, top) > max_path_width
+                ):
+                    continue
+
+                yield terminals[i], terminals[j], top
+
+    # lazily yields paths between terminals (leaves) without the actual leaves
+    def iter_paths(self, max_path_length=None,
+                   max_path_width=None) -> Iterator[PATH]:
+        for terminal_from, terminal_to, top in self.__iter_terminal_pairs(
+                max_path_length, max_path_width):
+            path = self.path_engine.path(
+                int(terminal_from[0]), int(terminal_to[0]), top)
+            yield path[1:-1]
+
+    # lazily yields context paths, terminals with the path between them
+    def iter_context_paths(self, max_path_length=None,
+                           max_path_width=None) -> Iterator[PATH_CONTEXT]:
+        for terminal_from, terminal_to, top in self.__iter_terminal_pairs(
+                max_path_length, max_path_width):
+            path = self.path_engine.path(
+                int(terminal_from[0]), int(terminal_to[0]), top)
+            yield [terminal_from, path[1:-1], terminal_to]
+
+    # context paths where the nodes inside the path are replaced by their
+    # containers, so that the same shape of path has the same text in every
+    # module, e.g. ('variable', 'up function up root down other', 'other')
+    def iter_context_tokens(self, max_path_length=None,
+                            max_path_width=None) -> Iterator[Tuple[str, ...]]:
+        for terminal_from, terminal_to, top in self.__iter_terminal_pairs(
+                max_path_length, max_path_width):
+            path = self.path_engine.path(
+                int(terminal_from[0]), int(terminal_to[0]), top,
+                self.containers)
+            yield terminal_from[1], ' '.join(path[1:-1]), terminal_to[1]
+
+    def get_paths(self, max_path_length=None,
+                  max_path_width=None) -> List[PATH]:
+        return list(self.iter_paths(max_path_length, max_path_width))
 
     # all possible paths between terminals (leaves) without the actual leaves
-    def get_context_paths(self) -> List[PATH_CONTEXT]:
-        terminal_pairs = self.__get_terminal_pairs()
-        context_paths = list()
-        for pair in terminal_pairs:
-            terminal_from = (str(pair[0][0]), str(pair[0][1]))
-            terminal_to = (str(pair[1][0]), str(pair[1][1]))
-            path = self.__find_path(pair[0][0], pair[1][0])
-            path = self.__add_arrows(path)
-            context_paths.append([terminal_from, path[1:-1], terminal_to])
-
-        return context_paths
+    def get_context_paths(self, max_path_length=None,
+                          max_path_width=None) -> List[PATH_CONTEXT]:
+        return list(self.iter_context_paths(max_path_length, max_path_width))
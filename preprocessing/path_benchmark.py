@@ -0,0 +1,129 @@
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+from preprocessing.module_handler import ModuleHandler
+from preprocessing.module_files import list_files
+
+
+'''
+compares time of context path extraction per module between the LCA based
+PathEngine used by ModuleHandler and the original recursive search over
+string-keyed adjacency lists
+usage: python3 -m preprocessing.path_benchmark <data_dir> [--limit N]
+'''
+
+
+# original implementation, kept here only as a reference for the benchmark
+class DFSPaths:
+    def __init__(self, data: dict):
+        self.data = data
+        self.tree = {'0': list()}
+
+        for node in self.data['nodes']:
+            self.tree['0'].append(str(node['master_index']))
+            self.tree[str(node['master_index'])] = list('0')
+            if 'children' in node:
+                self.__add_children_to_tree(node)
+
+    def __add_children_to_tree(self, node: dict):
+        for child in node['children']:
+            self.tree[str(node['master_index'])].append(
+                str(child['master_index'])
+            )
+            self.tree[str(child['master_index'])] = list(
+                str(node['master_index'])
+            )
+            if 'children' in child:
+                self.__add_children_to_tree(child)
+
+    def __find_path(self, start: str, end: str, visited=None):
+        if start == end:
+            return [start]
+
+        visited = visited or set()
+        for node in self.tree[start]:
+            if node not in visited:
+                visited.add(node)
+
+                new_path = self.__find_path(node, end, visited)
+                if new_path is not None:
+                    return [start] + new_path
+
+        return None
+
+    @staticmethod
+    def __add_arrows(path):
+        path_with_arrows = list()
+        for i in range(len(path) - 1):
+            path_with_arrows.append(path[i])
+            if path[i] > path[i + 1]:
+                path_with_arrows.append('up')
+            else:
+                path_with_arrows.append('down')
+
+        path_with_arrows.append(path[-1])
+        return path_with_arrows
+
+    def get_context_paths(self, terminals):
+        context_paths = list()
+        for start, end in itertools.combinations(terminals, 2):
+            path = self.__find_path(start[0], end[0])
+            path = self.__add_arrows(path)
+            context_paths.append([start, path[1:-1], end])
+
+        return context_paths
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark LCA path engine against the recursive search')
+    parser.add_argument('data_dir')
+    parser.add_argument('--limit', type=int, default=None,
+                        help='benchmark only first N modules')
+    parser.add_argument('--max-dfs-terminals', type=int, default=1000,
+                        help='skip recursive search for bigger modules')
+    args = parser.parse_args()
+
+    # recursive search goes as deep as the longest path it tries
+    sys.setrecursionlimit(100000)
+
+    print('{:<50} {:>7} {:>10} {:>10} {:>10} {:>8}'.format(
+        'module', 'leaves', 'pairs', 'dfs [s]', 'lca [s]', 'speedup'))
+
+    dfs_total = 0
+    lca_total = 0
+    for file in list_files(args.data_dir)[:args.limit]:
+        with open(file) as f:
+            data = json.load(f)
+
+        start = time.perf_counter()
+        module_handler = ModuleHandler(file, json_dict=data)
+        terminals = module_handler.get_terminals()
+        module_handler.get_context_paths()
+        lca_time = time.perf_counter() - start
+
+        dfs_time = None
+        if len(terminals) <= args.max_dfs_terminals:
+            start = time.perf_counter()
+            DFSPaths(data).get_context_paths(terminals)
+            dfs_time = time.perf_counter() - start
+            dfs_total += dfs_time
+            lca_total += lca_time
+
+        pairs = len(terminals) * (len(terminals) - 1) // 2
+        print('{:<50} {:>7} {:>10} {:>10} {:>10.4f} {:>8}'.format(
+            os.path.relpath(file, args.data_dir)[-50:], len(terminals), pairs,
+            '{:.4f}'.format(dfs_time) if dfs_time is not None else 'skipped',
+            lca_time,
+            '{:.1f}x'.format(dfs_time / lca_time) if dfs_time else '-'))
+
+    if lca_total:
+        print('total (modules with both timings): dfs {:.2f}s, lca {:.2f}s, '
+              '{:.1f}x'.format(dfs_total, lca_total, dfs_total / lca_total))
+
+
+if __name__ == '__main__':
+    main()
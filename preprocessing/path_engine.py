@@ -0,0 +1,89 @@
+import numpy as np
+from typing import List, Sequence
+
+
+class PathEngine:
+    '''
+    finds paths between nodes of a rooted tree through their lowest common
+    ancestor (LCA) instead of searching the whole tree for every pair
+    tree is given as parent and depth arrays indexed by node, root is 0
+    with parent -1
+    LCA is answered with binary lifting, ancestors[k][v] is the 2^k-th
+    ancestor of v (the root is its own ancestor)
+    '''
+
+    def __init__(self, parents: Sequence[int], depths: Sequence[int]):
+        parents = np.asarray(parents, dtype=np.int64)
+        self.depths = np.asarray(depths, dtype=np.int64).tolist()
+        self.labels = [str(i) for i in range(len(parents))]
+
+        level = np.where(parents < 0, 0, parents)
+        levels = [level]
+        max_depth = max(self.depths) if self.depths else 0
+        for _ in range(1, max(1, int(max_depth).bit_length())):
+            level = level[level]
+            levels.append(level)
+
+        # plain lists are a lot faster than numpy scalars for single lookups
+        self.ancestors = [level.tolist() for level in levels]
+        self.parents = self.ancestors[0]
+
+    # ancestor of the node which is k levels above it
+    def ancestor(self, node: int, k: int) -> int:
+        level = 0
+        while k:
+            if k & 1:
+                node = self.ancestors[level][node]
+            k >>= 1
+            level += 1
+
+        return node
+
+    def lca(self, a: int, b: int) -> int:
+        if self.depths[a] < self.depths[b]:
+            a, b = b, a
+
+        a = self.ancestor(a, self.depths[a] - self.depths[b])
+        if a == b:
+            return a
+
+        for level in reversed(self.ancestors):
+            if level[a] != level[b]:
+                a = level[a]
+                b = level[b]
+
+        return self.parents[a]
+
+    # number of edges on the path between 2 nodes
+    def distance(self, a: int, b: int) -> int:
+        return (self.depths[a] + self.depths[b]
+                - 2 * self.depths[self.lca(a, b)])
+
+    # path from start to end with arrows, e.g. ['4', 'up', '0', 'down', '7']
+    # lowest common ancestor may be passed in when it is already known,
+    # nodes are labeled by their index unless other labels are given
+    def path(self, start: int, end: int, top=None,
+             labels=None) -> List[str]:
+        if top is None:
+            top = self.lca(start, end)
+
+        labels = labels or self.labels
+        parents = self.parents
+
+        path = [labels[start]]
+        node = start
+        while node != top:
+            node = parents[node]
+            path.append('up')
+            path.append(labels[node])
+
+        # the second half is collected from the end node upwards
+        descent = list()
+        node = end
+        while node != top:
+            descent.append(labels[node])
+            descent.append('down')
+            node = parents[node]
+
+        descent.reverse()
+        return path + descent
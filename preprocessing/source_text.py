@@ -0,0 +1,94 @@
+import os
+import logging
+import urllib.request
+import chardet
+import numpy as np
+from typing import Tuple
+from threading import Lock
+from collections import OrderedDict
+
+
+# chardet is slow, it gets only the beginning of a file which isn't utf-8
+SAMPLE_SIZE = 64 * 1024
+# number of files with remembered encoding
+MAX_ENCODINGS = 4096
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+log.addHandler(logging.StreamHandler())
+
+# encodings of already read files, keyed by path, modification time and size
+encodings = OrderedDict()
+encodings_lock = Lock()
+
+
+class SourceText:
+    '''
+    decoded lua source code without '\\r' characters, AST positions index
+    the original text, so they have to be shifted by the number of removed
+    characters before them, e.g. for 'a\\r\\nb' the 'b' moves from 3 to 2
+    '''
+
+    def __init__(self, text: str):
+        if '\r' in text:
+            characters = np.frombuffer(text.encode('utf-32-le'),
+                                       dtype='<u4')
+            self.carriage_returns = np.flatnonzero(characters == ord('\r'))
+            self.text = text.replace('\r', '')
+        else:
+            self.carriage_returns = np.zeros(0, dtype=np.int64)
+            self.text = text
+
+    # indices into the original text -> indices into self.text, removed
+    # '\r' is mapped to the character which follows it
+    def offsets(self, indices: np.ndarray) -> np.ndarray:
+        indices = np.asarray(indices, dtype=np.int64)
+        return indices - np.searchsorted(self.carriage_returns, indices)
+
+
+# encoding is a pair of codec name and error handling, as it's passed
+# to bytes.decode
+def decode(raw_data: bytes, encoding=None) -> Tuple[str, tuple]:
+    if encoding:
+        return raw_data.decode(*encoding), encoding
+
+    # most of the modules are utf-8 (or ascii), so there's no detection
+    try:
+        return raw_data.decode('utf-8'), ('utf-8', 'strict')
+    except UnicodeDecodeError:
+        pass
+
+    # broken characters of utf-8 file are replaced, other files are decoded
+    # byte by byte, so that AST positions still match
+    detected = chardet.detect(raw_data[:SAMPLE_SIZE])['encoding']
+    if detected in ['ascii', 'utf-8']:
+        return raw_data.decode('utf-8', 'replace'), ('utf-8', 'replace')
+
+    return raw_data.decode('iso-8859-1'), ('iso-8859-1', 'strict')
+
+
+def load(path=None, url=None) -> SourceText:
+    # if there's path provided read form it, otherwise read from url
+    if path:
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        with open(path, 'rb') as f:
+            raw_data = f.read()
+    else:
+        key = (url, None, None)
+        log.debug('Loading module file from {}'.format(url))
+        with urllib.request.urlopen(url) as url_file:
+            raw_data = url_file.read()
+
+    with encodings_lock:
+        encoding = encodings.get(key)
+
+    text, encoding = decode(raw_data, encoding)
+
+    with encodings_lock:
+        encodings[key] = encoding
+        encodings.move_to_end(key)
+        while len(encodings) > MAX_ENCODINGS:
+            encodings.popitem(last=False)
+
+    return SourceText(text)
@@ -0,0 +1,127 @@
+import numpy as np
+from typing import List
+from constant import CONTAINERS
+from constant import CONTAINER_CODES
+
+
+# arrays which describe the tree, everything else is derived from them
+ARRAYS = ('parents', 'depths', 'sibling_index', 'containers', 'positions',
+          'characters_counts', 'preorder', 'order', 'child_offsets',
+          'child_indices', 'subtree_sizes', 'subtree_end', 'is_terminal')
+
+
+class SyntaxTree:
+    '''
+    AST of a module in flat NumPy arrays indexed by master_index, root has
+    index 0 and container 'root', e.g. for AST
+        0 -> 1 -> 2
+          -> 3
+          -> 4 -> 5
+    the arrays look like this:
+        parents = [-1, 0, 1, 0, 0, 4]
+        depths = [0, 1, 2, 1, 1, 2]
+        child_offsets = [0, 3, 4, 4, 4, 5, 5]
+        child_indices = [1, 3, 4, 2, 5]
+    children of node i are child_indices[child_offsets[i]:child_offsets[i+1]]
+    in the same order as in .json file
+    '''
+
+    def __init__(self, nodes: List[dict], nodes_count: int):
+        size = nodes_count + 1
+        self.size = size
+        parents = [-1] * size
+        depths = [0] * size
+        # position of node among its siblings
+        sibling_index = [0] * size
+        containers = [CONTAINER_CODES['root']] + [0] * nodes_count
+        positions = [0] * size
+        characters_counts = [0] * size
+        preorder = [0]
+
+        # iterative depth-first traversal, so that deep trees don't hit
+        # the recursion limit, children are pushed in reversed order to be
+        # visited in the original one
+        stack = [(node, 0, i) for i, node in reversed(list(enumerate(nodes)))]
+        while stack:
+            node, parent, i = stack.pop()
+            index = node['master_index']
+            preorder.append(index)
+
+            parents[index] = parent
+            depths[index] = depths[parent] + 1
+            sibling_index[index] = i
+            containers[index] = CONTAINER_CODES[node['container']]
+            positions[index] = node.get('position', 0)
+            characters_counts[index] = node.get('characters_count', 0)
+
+            if 'children' in node:
+                stack.extend((child, index, i) for i, child in
+                             reversed(list(enumerate(node['children']))))
+
+        self.parents = np.asarray(parents, dtype=np.int32)
+        self.depths = np.asarray(depths, dtype=np.int32)
+        self.sibling_index = np.asarray(sibling_index, dtype=np.int32)
+        self.containers = np.asarray(containers, dtype=np.uint8)
+        self.positions = np.asarray(positions, dtype=np.int64)
+        self.characters_counts = np.asarray(characters_counts,
+                                            dtype=np.int64)
+
+        # nodes in pre-order and pre-order rank of every node
+        self.preorder = np.asarray(preorder, dtype=np.int32)
+        self.order = np.full(size, -1, dtype=np.int32)
+        self.order[self.preorder] = np.arange(len(preorder), dtype=np.int32)
+
+        # children in CSR format, pre-order keeps siblings in original order
+        descendants = self.preorder[1:]
+        children_counts = np.bincount(self.parents[descendants],
+                                      minlength=size)
+        self.child_offsets = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(children_counts, out=self.child_offsets[1:])
+        self.child_indices = descendants[
+            np.argsort(self.parents[descendants], kind='stable')]
+
+        # subtree sizes are summed level by level from the deepest one
+        self.subtree_sizes = np.ones(size, dtype=np.int32)
+        by_depth = descendants[np.argsort(-self.depths[descendants],
+                                          kind='stable')]
+        depths = self.depths[by_depth]
+        bounds = np.flatnonzero(np.diff(depths)) + 1
+        for level in np.split(by_depth, bounds):
+            np.add.at(self.subtree_sizes, self.parents[level],
+                      self.subtree_sizes[level])
+
+        # last pre-order rank inside the subtree of every node
+        self.subtree_end = self.order + self.subtree_sizes - 1
+
+        # leaves are terminals, root is terminal when it has only one child
+        self.is_terminal = children_counts == 0
+        self.is_terminal[0] = children_counts[0] == 1
+
+    @classmethod
+    def from_data(cls, data: dict) -> 'SyntaxTree':
+        return cls(data['nodes'], data['nodes_count'])
+
+    # tree from already computed arrays, e.g. memory-mapped from a cache file
+    @classmethod
+    def from_arrays(cls, arrays: dict) -> 'SyntaxTree':
+        tree = cls.__new__(cls)
+        for name in ARRAYS:
+            setattr(tree, name, arrays[name])
+        tree.size = len(tree.parents)
+
+        return tree
+
+    def arrays(self) -> dict:
+        return {name: getattr(self, name) for name in ARRAYS}
+
+    def children(self, index: int) -> np.ndarray:
+        return self.child_indices[self.child_offsets[index]:
+                                  self.child_offsets[index + 1]]
+
+    def container(self, index: int) -> str:
+        return CONTAINERS[self.containers[index]]
+
+    # terminals in pre-order
+    @property
+    def terminals(self) -> np.ndarray:
+        return self.preorder[self.is_terminal[self.preorder]]
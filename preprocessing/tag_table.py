@@ -0,0 +1,157 @@
+import heapq
+import logging
+import numpy as np
+from constant import CONTAINER_CODES
+
+
+NONE = CONTAINER_CODES[None]
+COMMENT = CONTAINER_CODES['comment']
+# str.isspace() of ASCII characters, other characters are checked
+# one by one, but only once for every distinct character
+ASCII_WHITESPACE = np.array([chr(c).isspace() for c in range(128)])
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+log.addHandler(logging.StreamHandler())
+
+
+class TagTable:
+    '''
+    text of a module and container code of every its character, shared by
+    SeeSoft and LuaCode instead of a dict per character
+    '''
+
+    def __init__(self, text: str, characters: np.ndarray, codes: np.ndarray):
+        self.text = text
+        # unicode code points of text
+        self.characters = characters
+        self.codes = codes
+        self.__sections = None
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    # run-length encoding of codes, start, end (exclusive) and container
+    # code of every sequence of characters with the same container
+    def runs(self) -> tuple:
+        starts = np.flatnonzero(np.diff(self.codes, prepend=-1))
+        ends = np.append(starts[1:], len(self.codes))
+        return starts, ends, self.codes[starts]
+
+    # line (from 0) and container code of every colored section, i.e. run
+    # with a container, section i + 1 is at index i as in LuaCode
+    def sections(self) -> tuple:
+        if self.__sections is None:
+            starts, _, codes = self.runs()
+            colored = codes != NONE
+            newlines = np.flatnonzero(self.characters == ord('\n'))
+            self.__sections = (np.searchsorted(newlines, starts[colored]),
+                               codes[colored])
+
+        return self.__sections
+
+
+def whitespace(characters: np.ndarray) -> np.ndarray:
+    ascii = characters < len(ASCII_WHITESPACE)
+    space = ASCII_WHITESPACE[np.where(ascii, characters, 0)]
+
+    other = np.flatnonzero(~ascii)
+    if len(other):
+        distinct, inverse = np.unique(characters[other], return_inverse=True)
+        space[other] = np.array([chr(c).isspace() for c in distinct.tolist()],
+                                dtype=bool)[inverse]
+
+    return space
+
+
+# container code of every character, i.e. container of the last node
+# in pre-order which contains it (the deepest one for nested nodes)
+# positions are swept once in sorted order, heap keeps nodes which were
+# started, the latest one in pre-order on top, nodes which already ended
+# are dropped only when they get to the top
+def paint(starts: np.ndarray, ends: np.ndarray, containers: np.ndarray,
+          preorder: np.ndarray, length: int) -> np.ndarray:
+    nodes = preorder[1:]
+    starts = np.clip(starts[nodes], 0, length)
+    ends = np.clip(ends[nodes], 0, length)
+    nonempty = np.flatnonzero(starts < ends)
+    order = nonempty[np.argsort(starts[nonempty], kind='stable')]
+
+    boundaries = np.unique(np.concatenate(([0, length], starts, ends)))
+    node_starts = starts[order].tolist()
+    node_ends = ends[order].tolist()
+    node_codes = containers[nodes[order]].tolist()
+    ranks = order.tolist()
+
+    heap = list()
+    segment_codes = list()
+    j = 0
+    for boundary in boundaries[:-1].tolist():
+        while j < len(ranks) and node_starts[j] <= boundary:
+            heapq.heappush(heap, (-ranks[j], node_ends[j], node_codes[j]))
+            j += 1
+        while heap and heap[0][1] <= boundary:
+            heapq.heappop(heap)
+        segment_codes.append(heap[0][2] if heap else NONE)
+
+    return np.repeat(np.array(segment_codes, dtype=np.int8),
+                     np.diff(boundaries))
+
+
+# builds tag table of a document, characters get container of their node,
+# then the rules for comments, empty lines and whitespace at the beginning
+# of lines are applied to whole arrays
+def build(document, comments=True) -> TagTable:
+    text = document.source_code
+    characters = np.frombuffer(text.encode('utf-32-le'), dtype='<u4')
+    starts, ends = document.spans
+    codes = paint(starts, ends, document.tree.containers,
+                  document.tree.preorder, len(characters))
+
+    newlines = characters == ord('\n')
+    space = whitespace(characters)
+    codes[newlines] = NONE
+
+    if comments:
+        # add comments and other code segments which don't belong to any
+        # container to 'comment' container
+        codes[(codes == NONE) & ~space] = COMMENT
+
+        # make spaces in comments colorful instead of white
+        comment = codes == COMMENT
+        inner = np.zeros(len(codes), dtype=bool)
+        inner[1:-1] = ((characters[1:-1] == ord(' '))
+                       & comment[:-2] & comment[2:])
+        codes[inner] = COMMENT
+
+    else:
+        # delete comments and code segments without container
+        keep = (codes != NONE) | newlines
+
+        # remove empty lines from the beginning of the file where there
+        # might have been comments
+        text_start = np.flatnonzero(keep & ~space)
+        keep[:text_start[0] if len(text_start) else len(keep)] = False
+
+        characters, codes, space = (array[keep] for array in
+                                    (characters, codes, space))
+
+        # reduce empty lines sequence to <= 2, i.e. every '\n' preceded
+        # by 3 others is removed
+        newlines = characters == ord('\n')
+        keep = np.ones(len(characters), dtype=bool)
+        keep[3:] = ~(newlines[3:] & newlines[2:-1]
+                     & newlines[1:-2] & newlines[:-3])
+
+        characters, codes, space, newlines = (
+            array[keep] for array in (characters, codes, space, newlines))
+        text = characters.astype('<u4').tobytes().decode('utf-32-le')
+
+    # handle white spaces in the beginning of the line
+    # it's about keeping tabs white in the final image
+    indices = np.arange(len(characters))
+    last_newline = np.maximum.accumulate(np.where(newlines, indices, -1))
+    last_text = np.maximum.accumulate(np.where(space, -1, indices))
+    codes[space & (last_newline > last_text)] = NONE
+
+    return TagTable(text, characters, codes)
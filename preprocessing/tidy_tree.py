@@ -0,0 +1,179 @@
+import numpy as np
+
+
+'''
+tidy tree drawing of Buchheim, Jünger and Leipert, "Improving Walker's
+algorithm to run in linear time", i.e. Reingold-Tilford layout of trees
+with any number of children, computed on flat arrays without recursion
+'''
+
+
+# minimal horizontal distance of neighbouring nodes
+DISTANCE = 1.0
+
+
+# (nodes x 2) coordinates of the tree with root 0 given by its edges,
+# x is horizontal position, y is depth, so root is on the top as in
+# igraph's layout_reingold_tilford, children of a node are placed
+# in the order of their edges
+def layout(size: int, parents: np.ndarray, children: np.ndarray) -> np.ndarray:
+    parents = np.asarray(parents, dtype=np.int64)
+    children = np.asarray(children, dtype=np.int64)
+
+    # children of every node in the order of edges, in CSR form
+    by_parent = np.argsort(parents, kind='stable')
+    child_indices = children[by_parent].tolist()
+    child_offsets = np.concatenate(
+        ([0], np.cumsum(np.bincount(parents, minlength=size)))).tolist()
+
+    # number of every node among its siblings from 1, parent and left
+    # sibling (-1 for the first child)
+    number = [0] * size
+    parent = [-1] * size
+    left = [-1] * size
+    for node in range(size):
+        siblings = child_indices[child_offsets[node]:child_offsets[node + 1]]
+        for index, child in enumerate(siblings):
+            number[child] = index + 1
+            parent[child] = node
+            left[child] = siblings[index - 1] if index else -1
+
+    def first_child(node):
+        if child_offsets[node] < child_offsets[node + 1]:
+            return child_indices[child_offsets[node]]
+        return -1
+
+    def last_child(node):
+        if child_offsets[node] < child_offsets[node + 1]:
+            return child_indices[child_offsets[node + 1] - 1]
+        return -1
+
+    prelim = [0.0] * size
+    mod = [0.0] * size
+    shift = [0.0] * size
+    change = [0.0] * size
+    thread = [-1] * size
+    ancestor = list(range(size))
+    # default ancestor of the next child of every node, see apportion
+    default = [-1] * size
+
+    def next_left(node):
+        child = first_child(node)
+        return child if child >= 0 else thread[node]
+
+    def next_right(node):
+        child = last_child(node)
+        return child if child >= 0 else thread[node]
+
+    def move_subtree(left_node, right_node, distance):
+        subtrees = number[right_node] - number[left_node]
+        change[right_node] -= distance / subtrees
+        shift[right_node] += distance
+        change[left_node] += distance / subtrees
+        prelim[right_node] += distance
+        mod[right_node] += distance
+
+    # places subtree of node next to the subtrees of its left siblings,
+    # contours are followed by threads, returns new default ancestor
+    def apportion(node, default_ancestor):
+        sibling = left[node]
+        if sibling < 0:
+            return default_ancestor
+
+        inner_right = outer_right = node
+        inner_left = sibling
+        outer_left = first_child(parent[node])
+        sum_inner_right = mod[inner_right]
+        sum_outer_right = mod[outer_right]
+        sum_inner_left = mod[inner_left]
+        sum_outer_left = mod[outer_left]
+
+        while next_right(inner_left) >= 0 and next_left(inner_right) >= 0:
+            inner_left = next_right(inner_left)
+            inner_right = next_left(inner_right)
+            outer_left = next_left(outer_left)
+            outer_right = next_right(outer_right)
+            ancestor[outer_right] = node
+
+            distance = (prelim[inner_left] + sum_inner_left
+                        - prelim[inner_right] - sum_inner_right + DISTANCE)
+            if distance > 0:
+                greatest = ancestor[inner_left]
+                if parent[greatest] != parent[node]:
+                    greatest = default_ancestor
+                move_subtree(greatest, node, distance)
+                sum_inner_right += distance
+                sum_outer_right += distance
+
+            sum_inner_left += mod[inner_left]
+            sum_inner_right += mod[inner_right]
+            sum_outer_left += mod[outer_left]
+            sum_outer_right += mod[outer_right]
+
+        if next_right(inner_left) >= 0 and next_right(outer_right) < 0:
+            thread[outer_right] = next_right(inner_left)
+            mod[outer_right] += sum_inner_left - sum_outer_right
+
+        if next_left(inner_right) >= 0 and next_left(outer_left) < 0:
+            thread[outer_left] = next_left(inner_right)
+            mod[outer_left] += sum_inner_right - sum_outer_left
+            default_ancestor = node
+
+        return default_ancestor
+
+    # pre-order which visits the last child first, reversed it's post-order
+    # which visits the first child first, as recursive first walk would
+    order = list()
+    stack = [0]
+    while stack:
+        node = stack.pop()
+        order.append(node)
+        stack.extend(child_indices[child_offsets[node]:
+                                   child_offsets[node + 1]])
+
+    # first walk, every subtree is laid out before the next sibling
+    for node in reversed(order):
+        first, last = first_child(node), last_child(node)
+        sibling = left[node]
+        if first < 0:
+            prelim[node] = prelim[sibling] + DISTANCE if sibling >= 0 else 0.0
+        else:
+            # execute shifts of the children
+            total_shift = 0.0
+            total_change = 0.0
+            for child in reversed(child_indices[child_offsets[node]:
+                                                child_offsets[node + 1]]):
+                prelim[child] += total_shift
+                mod[child] += total_shift
+                total_change += change[child]
+                total_shift += shift[child] + total_change
+
+            midpoint = (prelim[first] + prelim[last]) / 2
+            if sibling >= 0:
+                prelim[node] = prelim[sibling] + DISTANCE
+                mod[node] = prelim[node] - midpoint
+            else:
+                prelim[node] = midpoint
+
+        if node:
+            if default[parent[node]] < 0:
+                default[parent[node]] = node
+            default[parent[node]] = apportion(node, default[parent[node]])
+
+    # second walk, x is the sum of modifiers of all ancestors, every
+    # parent is before its children in order
+    x = np.empty(size)
+    y = np.empty(size)
+    modifiers = [0.0] * size
+    depths = [0] * size
+    for node in order:
+        if node:
+            modifiers[node] = modifiers[parent[node]] + mod[parent[node]]
+            depths[node] = depths[parent[node]] + 1
+    x[:] = prelim
+    x += modifiers
+    y[:] = depths
+
+    # root is at 0
+    x -= x[0]
+    return np.column_stack((x, y))
@@ -0,0 +1,151 @@
+import os
+import hashlib
+import functools
+import importlib.util
+import logging
+import numpy as np
+from threading import Lock
+from collections import OrderedDict
+from preprocessing import disk_cache
+from preprocessing import tidy_tree
+from preprocessing.syntax_tree import SyntaxTree
+
+
+# layouts are written to layouts directory of the disk cache as
+# <hash of the tree>.npy (see preprocessing/disk_cache.py)
+CACHE_NAME = 'layouts'
+# number of layouts kept in memory
+MAX_LAYOUTS = 32
+# 'builtin' is tidy_tree, 'igraph' is layout_reingold_tilford of python-igraph
+# which is imported only when it's selected here
+ENGINE = 'builtin'
+# changes when the algorithm changes, so that old layouts aren't used
+LAYOUT_VERSIONS = {
+    'builtin': 'buchheim-1',
+    'igraph': 'reingold_tilford-1'
+}
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+log.addHandler(logging.StreamHandler())
+
+
+# layout depends only on the shape of the tree, i.e. on the parent of every
+# node and the order of children
+def tree_hash(tree: SyntaxTree, engine=None) -> str:
+    sha1 = hashlib.sha1(LAYOUT_VERSIONS[engine or ENGINE].encode())
+    sha1.update(np.ascontiguousarray(tree.preorder, dtype='<i4').tobytes())
+    sha1.update(np.ascontiguousarray(tree.parents[tree.preorder],
+                                     dtype='<i4').tobytes())
+    return sha1.hexdigest()
+
+
+# (nodes x 2) coordinates of Reingold-Tilford layout with root on the top
+def compute(tree: SyntaxTree, engine=None) -> np.ndarray:
+    # edge from parent to every node except root, in pre-order
+    children = tree.preorder[1:]
+    return reingold_tilford(tree.size, tree.parents[children], children,
+                            engine)
+
+
+# layout of any tree with root 0 given by its edges, children of a node are
+# placed in the order of their edges, e.g. only visible part of a tree
+def reingold_tilford(size: int, parents: np.ndarray, children: np.ndarray,
+                     engine=None) -> np.ndarray:
+    if _engine(engine) == 'igraph':
+        return _igraph_layout(size, parents, children)
+
+    return tidy_tree.layout(size, parents, children)
+
+
+# selected engine, builtin one when igraph is selected but not installed
+def _engine(engine=None) -> str:
+    engine = engine or ENGINE
+    if engine == 'igraph' and not _igraph_installed():
+        return 'builtin'
+
+    return engine
+
+
+# checked only once, so that missing igraph is logged once and not for
+# every layout
+@functools.lru_cache(maxsize=None)
+def _igraph_installed() -> bool:
+    installed = importlib.util.find_spec('igraph') is not None
+    if not installed:
+        log.debug('igraph is not installed, builtin layout is used')
+
+    return installed
+
+
+# igraph is optional, it's needed only for ENGINE = 'igraph'
+def _igraph_layout(size: int, parents: np.ndarray,
+                   children: np.ndarray) -> np.ndarray:
+    from igraph import Graph
+
+    graph = Graph(n=size, directed=True)
+    graph.add_edges(np.column_stack((parents, children)).tolist())
+
+    layout = graph.layout_reingold_tilford(mode='out', root=[0])
+    return np.array(layout.coords, dtype=np.float64).reshape(size, 2)
+
+
+class LayoutCache:
+    '''
+    least recently used tree layouts in memory, backed by .npy files keyed
+    by hash of the tree, so that the same tree is laid out only once
+    '''
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.layouts = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, tree: SyntaxTree, use_cache=None, cache_dir=None,
+            engine=None) -> np.ndarray:
+        use_cache = disk_cache.USE_CACHE if use_cache is None \
+            else use_cache
+        cache_dir = cache_dir or os.path.join(disk_cache.CACHE_DIR,
+                                              CACHE_NAME)
+        engine = _engine(engine)
+        key = tree_hash(tree, engine)
+
+        with self.lock:
+            if key in self.layouts:
+                self.layouts.move_to_end(key)
+                return self.layouts[key]
+
+        def read(f) -> np.ndarray:
+            layout = np.load(f)
+            if layout.shape != (tree.size, 2):
+                raise ValueError('Wrong shape {}'.format(layout.shape))
+            return layout
+
+        cache_file = os.path.join(cache_dir, key + '.npy')
+        layout = disk_cache.load(cache_file, read) if use_cache else None
+
+        if layout is None:
+            layout = compute(tree, engine)
+            if use_cache:
+                disk_cache.save(cache_file, lambda f: np.save(f, layout))
+
+        # layouts are shared by all the views of the tree
+        layout.flags.writeable = False
+        with self.lock:
+            self.layouts[key] = layout
+            while len(self.layouts) > self.max_size:
+                self.layouts.popitem(last=False)
+
+        return layout
+
+    def clear(self):
+        with self.lock:
+            self.layouts.clear()
+
+
+cache = LayoutCache(MAX_LAYOUTS)
+
+
+def load(tree: SyntaxTree, use_cache=None, cache_dir=None,
+         engine=None) -> np.ndarray:
+    return cache.get(tree, use_cache, cache_dir, engine)
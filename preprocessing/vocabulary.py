@@ -0,0 +1,96 @@
+import os
+import numpy as np
+from collections import Counter
+from typing import Iterable, List, Tuple
+
+
+# id 0 is reserved for tokens which didn't make it into vocabulary
+UNKNOWN = '<unk>'
+
+
+class Vocabulary:
+    '''
+    corpus-wide table of token ids built from token counts
+    counts are collected from many modules (possibly in different processes)
+    and merged, ids are assigned by freeze() for tokens passing min_count
+    and max_size cutoffs
+    ids which were already assigned never change, so vocabulary can be
+    updated with counts from new modules and old encoded data stays valid
+    '''
+
+    def __init__(self):
+        self.tokens = [UNKNOWN]
+        self.ids = {UNKNOWN: 0}
+        # counts of all tokens seen so far, also the ones without id
+        self.counts = Counter()
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def update(self, counts: Iterable[Tuple[str, int]]):
+        for token, count in counts:
+            self.counts[token] += count
+
+    def merge(self, other: 'Vocabulary'):
+        self.counts.update(other.counts)
+
+    # assigns ids to tokens which don't have one yet, most frequent first
+    def freeze(self, min_count=1, max_size=None):
+        candidates = [token for token, count in self.counts.items()
+                      if count >= min_count and token not in self.ids]
+        # ties are broken by token so that ids don't depend on the order
+        # in which counts were merged
+        candidates.sort(key=lambda token: (-self.counts[token], token))
+
+        if max_size is not None:
+            candidates = candidates[:max(0, max_size - len(self.tokens))]
+
+        for token in candidates:
+            self.ids[token] = len(self.tokens)
+            self.tokens.append(token)
+
+    # ids of given tokens, unknown tokens get id 0
+    def lookup(self, tokens: List[str]) -> np.ndarray:
+        return np.array([self.ids.get(token, 0) for token in tokens],
+                        dtype=np.int32)
+
+    '''
+    vocabulary is saved as 2 files:
+        <name>.txt          token with id i on line i
+        <name>.counts.tsv   token and its count, for all tokens seen
+    '''
+
+    def save(self, directory: str, name: str):
+        with open(os.path.join(directory, name + '.txt'), 'w',
+                  encoding='utf-8') as f:
+            for token in self.tokens:
+                f.write(token + '\n')
+
+        with open(os.path.join(directory, name + '.counts.tsv'), 'w',
+                  encoding='utf-8') as f:
+            for token, count in sorted(self.counts.items()):
+                f.write('{}\t{}\n'.format(token, count))
+
+    # counts=False loads only ids, e.g. when counts are going to be
+    # collected again from the same modules
+    @classmethod
+    def load(cls, directory: str, name: str,
+             counts=True) -> 'Vocabulary':
+        vocabulary = cls()
+
+        with open(os.path.join(directory, name + '.txt'),
+                  encoding='utf-8') as f:
+            vocabulary.tokens = f.read().splitlines()
+        vocabulary.ids = {token: i for i, token in
+                          enumerate(vocabulary.tokens)}
+
+        if not counts:
+            return vocabulary
+
+        with open(os.path.join(directory, name + '.counts.tsv'),
+                  encoding='utf-8') as f:
+            for line in f:
+                token, count = line.rstrip('\n').rsplit('\t', 1)
+                vocabulary.counts[token] = int(count)
+
+        return vocabulary
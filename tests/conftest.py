@@ -0,0 +1,77 @@
+import json
+import random
+import pytest
+from components import image_store
+from components import luacode_windows
+from components import seesoft_tiles
+from preprocessing import disk_cache
+
+
+CONTAINERS = ('require', 'variable', 'function', 'interface', 'other',
+              'comment')
+
+
+# random AST in the format of .json files in data directory
+def random_module(seed: int, nodes_count: int) -> dict:
+    rng = random.Random(seed)
+    nodes = list()
+    parents = list()
+
+    for index in range(1, nodes_count + 1):
+        node = {'master_index': index,
+                'container': rng.choice(CONTAINERS),
+                'position': index,
+                'characters_count': 1}
+        parent = rng.choice(parents) if parents and rng.random() < 0.8 \
+            else None
+        if parent is None:
+            nodes.append(node)
+        else:
+            parent.setdefault('children', list()).append(node)
+        parents.append(node)
+
+    return {'nodes_count': nodes_count, 'nodes': nodes}
+
+
+# cache files of tests don't go to home directory
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    directory = tmp_path / 'cache'
+    monkeypatch.setattr(disk_cache, 'CACHE_DIR', str(directory))
+    for store, name in ((image_store.store, 'images'),
+                        (seesoft_tiles.tiles, 'tiles'),
+                        (luacode_windows.windows, 'lua-code')):
+        monkeypatch.setattr(store, 'cache_dir', str(directory / name))
+
+    return directory
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    directory = tmp_path / 'data'
+    for i in range(4):
+        module_dir = directory / 'module{}'.format(i)
+        module_dir.mkdir(parents=True)
+        with open(module_dir / 'AST1.json', 'w') as f:
+            json.dump(random_module(i, 20 + 5 * i), f)
+
+    return directory
+
+
+# module whose node 1 is a function over the first line of its lua file
+@pytest.fixture
+def lua_module(tmp_path):
+    source = tmp_path / 'module.lua'
+    source.write_text('local function f() return 1 end\nreturn f\n')
+    data = {'nodes_count': 2, 'path': str(source), 'url': None,
+            'nodes': [{'master_index': 1, 'container': 'function',
+                       'position': 1, 'characters_count': 31,
+                       'children': [{'master_index': 2,
+                                     'container': 'variable',
+                                     'position': 16, 'characters_count': 1}]
+                       }]}
+    path = tmp_path / 'module.json'
+    with open(path, 'w') as f:
+        json.dump(data, f)
+
+    return path
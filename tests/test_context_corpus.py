@@ -0,0 +1,30 @@
+import os
+import pytest
+import numpy as np
+from preprocessing.context_corpus import ContextCorpus
+from preprocessing.context_corpus import ContextWriter
+
+
+def test_written_corpus_is_read_back(tmp_path):
+    with ContextWriter(str(tmp_path)) as writer:
+        writer.add('a', np.array([1, 2]), np.array([3, 4]), np.array([5, 6]))
+        writer.add('b', np.array([7]), np.array([8]), np.array([9]))
+
+    corpus = ContextCorpus(str(tmp_path))
+    assert corpus.module_names == ['a', 'b']
+    assert [column.tolist() for column in corpus.module(1)] == [[7], [8], [9]]
+
+
+def test_failed_write_leaves_no_corpus(tmp_path):
+    with ContextWriter(str(tmp_path)) as writer:
+        writer.add('a', np.array([1]), np.array([2]), np.array([3]))
+
+    with pytest.raises(RuntimeError):
+        with ContextWriter(str(tmp_path)) as writer:
+            writer.add('b', np.array([1]), np.array([2]), np.array([3]))
+            raise RuntimeError('interrupted')
+
+    assert not os.path.exists(tmp_path / 'meta.json')
+    assert not os.path.exists(tmp_path / 'starts.int32')
+    with pytest.raises(FileNotFoundError):
+        ContextCorpus(str(tmp_path))
@@ -0,0 +1,87 @@
+import os
+import json
+from preprocessing import dataset_builder
+from preprocessing.context_corpus import ContextCorpus
+from preprocessing.manifest import Manifest
+
+
+def test_rebuild_with_previous_vocabulary_is_identical(data_dir, tmp_path):
+    output_dir = str(tmp_path / 'output')
+    dataset_builder.build(str(data_dir), output_dir, 1, 1, min_count=2)
+    first = ContextCorpus(output_dir)
+    terminals, paths = first.terminal_vocab, first.path_vocab
+    with open(tmp_path / 'output' / 'paths.counts.tsv') as f:
+        counts = f.read()
+
+    for _ in range(2):
+        dataset_builder.build(str(data_dir), output_dir, 1, 1, min_count=2,
+                              vocab_dir=output_dir)
+        corpus = ContextCorpus(output_dir)
+        assert corpus.terminal_vocab == terminals
+        assert corpus.path_vocab == paths
+        with open(tmp_path / 'output' / 'paths.counts.tsv') as f:
+            assert f.read() == counts
+
+
+def test_deleted_shard_is_rebuilt(data_dir, tmp_path):
+    output_dir = str(tmp_path / 'output')
+    dataset_builder.build(str(data_dir), output_dir, 1, 1)
+    contexts = ContextCorpus(output_dir).offsets.tolist()
+
+    shard = dataset_builder.shard_name(os.path.join('module1', 'AST1.json'))
+    os.remove(os.path.join(output_dir, 'shards', shard))
+    dataset_builder.build(str(data_dir), output_dir, 1, 1)
+
+    corpus = ContextCorpus(output_dir)
+    assert len(corpus) == 4
+    assert corpus.offsets.tolist() == contexts
+
+
+def add_source_path(data_dir, source) -> str:
+    json_path = data_dir / 'module0' / 'AST1.json'
+    with open(json_path) as f:
+        data = json.load(f)
+    with open(json_path, 'w') as f:
+        json.dump(dict(data, path=str(source)), f)
+
+    return os.path.join('module0', 'AST1.json')
+
+
+def test_module_without_source_file_is_processed(data_dir, tmp_path):
+    module = add_source_path(data_dir, tmp_path / 'missing.lua')
+    output_dir = str(tmp_path / 'output')
+
+    assert dataset_builder.build(str(data_dir), output_dir, 1, 1) == 0
+    assert len(ContextCorpus(output_dir)) == 4
+    manifest = Manifest(os.path.join(output_dir, 'manifest.json'),
+                        {'max_path_length': None, 'max_path_width': None})
+    assert manifest.entries[module]['source'] is None
+
+
+def test_failed_module_is_processed_again(data_dir, tmp_path, monkeypatch):
+    output_dir = str(tmp_path / 'output')
+    encode_contexts = dataset_builder.encode_contexts
+
+    def fail(*args):
+        raise MemoryError('too large')
+
+    monkeypatch.setattr(dataset_builder, 'encode_contexts', fail)
+    assert dataset_builder.build(str(data_dir), output_dir, 1, 1) == 4
+
+    monkeypatch.setattr(dataset_builder, 'encode_contexts', encode_contexts)
+    assert dataset_builder.build(str(data_dir), output_dir, 1, 1) == 0
+    assert len(ContextCorpus(output_dir)) == 4
+
+
+def test_module_is_processed_again_when_source_appears(data_dir, tmp_path):
+    source = tmp_path / 'module.lua'
+    module = add_source_path(data_dir, source)
+    output_dir = str(tmp_path / 'output')
+    dataset_builder.build(str(data_dir), output_dir, 1, 1)
+
+    source.write_text('return 1\n')
+    dataset_builder.build(str(data_dir), output_dir, 1, 1)
+
+    manifest = Manifest(os.path.join(output_dir, 'manifest.json'),
+                        {'max_path_length': None, 'max_path_width': None})
+    assert manifest.entries[module]['source']['path'] == str(source)
@@ -0,0 +1,30 @@
+import os
+from preprocessing import disk_cache
+
+
+def write(path, size: int, mtime: int):
+    disk_cache.save(str(path), lambda f: f.write(b'x' * size))
+    os.utime(path, (mtime, mtime))
+
+
+def test_least_recently_used_files_are_pruned(cache_dir):
+    for i in range(4):
+        write(cache_dir / 'images' / str(i), 100, 1000 + i)
+    # reading a file makes it recently used
+    assert disk_cache.load(str(cache_dir / 'images' / '0'),
+                           lambda f: f.read()) == b'x' * 100
+
+    disk_cache.prune(max_size=250)
+    assert sorted(os.listdir(cache_dir / 'images')) == ['0', '3']
+
+
+def test_unreadable_file_is_removed(cache_dir):
+    path = str(cache_dir / 'broken')
+    write(path, 10, 1000)
+
+    def read(f):
+        raise ValueError('truncated')
+
+    assert disk_cache.load(path, read) is None
+    assert not os.path.exists(path)
+    assert disk_cache.load(path, read) is None
@@ -0,0 +1,37 @@
+import flask
+import pytest
+from components.image_store import ImageStore
+
+
+def serve(store: ImageStore, url: str):
+    server = flask.Flask(__name__)
+    store.register(server)
+    return server.test_client().get(url)
+
+
+def test_image_is_served_by_other_store(tmp_path):
+    store = ImageStore(1024, str(tmp_path))
+    server = flask.Flask(__name__)
+    store.register(server)
+    key = store.put(b'image')
+
+    # e.g. other server worker
+    response = serve(ImageStore(1024, str(tmp_path)), store.source(key))
+    assert response.status_code == 200
+    assert response.data == b'image'
+    assert response.mimetype == 'image/png'
+
+
+def test_unknown_image_is_not_found(tmp_path):
+    store = ImageStore(1024, str(tmp_path))
+    assert serve(store, '/images/' + 'a' * 40).status_code == 404
+    assert serve(store, '/images/..').status_code == 404
+
+
+def test_dropped_image_without_cache_is_key_error():
+    store = ImageStore(4)
+    first = store.put(b'first')
+    store.put(b'second')
+
+    with pytest.raises(KeyError):
+        store.source(first)
@@ -0,0 +1,54 @@
+import flask
+import numpy as np
+from constant import CONTAINER_CODES
+from components.luacode_windows import CodeBlocks
+from components.luacode_windows import WindowStore
+from preprocessing.tag_table import TagTable
+
+
+def code_blocks(name: str) -> CodeBlocks:
+    text = 'local {} = 1\nreturn {}\n'.format(name, name)
+    codes = np.full(len(text), CONTAINER_CODES[None], dtype=np.uint8)
+    codes[:text.index('\n')] = CONTAINER_CODES['variable']
+    characters = np.array([ord(c) for c in text], dtype=np.int32)
+    return CodeBlocks.from_tag_table(TagTable(text, characters, codes))
+
+
+def test_block_is_served_by_other_store(tmp_path):
+    store = WindowStore(1024, 1024 * 1024, str(tmp_path))
+    key = store.add(code_blocks('x')).key
+
+    # e.g. other server worker
+    other_store = WindowStore(1024, 1024 * 1024, str(tmp_path))
+    server = flask.Flask(__name__)
+    other_store.register(server)
+    response = server.test_client().get(store.url(key, 'code') + '0.html')
+    assert response.status_code == 200
+    assert response.data == b'<span id="code1" class="variable">' \
+                            b'local x = 1</span>\nreturn x\n'
+
+
+def test_dropped_code_blocks_are_created_again(tmp_path):
+    first = code_blocks('x')
+    # only one of code blocks fits into memory
+    store = WindowStore(1024, first.nbytes + 1, str(tmp_path))
+    store.add(first)
+    second = store.add(code_blocks('y'))
+    assert list(store.code_blocks) == [second.key]
+
+    assert store.get(first.key).html('code') == first.html('code')
+    assert list(store.code_blocks) == [first.key]
+
+
+def test_truncated_cache_file_is_not_found(tmp_path):
+    store = WindowStore(1024, 1024 * 1024, str(tmp_path))
+    key = store.add(code_blocks('x')).key
+    cache_file = tmp_path / (key + '.npz')
+    cache_file.write_bytes(cache_file.read_bytes()[:100])
+
+    other_store = WindowStore(1024, 1024 * 1024, str(tmp_path))
+    server = flask.Flask(__name__)
+    other_store.register(server)
+    response = server.test_client().get(store.url(key, 'code') + '0.html')
+    assert response.status_code == 404
+    assert not cache_file.exists()
@@ -0,0 +1,8 @@
+from preprocessing.module_files import list_files
+
+
+def test_json_files_are_listed_in_order(data_dir):
+    (data_dir / 'module0' / 'source.lua').write_text('')
+
+    assert list_files(str(data_dir)) == [
+        str(data_dir / 'module{}'.format(i) / 'AST1.json') for i in range(4)]
@@ -0,0 +1,116 @@
+import itertools
+import pytest
+from conftest import random_module
+from preprocessing.module_handler import ModuleHandler
+
+
+# module with a single node under the root, so that the root is a terminal
+def single_top_module(seed: int, nodes_count: int) -> dict:
+    data = random_module(seed, nodes_count)
+    top = data['nodes'][0]
+    top.setdefault('children', list()).extend(data['nodes'][1:])
+    data['nodes'] = [top]
+    return data
+
+
+MODULES = [random_module(seed, 10 + 15 * seed) for seed in range(4)] \
+    + [single_top_module(4, 40)]
+
+
+class BruteForce:
+    '''
+    parent, position among siblings and container of every node read
+    directly from nested .json nodes, paths are found by walking parents
+    '''
+
+    def __init__(self, data: dict):
+        self.parents = {'0': None}
+        self.sibling_index = {'0': 0}
+        self.containers = {'0': 'root'}
+        self.terminals = list()
+        if len(data['nodes']) == 1:
+            self.terminals.append(('0', 'root'))
+        self.__add(data['nodes'], '0')
+
+    def __add(self, nodes: list, parent: str):
+        for i, node in enumerate(nodes):
+            index = str(node['master_index'])
+            self.parents[index] = parent
+            self.sibling_index[index] = i
+            self.containers[index] = node['container']
+            if node.get('children'):
+                self.__add(node['children'], index)
+            else:
+                self.terminals.append((index, node['container']))
+
+    # node and all its ancestors up to the root
+    def ancestors(self, node: str) -> list:
+        ancestors = [node]
+        while self.parents[ancestors[-1]] is not None:
+            ancestors.append(self.parents[ancestors[-1]])
+        return ancestors
+
+    # path with arrows, its length in edges and its width
+    def path(self, start: str, end: str) -> tuple:
+        up, down = self.ancestors(start), self.ancestors(end)
+        top = next(node for node in up if node in down)
+        up, down = up[:up.index(top)], down[:down.index(top)]
+
+        path = [start]
+        for node in (up[1:] + [top] if up else []):
+            path += ['up', node]
+        for node in reversed(down):
+            path += ['down', node]
+
+        width = 0
+        if up and down:
+            width = abs(self.sibling_index[up[-1]]
+                        - self.sibling_index[down[-1]])
+        return path, len(up) + len(down), width
+
+    def context_paths(self, max_path_length=None,
+                      max_path_width=None) -> list:
+        context_paths = list()
+        for start, end in itertools.combinations(self.terminals, 2):
+            path, length, width = self.path(start[0], end[0])
+            if max_path_length is not None and length > max_path_length:
+                continue
+            if max_path_width is not None and width > max_path_width:
+                continue
+            context_paths.append([start, path[1:-1], end])
+
+        return context_paths
+
+
+def test_path_format():
+    # 0 -> 1 -> 2, 0 -> 3
+    data = {'nodes_count': 3, 'nodes': [
+        {'master_index': 1, 'container': 'function', 'children': [
+            {'master_index': 2, 'container': 'variable'}]},
+        {'master_index': 3, 'container': 'other'}]}
+    handler = ModuleHandler('', data)
+
+    assert handler.get_context_paths() == [
+        [('2', 'variable'), ['up', '1', 'up', '0', 'down'], ('3', 'other')]]
+    assert list(handler.iter_context_tokens()) == [
+        ('variable', 'up function up root down', 'other')]
+
+
+@pytest.mark.parametrize('data', MODULES)
+@pytest.mark.parametrize('max_path_length, max_path_width', [
+    (None, None), (3, None), (None, 1), (4, 2), (2, 0)])
+def test_paths_match_parent_walk(data, max_path_length, max_path_width):
+    handler = ModuleHandler('', data)
+    brute_force = BruteForce(data)
+
+    assert handler.get_terminals() == brute_force.terminals
+    expected = brute_force.context_paths(max_path_length, max_path_width)
+    assert handler.get_context_paths(max_path_length,
+                                     max_path_width) == expected
+    assert handler.get_paths(max_path_length, max_path_width) == [
+        path for _, path, _ in expected]
+    assert list(handler.iter_context_tokens(
+        max_path_length, max_path_width)) == [
+        (start[1], ' '.join(brute_force.containers.get(label, label)
+                            for label in path), end[1])
+        for start, path, end in expected]
@@ -0,0 +1,45 @@
+import shutil
+from components.module_views import ViewCache
+from preprocessing.module_document import DocumentCache
+
+
+def test_fingerprints_are_dropped_with_views(lua_module, tmp_path):
+    other_module = tmp_path / 'other.json'
+    shutil.copy(lua_module, other_module)
+    cache = ViewCache(1)
+
+    cache.get(str(lua_module))
+    cache.get(str(other_module))
+    assert list(cache.fingerprints) == [str(other_module)]
+    assert [path for path, _, _ in cache.modules] == [str(other_module)]
+
+
+# .json file is untouched, only its lua file changes
+def test_changed_source_is_loaded_again(lua_module, tmp_path):
+    documents = DocumentCache(1 << 20)
+    views = ViewCache(1)
+    document = documents.get(str(lua_module))
+    module_views = views.get(str(lua_module))
+    assert documents.get(str(lua_module)) is document
+    assert views.get(str(lua_module)) is module_views
+
+    source = tmp_path / 'module.lua'
+    source.write_text('local function g() return 2 end\nreturn g\n\n')
+    assert documents.get(str(lua_module)) is not document
+    assert 'function g' in documents.get(str(lua_module)).source_code
+    assert views.get(str(lua_module)) is not module_views
+    assert 'function g' in views.get(
+        str(lua_module)).document.source_code
+
+
+def test_appearing_source_is_loaded_again(lua_module, tmp_path):
+    source = tmp_path / 'module.lua'
+    text = source.read_text()
+    source.unlink()
+    documents = DocumentCache(1 << 20)
+    document = documents.get(str(lua_module))
+    assert documents.get(str(lua_module)) is document
+
+    source.write_text(text)
+    assert documents.get(str(lua_module)) is not document
+    assert documents.get(str(lua_module)).source_code == text
@@ -0,0 +1,23 @@
+import json
+from components.scatterplot import ScatterPlot
+from preprocessing.module_document import ModuleDocument
+
+
+def scatter_plot(path) -> ScatterPlot:
+    with open(path) as f:
+        return ScatterPlot(document=ModuleDocument(json.load(f)))
+
+
+def test_views_with_other_settings_do_not_change_callbacks(lua_module):
+    plot = scatter_plot(lua_module)
+    plot.view('left', '12', show_legend=False, show_text=True)
+    plot.view('right', '12', show_legend=True, show_text=True)
+
+    relayout = {'xaxis.range': [0, 2]}
+    assert plot.relayout(relayout).layout.showlegend is False
+    assert plot.relayout(relayout, show_legend=True).layout.showlegend
+
+    hover = {'points': [{'x': 1}]}
+    assert plot.hover(hover, snippet_length=5) == 'local...'
+    assert plot.hover(hover) == 'local function f() return 1 end\n'
+    assert plot.hover(hover, snippet_length=5) == 'local...'
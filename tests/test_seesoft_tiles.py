@@ -0,0 +1,80 @@
+import flask
+import pytest
+import numpy as np
+from components.seesoft_tiles import ImagePyramid
+from components.seesoft_tiles import Pyramid
+from components.seesoft_tiles import TilePyramid
+from components.seesoft_tiles import TileStore
+
+
+PALETTE = np.zeros((4, 3), dtype=np.uint8)
+
+
+def test_pyramid_without_render_can_not_be_created():
+    class Incomplete(Pyramid):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete('key', PALETTE, 10, 10)
+
+
+def tile_pyramid(seed: int) -> TilePyramid:
+    grid = np.random.RandomState(seed).randint(-1, 3, (50, 40)) \
+        .astype(np.int8)
+    return TilePyramid(grid, PALETTE, 5, 10, 20, 240, 540)
+
+
+def test_tile_is_served_by_other_store(tmp_path):
+    store = TileStore(1024, 1024 * 1024, str(tmp_path))
+    pyramid = store.add(tile_pyramid(0))
+    png = store.png(pyramid.key, 1, 0, 0)
+
+    # e.g. other server worker
+    other_store = TileStore(1024, 1024 * 1024, str(tmp_path))
+    server = flask.Flask(__name__)
+    other_store.register(server)
+    response = server.test_client().get(
+        other_store.url(pyramid.key) + '1/0/0.png')
+    assert response.status_code == 200
+    assert response.data == png
+
+
+def test_dropped_pyramid_is_created_again(tmp_path):
+    # only one pyramid fits into memory
+    store = TileStore(1024, 3000, str(tmp_path))
+    first = store.add(tile_pyramid(0))
+    second = store.add(tile_pyramid(1))
+    assert list(store.pyramids) == [second.key]
+
+    pyramid = store.pyramid(first.key)
+    assert pyramid.key == first.key
+    assert np.array_equal(pyramid.tile(0, 0, 0), first.tile(0, 0, 0))
+    assert list(store.pyramids) == [pyramid.key]
+
+
+def serve_tile(store: TileStore, key: str):
+    server = flask.Flask(__name__)
+    store.register(server)
+    return server.test_client().get(store.url(key) + '0/0/0.png')
+
+
+def test_truncated_cache_file_is_not_found(tmp_path):
+    store = TileStore(1024, 1024 * 1024, str(tmp_path))
+    key = store.add(tile_pyramid(0)).key
+    cache_file = tmp_path / (key + '.npz')
+    cache_file.write_bytes(cache_file.read_bytes()[:100])
+
+    other_store = TileStore(1024, 1024 * 1024, str(tmp_path))
+    assert serve_tile(other_store, key).status_code == 404
+    assert not cache_file.exists()
+
+
+def test_pyramid_of_deleted_image_is_not_found(tmp_path):
+    image = tmp_path / 'mosaic.npy'
+    np.save(image, np.zeros((10, 10), dtype=np.uint8))
+    store = TileStore(1024, 1024 * 1024, str(tmp_path / 'cache'))
+    key = store.add(ImagePyramid('a' * 40, str(image), PALETTE)).key
+    image.unlink()
+
+    other_store = TileStore(1024, 1024 * 1024, str(tmp_path / 'cache'))
+    assert serve_tile(other_store, key).status_code == 404
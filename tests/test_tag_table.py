@@ -0,0 +1,78 @@
+import numpy as np
+from constant import CONTAINER_CODES
+from preprocessing import tag_table
+from preprocessing.module_document import ModuleDocument
+
+
+SOURCE = ('-- head\r\n'
+          '\r\n'
+          'local function f()\r\n'
+          '\treturn x\r\n'
+          'end\r\n'
+          '-- mid note\r\n'
+          '\r\n\r\n\r\n\r\n'
+          'local y = 1\r\n')
+# one letter for container of every character
+LETTERS = {'.': None, 'c': 'comment', 'f': 'function', 'v': 'variable',
+           'i': 'interface'}
+
+
+def node(index: int, container: str, text: str, children=()) -> dict:
+    return {'master_index': index, 'container': container,
+            'position': SOURCE.index(text) + 1,
+            'characters_count': len(text), 'children': list(children)}
+
+
+def document(tmp_path) -> ModuleDocument:
+    path = tmp_path / 'module.lua'
+    path.write_bytes(SOURCE.encode('utf-8'))
+    return ModuleDocument({
+        'path': str(path), 'url': None, 'nodes_count': 4,
+        'nodes': [
+            node(1, 'function', 'local function f()\r\n\treturn x\r\nend',
+                 [node(2, 'variable', 'x')]),
+            node(3, 'variable', 'local y = 1', [node(4, 'interface', 'y')])
+        ]
+    })
+
+
+def check(table: tag_table.TagTable, text: str, letters: str):
+    assert table.text == text
+    assert len(letters) == len(text)
+    assert table.codes.tolist() == [CONTAINER_CODES[LETTERS[letter]]
+                                    for letter in letters]
+    assert np.array_equal(table.characters, [ord(c) for c in text])
+
+
+def test_comments_are_colored(tmp_path):
+    check(tag_table.build(document(tmp_path), comments=True),
+          '-- head\n'
+          '\n'
+          'local function f()\n'
+          '\treturn x\n'
+          'end\n'
+          '-- mid note\n'
+          '\n\n\n\n'
+          'local y = 1\n',
+          'ccccccc.'
+          '.'
+          'ffffffffffffffffff.'
+          '.fffffffv.'
+          'fff.'
+          'ccccccccccc.'
+          '....'
+          'vvvvvvivvvv.')
+
+
+def test_comments_and_empty_lines_are_removed(tmp_path):
+    check(tag_table.build(document(tmp_path), comments=False),
+          'local function f()\n'
+          '\treturn x\n'
+          'end\n'
+          '\n\n'
+          'local y = 1\n',
+          'ffffffffffffffffff.'
+          '.fffffffv.'
+          'fff.'
+          '..'
+          'vvvvvvivvvv.')
@@ -0,0 +1,56 @@
+import random
+import numpy as np
+from preprocessing import tidy_tree
+
+
+def random_tree(seed: int) -> tuple:
+    rng = random.Random(seed)
+    size = rng.randint(1, 200)
+    # wide and narrow trees
+    spread = rng.choice([1, 3, size])
+    parents = [rng.randint(max(0, node - spread), node - 1)
+               for node in range(1, size)]
+    return size, np.array(parents, dtype=np.int64), np.arange(1, size)
+
+
+def check_layout(size: int, parents: np.ndarray, children: np.ndarray):
+    coordinates = tidy_tree.layout(size, parents, children)
+    x, y = coordinates[:, 0], coordinates[:, 1]
+    child_lists = [list() for _ in range(size)]
+    for parent, child in zip(parents.tolist(), children.tolist()):
+        child_lists[parent].append(child)
+
+    # nodes of every level from left to right are in pre-order
+    levels = dict()
+    stack = [0]
+    while stack:
+        node = stack.pop()
+        levels.setdefault(y[node], list()).append(node)
+        stack.extend(reversed(child_lists[node]))
+
+    for nodes in levels.values():
+        assert np.all(np.diff(x[nodes]) >= tidy_tree.DISTANCE - 1e-9)
+
+    for node, node_children in enumerate(child_lists):
+        if node_children:
+            assert np.isclose(x[node], (x[node_children[0]]
+                                        + x[node_children[-1]]) / 2)
+            assert np.all(y[node_children] == y[node] + 1)
+
+    assert x[0] == 0 and y[0] == 0
+
+
+def test_random_trees_keep_distance_and_center_parents():
+    for seed in range(300):
+        check_layout(*random_tree(seed))
+
+
+def test_wide_root():
+    size = 20001
+    check_layout(size, np.zeros(size - 1, dtype=np.int64),
+                 np.arange(1, size))
+
+
+def test_deep_tree():
+    size = 20001
+    check_layout(size, np.arange(size - 1), np.arange(1, size))
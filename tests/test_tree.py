@@ -0,0 +1,154 @@
+import pytest
+import numpy as np
+from components import tree as tree_module
+from components.tree import Tree
+from conftest import random_module
+from preprocessing.module_document import ModuleDocument
+
+
+# progressive view of small trees, so that expanding needs many clicks
+@pytest.fixture
+def small_limits(monkeypatch):
+    monkeypatch.setattr(tree_module, 'MAX_NODES', 10)
+    monkeypatch.setattr(tree_module, 'MAX_CHILDREN', 3)
+
+
+def make_tree(data: dict) -> Tree:
+    return Tree(document=ModuleDocument(data))
+
+
+# root with count leaf children
+def wide_module(count: int) -> dict:
+    return {'nodes_count': count,
+            'nodes': [{'master_index': index, 'container': 'variable',
+                       'position': index, 'characters_count': 1}
+                      for index in range(1, count + 1)]}
+
+
+def click(tree: Tree, item: list, expanded: dict):
+    return tree.click({'points': [{'customdata': item}]}, expanded)
+
+
+# visible items of the tree as customdata of the figure
+def items(tree: Tree, expanded: dict) -> tuple:
+    nodes, groups, parents, hidden = tree.visible(expanded)
+    return np.column_stack((nodes, groups)).tolist(), parents, hidden
+
+
+# parent of every visible node is its parent in the tree or a group of
+# its siblings, which contains it, every node is either visible or hidden
+def check_visible(tree: Tree, expanded: dict):
+    syntax_tree = tree.tree
+    nodes, groups, parents, hidden = tree.visible(expanded)
+    assert nodes[0] == 0
+    assert int((nodes >= 0).sum() + hidden.sum()) == syntax_tree.size
+    assert len(set(nodes[nodes >= 0].tolist())) == int((nodes >= 0).sum())
+
+    for item in range(1, len(nodes)):
+        parent = parents[item - 1]
+        assert parent < item
+        if nodes[parent] >= 0:
+            tree_parent = nodes[parent]
+            assert groups[item, 0] in {-1, tree_parent}
+        else:
+            tree_parent, start, end = groups[parent].tolist()
+            if nodes[item] >= 0:
+                assert nodes[item] in syntax_tree.children(
+                    tree_parent)[start:end].tolist()
+            else:
+                assert start <= groups[item, 1] < groups[item, 2] <= end
+        if nodes[item] >= 0:
+            assert syntax_tree.parents[nodes[item]] == tree_parent
+
+
+# collapsed items are clicked until nothing is hidden
+def expand_all(tree: Tree) -> dict:
+    expanded, clicks = None, 0
+    while True:
+        check_visible(tree, expanded)
+        visible, _, hidden = items(tree, expanded)
+        collapsed = np.flatnonzero(hidden)
+        if not len(collapsed):
+            return expanded
+
+        _, expanded = click(tree, visible[collapsed[0]], expanded)
+        clicks += 1
+        assert clicks <= tree.tree.size
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_expanding_shows_every_node_once(seed, small_limits):
+    tree = make_tree(random_module(seed, 100))
+    assert tree.progressive
+
+    nodes = tree.visible(expand_all(tree))[0]
+    assert sorted(nodes[nodes >= 0].tolist()) == list(range(tree.tree.size))
+
+
+def test_collapsing_collapses_everything_inside(small_limits):
+    tree = make_tree(random_module(0, 100))
+    syntax_tree = tree.tree
+    expanded = expand_all(tree)
+
+    # expanded node with the most nodes expanded inside it
+    def inside(node: int) -> list:
+        low = syntax_tree.order[node]
+        high = syntax_tree.subtree_end[node]
+        return [other for other in expanded['nodes']
+                if low <= syntax_tree.order[other] <= high]
+    node = max(expanded['nodes'], key=lambda other: len(inside(other)))
+    assert len(inside(node)) > 1
+
+    _, collapsed = click(tree, [node, -1, -1, -1], expanded)
+    assert collapsed['nodes'] == sorted(set(expanded['nodes'])
+                                        - set(inside(node)))
+    low, high = syntax_tree.order[node], syntax_tree.subtree_end[node]
+    assert all(not low <= syntax_tree.order[parent] <= high
+               for parent, _, _ in collapsed['groups'])
+    check_visible(tree, collapsed)
+    visible, _, hidden = items(tree, collapsed)
+    item = visible.index([node, -1, -1, -1])
+    assert hidden[item] == syntax_tree.subtree_sizes[node] - 1
+
+    # expanding it again shows only its children
+    _, expanded_again = click(tree, [node, -1, -1, -1], collapsed)
+    assert expanded_again['nodes'] == sorted(collapsed['nodes'] + [node])
+
+
+def test_many_children_are_grouped(small_limits):
+    tree = make_tree(wide_module(100))
+
+    # groups have powers of MAX_CHILDREN children, except the last one
+    visible, parents, hidden = items(tree, None)
+    assert visible == [[0, -1, -1, -1], [-1, 0, 0, 81], [-1, 0, 81, 100]]
+    assert parents.tolist() == [0, 0]
+    assert hidden.tolist() == [0, 81, 19]
+
+    _, expanded = click(tree, visible[1], None)
+    assert expanded == {'nodes': [], 'groups': [[0, 0, 81]]}
+    visible, parents, hidden = items(tree, expanded)
+    assert visible == [[0, -1, -1, -1], [-1, 0, 0, 81], [-1, 0, 0, 27],
+                       [-1, 0, 27, 54], [-1, 0, 54, 81], [-1, 0, 81, 100]]
+    assert parents.tolist() == [0, 1, 1, 1, 0]
+    assert hidden.tolist() == [0, 0, 27, 27, 27, 19]
+    check_visible(tree, expanded)
+
+
+@pytest.mark.parametrize('item', [
+    None, [], [1, -1, -1], [1, -1, -1, -1, 0], [100, -1, -1, -1],
+    [-5, -1, -1, -1], [-1, 0, 2, 2], [-1, 0, 0, 101], [-1, 100, 0, 1],
+    [0, -1, -1, -1], [1, -1, -1, -1]
+])
+def test_invalid_items_are_ignored(item, small_limits):
+    tree = make_tree(wide_module(100))
+
+    assert tree.click({'points': [{'customdata': item}]}, None) is None
+    assert tree.click({'points': [{}]}, None) is None
+    assert tree.click(None, None) is None
+
+
+def test_small_tree_is_not_clicked():
+    tree = make_tree(random_module(0, 100))
+
+    assert not tree.progressive
+    assert click(tree, [1, -1, -1, -1], None) is None
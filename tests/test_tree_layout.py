@@ -0,0 +1,15 @@
+import logging
+import importlib.util
+from preprocessing import tree_layout
+
+
+def test_missing_igraph_is_logged_once(caplog, monkeypatch):
+    monkeypatch.setattr(importlib.util, 'find_spec', lambda name: None)
+    tree_layout._igraph_installed.cache_clear()
+
+    with caplog.at_level(logging.DEBUG, logger=tree_layout.__name__):
+        engines = [tree_layout._engine('igraph') for _ in range(3)]
+    tree_layout._igraph_installed.cache_clear()
+
+    assert engines == ['builtin'] * 3
+    assert [record.levelno for record in caplog.records] == [logging.DEBUG]